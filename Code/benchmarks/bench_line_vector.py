@@ -0,0 +1,218 @@
+import os
+import sys
+import timeit
+from typing import List
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from calculations import add, sub, get_line_vector, VELOCITY_CAP
+from track import Track
+
+"""
+Micro benchmark of get_line_vector. The augment/revert pipeline that get_line_vector used to run is kept 
+below as the reference implementation. Every displacement from every cell of every bundled track is checked 
+against the reference before both implementations are timed per call. 
+Run from the Code directory: python benchmarks/bench_line_vector.py
+"""
+
+"""
+Given two [x,y] coordinates, imagine a 2D rectangle with both points at any corner.
+This method determines the coordinates for the top left corner of imaginary rectange.
+"""
+def get_top_left(left: List, right: List) -> List:
+    # Left is coordinate that is closer to the left (West) 
+    # Check if left is bottom or top corner
+    # Check left coordinate's row is < or equal to right coordinate's row value
+    if left[0] <= right[0]:
+        # left is top left. Return it
+        return left
+    # Left is bottom left.
+    # Top left must have row coordinate of right position and col coordinate of left position
+    top_left = [right[0], left[1]]
+    return top_left
+
+"""
+Set top left to [0,0] and alter both coordinates with respect to distance from this anchor.
+"""
+def reset_with_respect_top_left (top_left: List, left: List, right: List) -> List:
+    # Alter both positions to be relative distances from top_left
+    augmented_left = sub(left, top_left)
+    augmented_right = sub(right, top_left)
+    return augmented_left, augmented_right
+
+"""
+Augment two coordinates with respect to one another. This means to set one of the coordinates
+to [0, 0] and modify the other such that their relative distance remains the same. This is 
+done by assining the coordinate that is more left (WEST) as the [0, 0] anchor and then 
+augmenting the second coordinate with respect to this anchor. 
+"""
+# Augment Positions relative to one another
+def augment_positions(position1: List, position2: List) -> List:
+    # Determine which position is more left
+    if position1[1] < position2[1]: 
+        # Position1 is left position. 
+        # Create an imaginary rectangle encompassing both coordinates and determine top left
+        # coordinate of this rectangle
+        top_left = get_top_left(position1, position2)
+        # Augment values with respect to top left
+        new_pos1, new_pos2 = reset_with_respect_top_left(top_left, position1, position2)
+    else:
+        # Position2 is considered left position (Both could be within same column)
+        # Get top left position
+        top_left = get_top_left(position2, position1)
+        # Augment values with respect to top left
+        new_pos2, new_pos1 = reset_with_respect_top_left(top_left, position2, position1)
+    return new_pos1, new_pos2, top_left
+
+"""
+Given two parameterized coordinates representing the start and the goal state, return
+a string corresponding to a straight line through the two points. 
+"""
+def get_direction(origin: List, goal: List) -> str:
+    # Get the difference to determine direction of straight line
+    difference = sub(origin, goal)
+    # If difference is (<0, <0), goal is SE of origin
+    if difference[0] < 0 and difference[1] < 0: return "SE"
+    # If difference is (<0, 0), goal is S of origin
+    if difference[0] < 0 and difference[1] == 0: return "S"
+    # If difference is (<0, >0), goal is SW of origin
+    if difference[0] < 0 and difference[1] > 0: return "SW"
+    # If difference is (0, <0), goal is E
+    if difference[0] == 0 and difference[1] < 0: return "E"
+    # If difference is (0, 0), goal is equal to origin
+    if difference[0] == 0 and difference[1] == 0: return "None"
+    # If difference is (0, >0), goal is W
+    if difference[0] == 0 and difference[1] > 0: return "W"
+    # If difference is (>0, <0), goal is NE
+    if difference[0] > 0 and difference[1] < 0: return "NE"
+    # If difference is (>0, 0), goal is N
+    if difference[0] > 0 and difference[1] == 0: return "N"
+    # If difference is (>0, >0), goal is NW 
+    if difference[0] > 0 and difference[1] > 0: return "NW"
+
+"""
+Given a string direction, determine the movement required to move in that direction. Meaning
+if we were to traverse North, we would need to go up one row. This translates to [-1, 0]. 
+This is done for all possible directions except None position.
+"""
+# Create incrementors based on direction
+def get_incrementors (direction: str) -> List:
+    # If direction == N, increment by [-1, 0]
+    if direction == "N": return -1, 0
+    # If direction == NE, increment by [-1, 1]
+    if direction == "NE": return -1, 1
+    # If direction == E, increment by [0, 1]
+    if direction == "E": return 0, 1
+    # If direction == SE, increment by [1, 1]
+    if direction == "SE": return 1, 1
+    # If direction == S, increment by [1, 0]
+    if direction == "S": return 1, 0
+    # If direction == SW, increment by [1, -1]
+    if direction == "SW": return 1, -1
+    # If direction == W, increment by [0, -1]
+    if direction == "W": return 0, -1
+    # If direction == NW, increment by [-1, -1]
+    if direction == "NW": return -1, -1
+
+"""
+Return a list of indices corresponding to as straight line as possible from the origin to 
+the goal coordinates. 
+"""
+def draw_straight_line(corner_origin: List, corner_goal: List) -> List:
+    # Initialize straight_line list
+    straight_line_indices = [corner_origin]
+    # Set the current location as origin
+    current_location = corner_origin
+    # Iterate till we reach the goal
+    while current_location != corner_goal:
+        # Determine which direction we need to traverse via get_direction
+        direction = get_direction(current_location, corner_goal) 
+        # If origin and goal are the exact same, we return either
+        if direction == "None": return straight_line_indices
+        # Get incrementors for movement in particular direction
+        row_incrementor, col_incrementor = get_incrementors(direction)
+        # Alter current location
+        current_location = add(current_location, [row_incrementor, col_incrementor])
+        # Add location to indices
+        straight_line_indices.append(current_location)
+    return straight_line_indices
+
+"""
+Augmented coordinates are those that are 'encapsulated' in an imaginary rectangle and are 
+altered to represent their location within the rectangle while maintaining their relative 
+distance. This method reverts the alteration to turn both coordintates (within the l List) 
+back to their original values. This is done by adding both coordinates with the coordinates
+of the top left of the rectangle. 
+"""
+def revert_augment(l: List, top_left: List) -> List:
+    # Add coordinates of top_left to each coordinate in l. This will revert the values
+    new_l = []
+    for coordinate in l:
+        new_l.append(add(coordinate, top_left))
+    return new_l
+
+"""
+A vector may contain values that are beyond the range of the track. We do not care about these
+values as assume them to be invalid/wall. Return only the portion of the list whose coordiantes are
+contained within the matrix parameter. 
+"""
+def refine_line_vector(line_vector: List, matrix: List) -> List:
+    # Returns only the portion of the line_vector that is contained within matrix
+    # Get matrix dimensions
+    row_size = len(matrix)
+    col_size = len(matrix[0])
+    # Iterate through line_vectors
+    valid_coordinates = []
+    for coordinate in line_vector:
+        row, col = coordinate
+        # If any coordinate is invalid, return the valid coordinates
+        if row < 0 or row >= row_size or col < 0 or col >= col_size:
+             # It is impossible for a straight line to step outside matrix dimensions and then re-enter 
+            return valid_coordinates
+        # If valid, append
+        valid_coordinates.append(coordinate)
+    # All valid so just return
+    return valid_coordinates
+
+"""
+Reference line vector built through the augment/revert pipeline
+"""
+def legacy_line_vector(previous: List, current: List, track_list: List) -> List:
+    previous_augmented, current_augmented, top_left = augment_positions(previous, current)
+    line_indices_augmented = draw_straight_line(previous_augmented, current_augmented)
+    line_indices_reverted = revert_augment(line_indices_augmented, top_left)
+    return refine_line_vector(line_indices_reverted, track_list)
+
+"""
+Return every (previous, current) pair of a track. Each cell is paired with all 121 displacements.
+"""
+def get_moves(track: Track) -> List:
+    moves = []
+    for row in range(len(track.track_list)):
+        for col in range(len(track.track_list[row])):
+            for v_row in range(-VELOCITY_CAP, VELOCITY_CAP + 1):
+                for v_col in range(-VELOCITY_CAP, VELOCITY_CAP + 1):
+                    moves.append(([row, col], [row + v_row, col + v_col]))
+    return moves
+
+"""
+Verify both implementations return the same cells and print the time per call of each
+"""
+def main(directory: str = "tracks") -> None:
+    for track_name in ["L-track", "O-track", "R-track", "W-track"]:
+        track = Track(directory, track_name)
+        track_list = track.track_list
+        moves = get_moves(track)
+        # The cell sequence must match exactly
+        for previous, current in moves:
+            expected = [tuple(coordinate) for coordinate in legacy_line_vector(previous, current, track_list)]
+            if list(get_line_vector(previous, current, track_list)) != expected:
+                raise AssertionError(f"Line mismatch on {track_name} from {previous} to {current}")
+        # Time a full pass over every move
+        legacy_time = min(timeit.repeat(lambda: [legacy_line_vector(p, c, track_list) for p, c in moves], number = 1, repeat = 3))
+        line_time = min(timeit.repeat(lambda: [get_line_vector(p, c, track_list) for p, c in moves], number = 1, repeat = 3))
+        legacy_per_call = legacy_time / len(moves) * 1e6
+        line_per_call = line_time / len(moves) * 1e6
+        print(f"{track_name}: {len(moves)} lines match | augment/revert {legacy_per_call:.2f} us/call | "
+              f"rasterizer {line_per_call:.2f} us/call | speedup {legacy_per_call / line_per_call:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from typing import Dict, List
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+import numpy as np
+from track import Track
+from racecar_batch import Racecar_Batch
+from value_iteration import Value_Iteration
+from learning_model import Learning_Model
+from replay_buffer import Replay_Buffer, SAMPLINGS
+
+"""
+Sample efficiency benchmark of experience replay. Every track is first solved with value iteration, whose greedy
+policy sets the reference race length. Q learning on the numpy backend then trains without replay and with each
+replay sampling, and every eval_every episodes its greedy policy races a batch of cars. A run reaches the target
+quality once every car finishes and the mean race length is within tolerance times the reference. The benchmark
+reports the environment steps, episodes and seconds every run needed to reach it, or None if the episode budget
+ran out first.
+Run from the Code directory:
+    python benchmarks/bench_replay.py --output replay.json
+"""
+
+TRACK_NAMES = ["L-track", "O-track", "R-track", "W-track"]
+MODES = ["none"] + SAMPLINGS
+
+"""
+Race a batch of cars with a greedy policy and return the mean race length and whether every car finished. Cars
+that do not finish within max_steps count max_steps moves.
+"""
+def evaluate(track: Track, policy: np.ndarray, arguments: Dict) -> List:
+    batch = Racecar_Batch(track, arguments['cars'], False, np.random.default_rng(arguments['seed']))
+    moves, _ = batch.race(policy, 0.0, arguments['max_steps'])
+    return float(moves.mean()), bool(batch.finished.all())
+
+"""
+Train Q learning with a replay mode until its greedy policy reaches the target race length or the episode budget is
+spent. Returns the steps, episodes and seconds to the target and the evaluation curve.
+"""
+def run_mode(track: Track, mode: str, target: float, arguments: Dict) -> Dict:
+    random.seed(arguments['seed'])
+    np.random.seed(arguments['seed'])
+    model = Learning_Model(track, -1, False, 'numpy')
+    replay = None
+    if mode != "none":
+        replay = Replay_Buffer(arguments['capacity'], arguments['batch_size'], arguments['replay_every'], mode)
+    q_tensor = model.get_q_tensor()
+    progress = {'episodes': 0, 'steps': 0, 'exploration rate': 1, 'biggest delta': -99999}
+    result = {'mode': mode, 'steps': None, 'episodes': None, 'time': None, 'curve': []}
+    training_time = 0.0
+    while progress['episodes'] < arguments['episodes']:
+        start_time = time.perf_counter()
+        # A negative threshold never stops early, even after an episode that changed no Q value
+        budget = min(progress['episodes'] + arguments['eval_every'], arguments['episodes'])
+        progress = q_tensor.train(arguments['eta'], arguments['discount'], -1, budget, False, progress,
+                                  replay = replay)
+        training_time += time.perf_counter() - start_time
+        mean_moves, all_finished = evaluate(track, q_tensor.get_policy(), arguments)
+        result['curve'].append({'episodes': progress['episodes'], 'steps': progress['steps'],
+                                'time': training_time, 'mean moves': mean_moves, 'all finished': all_finished})
+        if all_finished and mean_moves <= target:
+            result.update({'steps': progress['steps'], 'episodes': progress['episodes'], 'time': training_time})
+            break
+    return result
+
+"""
+Run every replay mode on every track. Returns one result per track holding the reference race length and the
+result of every mode.
+"""
+def run(track_names: List, modes: List, arguments: Dict) -> List:
+    results = []
+    for track_name in track_names:
+        track = Track(arguments['directory'], track_name)
+        planner = Value_Iteration(track, -1, 'numpy', prune = True)
+        planner.train(arguments['discount'], arguments['threshold'])
+        reference, _ = evaluate(track, planner.get_policy(), arguments)
+        target = arguments['tolerance'] * reference
+        track_result = {'track': track_name, 'reference moves': reference, 'target moves': target, 'modes': []}
+        for mode in modes:
+            result = run_mode(track, mode, target, arguments)
+            track_result['modes'].append(result)
+            reached = "not reached" if result['steps'] is None else \
+                f"{result['steps']} steps {result['episodes']} episodes {result['time']:.2f} s"
+            print(f"{track_name} {mode}: target {target:.1f} moves {reached}", flush = True)
+        results.append(track_result)
+    return results
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = "Measure how many steps Q learning needs with and without replay")
+    parser.add_argument("--directory", default = "tracks")
+    parser.add_argument("--tracks", nargs = "+", default = TRACK_NAMES)
+    parser.add_argument("--modes", nargs = "+", choices = MODES, default = MODES)
+    parser.add_argument("--eta", type = float, default = 0.05)
+    parser.add_argument("--discount", type = float, default = 0.9)
+    parser.add_argument("--threshold", type = float, default = 5, help = "Threshold of the reference value iteration")
+    parser.add_argument("--episodes", type = int, default = 15000, help = "Episode budget of every run")
+    parser.add_argument("--eval-every", type = int, default = 250, help = "Episodes between policy evaluations")
+    parser.add_argument("--tolerance", type = float, default = 1.5,
+                        help = "Target race length as a multiple of the value iteration race length")
+    parser.add_argument("--cars", type = int, default = 200, help = "Cars raced by every evaluation")
+    parser.add_argument("--max-steps", type = int, default = 1000, help = "Step limit of an evaluation race")
+    parser.add_argument("--capacity", type = int, default = 50000)
+    parser.add_argument("--batch-size", type = int, default = 32)
+    parser.add_argument("--replay-every", type = int, default = 4, help = "Steps between minibatches")
+    parser.add_argument("--seed", type = int, default = 0)
+    parser.add_argument("--output", help = "Write the results to this JSON file")
+    arguments = parser.parse_args()
+    results = run(arguments.tracks, arguments.modes, vars(arguments))
+    if arguments.output is not None:
+        with open(arguments.output, "w") as file:
+            json.dump({'meta': {'numpy': np.__version__, 'time': time.strftime("%Y-%m-%dT%H:%M:%S"),
+                                'arguments': vars(arguments)}, 'results': results}, file, indent = 2)
+
+if __name__ == "__main__":
+    main()
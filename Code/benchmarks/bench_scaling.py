@@ -0,0 +1,195 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import resource
+import tempfile
+import traceback
+import multiprocessing
+from typing import Dict, List
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+import numpy as np
+from track import Track
+from track_generator import generate_track, write_track
+from value_iteration import Value_Iteration
+from learning_model import Learning_Model
+
+"""
+Scaling benchmark of the planners and learners on procedurally generated square tracks of increasing size. Every
+size first builds the track's transition table and then trains each algorithm within its own child process, so
+that every run starts from a clean heap, reports its own peak resident memory and cannot take the harness down
+when it runs out of memory or time. Value iteration trains until convergence and Q learning for a fixed episode
+budget. The python backends use the dense or sparse value store and report its memory footprint. The results are
+written as JSON and optionally plotted as time and memory curves.
+Run from the Code directory:
+    python benchmarks/bench_scaling.py --sizes 25 50 100 200 --output scaling.json --plot scaling.png
+"""
+
+ALGORITHMS = ["value_iteration_python", "value_iteration_numpy", "q_learning_python", "q_learning_numpy"]
+
+"""
+Return the resident memory of this process in bytes
+"""
+def get_resident_memory() -> int:
+    with open("/proc/self/statm") as file:
+        return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+"""
+Train one algorithm on a track and return its measurements. The transition table is loaded from the cache written
+by the 'transition_table' job.
+"""
+def run_algorithm(algorithm: str, track: Track, arguments: Dict) -> Dict:
+    random.seed(0)
+    if algorithm == "transition_table":
+        start_time = time.perf_counter()
+        table = track.get_transition_table()
+        return {'time': time.perf_counter() - start_time, 'entries': int(table.outcomes.size)}
+    if algorithm.startswith("value_iteration"):
+        backend = algorithm.rsplit("_", 1)[1]
+        start_time = time.perf_counter()
+        model = Value_Iteration(track, -1, backend = backend, prune = arguments['prune'], store = arguments['store'])
+        setup_time = time.perf_counter() - start_time
+        model.train(arguments['discount'], arguments['threshold'])
+        result = {'time': time.perf_counter() - start_time, 'setup time': setup_time,
+                  'episodes': model.get_training_report()['episodes'], 'states': len(model.get_states())}
+    else:
+        backend = algorithm.rsplit("_", 1)[1]
+        start_time = time.perf_counter()
+        model = Learning_Model(track, -1, False, backend, arguments['store'])
+        setup_time = time.perf_counter() - start_time
+        # A threshold of 0 spends the whole episode budget
+        model.train(arguments['eta'], arguments['discount'], 1, 0, arguments['episodes'])
+        result = {'time': time.perf_counter() - start_time, 'setup time': setup_time,
+                  'episodes': model.training_report['episodes'], 'steps': model.training_report['steps']}
+    if backend == 'python':
+        result['store footprint'] = model.get_value_store().memory_footprint()
+    return result
+
+"""
+Body of a child process. Limits the address space if asked to, runs the job and puts its result on the queue.
+"""
+def run_job(queue: multiprocessing.Queue, directory: str, track_name: str, algorithm: str, arguments: Dict) -> None:
+    if arguments['memory_limit'] is not None:
+        limit = arguments['memory_limit'] * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    baseline_memory = get_resident_memory()
+    try:
+        result = run_algorithm(algorithm, Track(directory, track_name), arguments)
+        result['status'] = 'ok'
+    except MemoryError:
+        result = {'status': 'out of memory'}
+    except Exception:
+        result = {'status': 'error', 'error': traceback.format_exc()}
+    # ru_maxrss is in kilobytes on Linux
+    result['peak memory'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 - baseline_memory
+    queue.put(result)
+
+"""
+Run a job within a fresh child process and wait at most timeout seconds for its result
+"""
+def run_isolated(directory: str, track_name: str, algorithm: str, arguments: Dict, timeout: float) -> Dict:
+    context = multiprocessing.get_context("fork")
+    queue = context.Queue()
+    process = context.Process(target = run_job, args = (queue, directory, track_name, algorithm, arguments))
+    process.start()
+    process.join(timeout)
+    if process.is_alive():
+        process.terminate()
+        process.join()
+        return {'status': 'timeout'}
+    try:
+        return queue.get(timeout = 5)
+    except Exception:
+        # The child died without a result, e.g. by the out of memory killer
+        return {'status': f"killed ({process.exitcode})"}
+
+"""
+Generate a square track of every size and run every algorithm on it. A track's corridor is a tenth of its size
+wide unless a width is given, so the road area grows with the square of the size. Returns one result per size and
+algorithm.
+"""
+def run(sizes: List, algorithms: List, arguments: Dict, directory: str, timeout: float) -> List:
+    results = []
+    for size in sizes:
+        width = arguments['width'] if arguments['width'] is not None else max(2, size // 10)
+        track_name = f"generated-{size}x{size}-w{width}-t{arguments['turns']}"
+        write_track(directory, track_name, generate_track(size, size, width, arguments['turns'],
+                                                          arguments['placement'], arguments['seed']))
+        # The first job builds and caches the transition table for every other job
+        for algorithm in ["transition_table"] + algorithms:
+            result = run_isolated(directory, track_name, algorithm, arguments, timeout)
+            result.update({'size': size, 'width': width, 'algorithm': algorithm})
+            results.append(result)
+            print(f"{size}x{size} {algorithm}: {result['status']} "
+                  f"{result.get('time', float('nan')):.3f} s {result.get('peak memory', 0) / 2 ** 20:.1f} MB"
+                  + (f" store {result['store footprint'] / 2 ** 20:.1f} MB" if 'store footprint' in result else ""))
+            if algorithm == "transition_table" and result['status'] != 'ok':
+                break
+    return results
+
+"""
+Plot the training time and peak memory of every algorithm over the track size and save them as one figure
+"""
+def plot_results(results: List, file_path: str) -> None:
+    import matplotlib.pyplot as plt
+    fig, axes = plt.subplots(1, 2, figsize = (15, 6))
+    for algorithm in sorted(set(result['algorithm'] for result in results)):
+        runs = [result for result in results if result['algorithm'] == algorithm and result['status'] == 'ok']
+        if not runs:
+            continue
+        sizes = [result['size'] for result in runs]
+        axes[0].plot(sizes, [result['time'] for result in runs], marker = 'o', label = algorithm)
+        axes[1].plot(sizes, [result['peak memory'] / 2 ** 20 for result in runs], marker = 'o', label = algorithm)
+    axes[0].set_title("Time over track size")
+    axes[0].set_xlabel("Track size (rows = cols)")
+    axes[0].set_ylabel("Seconds")
+    axes[0].set_yscale("log")
+    axes[1].set_title("Peak memory over track size")
+    axes[1].set_xlabel("Track size (rows = cols)")
+    axes[1].set_ylabel("MB")
+    axes[1].set_yscale("log")
+    for axis in axes:
+        axis.legend()
+    plt.tight_layout()
+    plt.savefig(file_path)
+    plt.close(fig)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = "Benchmark the planners and learners on growing generated tracks")
+    parser.add_argument("--sizes", nargs = "+", type = int, default = [25, 50, 100, 200])
+    parser.add_argument("--algorithms", nargs = "+", choices = ALGORITHMS, default = ALGORITHMS)
+    parser.add_argument("--width", type = int, help = "Corridor width. Defaults to a tenth of the size")
+    parser.add_argument("--turns", type = int, default = 3)
+    parser.add_argument("--placement", choices = ["ends", "random"], default = "ends")
+    parser.add_argument("--seed", type = int, default = 0)
+    parser.add_argument("--prune", action = "store_true", help = "Train value iteration on reachable states only")
+    parser.add_argument("--store", choices = ["dense", "sparse"], default = "dense",
+                        help = "Value store of the python backends")
+    parser.add_argument("--discount", type = float, default = 0.9)
+    parser.add_argument("--threshold", type = float, default = 5)
+    parser.add_argument("--eta", type = float, default = 0.05)
+    parser.add_argument("--episodes", type = int, default = 50, help = "Episode budget of Q learning")
+    parser.add_argument("--timeout", type = float, default = 600, help = "Seconds before a run is stopped")
+    parser.add_argument("--memory-limit", type = int, help = "Address space limit of every run in MB")
+    parser.add_argument("--directory", help = "Directory of the generated tracks. Defaults to a temporary one")
+    parser.add_argument("--output", help = "Write the results to this JSON file")
+    parser.add_argument("--plot", help = "Save the time and memory curves to this image")
+    arguments = parser.parse_args()
+    directory = arguments.directory if arguments.directory is not None else tempfile.mkdtemp(prefix = "tracks-")
+    job_arguments = {'width': arguments.width, 'turns': arguments.turns, 'placement': arguments.placement,
+                     'seed': arguments.seed, 'prune': arguments.prune, 'store': arguments.store,
+                     'discount': arguments.discount,
+                     'threshold': arguments.threshold, 'eta': arguments.eta, 'episodes': arguments.episodes,
+                     'memory_limit': arguments.memory_limit}
+    results = run(arguments.sizes, arguments.algorithms, job_arguments, directory, arguments.timeout)
+    if arguments.output is not None:
+        with open(arguments.output, "w") as file:
+            json.dump({'meta': {'numpy': np.__version__, 'time': time.strftime("%Y-%m-%dT%H:%M:%S"),
+                                'arguments': vars(arguments)}, 'results': results}, file, indent = 2)
+    if arguments.plot is not None:
+        plot_results(results, arguments.plot)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from track import Track
+from value_iteration import Value_Iteration
+from sweep_schedules import SCHEDULES
+
+"""
+Compare the update schedules of value iteration on every bundled track. Each schedule is trained from scratch and
+its episode count, number of state backups and wall clock time are printed so the fastest converging schedule of
+each track can be picked.
+Run from the Code directory: python benchmarks/bench_schedules.py
+"""
+
+def main(directory: str = "tracks", movement_cost: float = -1, discount: float = 0.8, threshold: float = 5) -> None:
+    for track_name in ["L-track", "O-track", "R-track", "W-track"]:
+        track = Track(directory, track_name)
+        # Build the transition table outside of the timed runs
+        track.get_transition_table()
+        for schedule in ['sweep'] + SCHEDULES:
+            v = Value_Iteration(track, movement_cost, schedule = schedule)
+            v.train(discount, threshold)
+            report = v.get_training_report()
+            print(f"{track_name} {schedule}: {report['episodes']} episodes | {report['backups']} backups | "
+                  f"{report['time']:.2f} s")
+
+if __name__ == "__main__":
+    main()
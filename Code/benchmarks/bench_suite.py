@@ -0,0 +1,188 @@
+import os
+import sys
+import json
+import time
+import random
+import timeit
+import argparse
+import platform
+import tracemalloc
+from typing import Callable, Dict, List
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+import numpy as np
+from calculations import VELOCITY_COUNT, ACCELERATIONS, get_line_vector
+from track import Track
+from racecar import Racecar
+from learning_table import Value_Store, get_reward_from_accelerating
+from value_iteration import Value_Iteration
+from learning_model import Learning_Model
+
+"""
+Benchmark suite of the simulator, planner and learner hot paths. Micro benchmarks time single calls of
+get_line_vector, Track.closest_wall_on_collision, Racecar.traverse and get_reward_from_accelerating on a fixed
+sample of inputs. Macro benchmarks time Value_Iteration.train until convergence and Learning_Model.train for a
+fixed episode budget. Every benchmark reports the median and interquartile range of its time per call over all
+repeats and the peak traced memory of a warm up run as JSON. A results file can be compared against a baseline to
+flag regressions.
+Run from the Code directory:
+    python benchmarks/bench_suite.py --output results.json
+    python benchmarks/bench_suite.py --output results.json --baseline baseline.json
+    python benchmarks/bench_suite.py --results results.json --baseline baseline.json
+"""
+
+TRACK_NAMES = ["L-track", "O-track", "R-track", "W-track"]
+
+"""
+Time a benchmark. The benchmark runs once under tracemalloc to warm up and record its peak memory and is then timed
+repeat times. Each run performs calls operations and times are reported per operation.
+"""
+def measure(benchmark: Callable, calls: int, repeat: int) -> Dict:
+    tracemalloc.start()
+    benchmark()
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    times = np.array(timeit.repeat(benchmark, number = 1, repeat = repeat)) / calls
+    q1, median, q3 = np.percentile(times, [25, 50, 75])
+    return {'median': float(median), 'iqr': float(q3 - q1), 'q1': float(q1), 'q3': float(q3),
+            'min': float(times.min()), 'repeat': repeat, 'calls': calls, 'peak_memory': int(peak_memory)}
+
+"""
+Return the micro benchmarks of a track as (name, benchmark, calls) triples. Inputs are sampled once with a fixed
+seed so every run times the same work.
+"""
+def get_micro_benchmarks(track: Track, samples: int) -> List:
+    rng = random.Random(0)
+    track_list = track.track_list
+    rows, cols = len(track_list), len(track_list[0])
+    # Random moves from road cells
+    road_cells = [(row, col) for row in range(rows) for col in range(cols) if track_list[row][col] in ('.', 'S')]
+    moves = []
+    for _ in range(samples):
+        row, col = rng.choice(road_cells)
+        moves.append(([row, col], [row + rng.randint(-5, 5), col + rng.randint(-5, 5)]))
+    lines = [list(get_line_vector(previous, current, track_list)) for previous, current in moves]
+    # Random accelerations for the Racecar
+    accelerations = [rng.choice(ACCELERATIONS) for _ in range(samples)]
+    # Random state and action ids of road cells
+    store = Value_Store(track, -1000, 100, -1)
+    table = track.get_transition_table()
+    pairs = [((row * cols + col) * VELOCITY_COUNT + rng.randrange(VELOCITY_COUNT), rng.randrange(len(ACCELERATIONS)))
+             for row, col in (rng.choice(road_cells) for _ in range(samples))]
+
+    def line_vector() -> None:
+        for previous, current in moves:
+            get_line_vector(previous, current, track_list)
+
+    def closest_wall() -> None:
+        for line in lines:
+            track.closest_wall_on_collision(line)
+
+    def traverse() -> None:
+        random.seed(0)
+        racer = Racecar(track)
+        for acceleration in accelerations:
+            racer.traverse(acceleration, False)
+            if racer.finished():
+                racer = Racecar(track)
+
+    def reward_from_accelerating() -> None:
+        for state, action in pairs:
+            get_reward_from_accelerating(table, state, action, -1000, 100, store, True)
+
+    return [("get_line_vector", line_vector, samples), ("closest_wall_on_collision", closest_wall, samples),
+            ("traverse", traverse, samples), ("get_reward_from_accelerating", reward_from_accelerating, samples)]
+
+"""
+Return the macro benchmarks of a track as (name, benchmark, calls) triples. Value iteration trains until the
+threshold is met, which is a fixed amount of work per track. Q learning trains a fixed number of seeded episodes.
+"""
+def get_macro_benchmarks(track: Track, episodes: int) -> List:
+    def value_iteration(backend: str, prune: bool) -> Callable:
+        return lambda: Value_Iteration(track, -1, backend = backend, prune = prune).train(0.9, 5)
+
+    def q_learning(backend: str) -> Callable:
+        def benchmark() -> None:
+            random.seed(0)
+            # A threshold of 0 spends the whole episode budget
+            Learning_Model(track, -1, False, backend).train(0.05, 0.9, 1, 0, episodes)
+        return benchmark
+
+    return [("value_iteration_numpy", value_iteration('numpy', False), 1),
+            ("value_iteration_python_pruned", value_iteration('python', True), 1),
+            ("q_learning_python", q_learning('python'), 1),
+            ("q_learning_numpy", q_learning('numpy'), 1)]
+
+"""
+Run the selected benchmarks on every track and return the results keyed by {kind}/{benchmark}/{track}
+"""
+def run(directory: str, track_names: List, kinds: List, repeat: int, macro_repeat: int, samples: int,
+        episodes: int) -> Dict:
+    results = {}
+    for track_name in track_names:
+        track = Track(directory, track_name)
+        # Build the transition table outside of every timed run
+        track.get_transition_table()
+        if 'micro' in kinds:
+            for name, benchmark, calls in get_micro_benchmarks(track, samples):
+                results[f"micro/{name}/{track_name}"] = measure(benchmark, calls, repeat)
+                print(f"micro/{name}/{track_name}: {results[f'micro/{name}/{track_name}']['median'] * 1e6:.2f} us")
+        if 'macro' in kinds:
+            for name, benchmark, calls in get_macro_benchmarks(track, episodes):
+                results[f"macro/{name}/{track_name}"] = measure(benchmark, calls, macro_repeat)
+                print(f"macro/{name}/{track_name}: {results[f'macro/{name}/{track_name}']['median']:.3f} s")
+    return results
+
+"""
+Compare results against a baseline. A benchmark regressed if its median grew by more than the tolerance and by
+more than the interquartile ranges of both runs. Prints every shared benchmark and returns the regressed names.
+"""
+def compare(results: Dict, baseline: Dict, tolerance: float) -> List:
+    regressions = []
+    for name in sorted(set(results) & set(baseline)):
+        current, previous = results[name], baseline[name]
+        ratio = current['median'] / previous['median'] if previous['median'] > 0 else float('inf')
+        noise = current['iqr'] + previous['iqr']
+        regressed = ratio > 1 + tolerance and current['median'] - previous['median'] > noise
+        if regressed:
+            regressions.append(name)
+        print(f"{'REGRESSION' if regressed else 'ok':>10}  {name}: {ratio:.2f}x "
+              f"({previous['median']:.3g} s -> {current['median']:.3g} s)")
+    for name in sorted(set(baseline) - set(results)):
+        print(f"{'missing':>10}  {name}")
+    return regressions
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = "Benchmark the simulator, planner and learner hot paths")
+    parser.add_argument("--directory", default = "tracks")
+    parser.add_argument("--tracks", nargs = "+", default = TRACK_NAMES)
+    parser.add_argument("--kinds", nargs = "+", choices = ["micro", "macro"], default = ["micro", "macro"])
+    parser.add_argument("--repeat", type = int, default = 7, help = "Repeats of every micro benchmark")
+    parser.add_argument("--macro-repeat", type = int, default = 3, help = "Repeats of every macro benchmark")
+    parser.add_argument("--samples", type = int, default = 2000, help = "Calls per micro benchmark run")
+    parser.add_argument("--episodes", type = int, default = 50, help = "Episode budget of the Q learning benchmarks")
+    parser.add_argument("--output", help = "Write the results to this JSON file")
+    parser.add_argument("--results", help = "Compare this results file instead of running the benchmarks")
+    parser.add_argument("--baseline", help = "Flag regressions against this results file")
+    parser.add_argument("--tolerance", type = float, default = 0.10, help = "Allowed relative slow down")
+    arguments = parser.parse_args()
+    if arguments.results is not None:
+        with open(arguments.results) as file:
+            report = json.load(file)
+    else:
+        report = {'meta': {'python': platform.python_version(), 'numpy': np.__version__,
+                           'platform': platform.platform(), 'time': time.strftime("%Y-%m-%dT%H:%M:%S")},
+                  'results': run(arguments.directory, arguments.tracks, arguments.kinds, arguments.repeat,
+                                 arguments.macro_repeat, arguments.samples, arguments.episodes)}
+    if arguments.output is not None:
+        with open(arguments.output, "w") as file:
+            json.dump(report, file, indent = 2)
+    if arguments.baseline is not None:
+        with open(arguments.baseline) as file:
+            baseline = json.load(file)
+        regressions = compare(report['results'], baseline['results'], arguments.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regression(s)")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-from typing import List, Dict
+from typing import List, Dict, Tuple
 import numpy as np
 import random
 
@@ -8,6 +8,21 @@ This file is responsible for any calculation that our model needs to compute tha
 specifically tied to any class and is utilzied multiple times.
 """
 
+"""
+Velocity components are capped at [-5, 5] and acceleration components are contained within {-1, 0, 1}. 
+This means there are 11 possible values per velocity component (121 velocities) and 9 possible 
+accelerations. ACCELERATIONS lists every acceleration in the order the training loops visit them.
+"""
+VELOCITY_CAP = 5
+VELOCITY_RANGE = 2 * VELOCITY_CAP + 1
+VELOCITY_COUNT = VELOCITY_RANGE * VELOCITY_RANGE
+ACCELERATIONS = [[a_row, a_col] for a_row in [-1, 0, 1] for a_col in [-1, 0, 1]]
+
+"""
+An acceleration is only applied 80% of the time
+"""
+ACCELERATION_SUCCESS_RATE = 0.8
+
 """
 Pick either T/F randomly with respect to passed in weights. 
 Weights parameter can hold a maximum of two float values that contain the proportions
@@ -38,223 +53,106 @@ def sub (l1: List, l2: List) -> List:
     return [l1_e - l2_e for l1_e, l2_e in zip(l1, l2)]
 
 """
-Given two [x,y] coordinates, imagine a 2D rectangle with both points at any corner.
-This method determines the coordinates for the top left corner of imaginary rectange.
-"""
-def get_top_left(left: List, right: List) -> List:
-    # Left is coordinate that is closer to the left (West) 
-    # Check if left is bottom or top corner
-    # Check left coordinate's row is < or equal to right coordinate's row value
-    if left[0] <= right[0]:
-        # left is top left. Return it
-        return left
-    # Left is bottom left.
-    # Top left must have row coordinate of right position and col coordinate of left position
-    top_left = [right[0], left[1]]
-    return top_left
-
-"""
-Set top left to [0,0] and alter both coordinates with respect to distance from this anchor.
+Return the sign of an integer as -1, 0 or 1. This is the direction a line steps in along one axis. 
 """
-def reset_with_respect_top_left (top_left: List, left: List, right: List) -> List:
-    # Alter both positions to be relative distances from top_left
-    augmented_left = sub(left, top_left)
-    augmented_right = sub(right, top_left)
-    return augmented_left, augmented_right
+def sign(value: int) -> int:
+    return (value > 0) - (value < 0)
 
 """
-Augment two coordinates with respect to one another. This means to set one of the coordinates
-to [0, 0] and modify the other such that their relative distance remains the same. This is 
-done by assining the coordinate that is more left (WEST) as the [0, 0] anchor and then 
-augmenting the second coordinate with respect to this anchor. 
-"""
-# Augment Positions relative to one another
-def augment_positions(position1: List, position2: List) -> List:
-    # Determine which position is more left
-    if position1[1] < position2[1]: 
-        # Position1 is left position. 
-        # Create an imaginary rectangle encompassing both coordinates and determine top left
-        # coordinate of this rectangle
-        top_left = get_top_left(position1, position2)
-        # Augment values with respect to top left
-        new_pos1, new_pos2 = reset_with_respect_top_left(top_left, position1, position2)
-    else:
-        # Position2 is considered left position (Both could be within same column)
-        # Get top left position
-        top_left = get_top_left(position2, position1)
-        # Augment values with respect to top left
-        new_pos2, new_pos1 = reset_with_respect_top_left(top_left, position2, position1)
-    return new_pos1, new_pos2, top_left
-
+Return the cells of a straight line starting from [0, 0] and ending at the parameterized displacement. 
+The line steps diagonally until it is aligned with the goal on one axis and then steps straight along the 
+other axis. 
 """
-Given two parameterized coordinates representing the start and the goal state, return
-a string corresponding to a straight line through the two points. 
-"""
-def get_direction(origin: List, goal: List) -> str:
-    # Get the difference to determine direction of straight line
-    difference = sub(origin, goal)
-    # If difference is (<0, <0), goal is SE of origin
-    if difference[0] < 0 and difference[1] < 0: return "SE"
-    # If difference is (<0, 0), goal is S of origin
-    if difference[0] < 0 and difference[1] == 0: return "S"
-    # If difference is (<0, >0), goal is SW of origin
-    if difference[0] < 0 and difference[1] > 0: return "SW"
-    # If difference is (0, <0), goal is E
-    if difference[0] == 0 and difference[1] < 0: return "E"
-    # If difference is (0, 0), goal is equal to origin
-    if difference[0] == 0 and difference[1] == 0: return "None"
-    # If difference is (0, >0), goal is W
-    if difference[0] == 0 and difference[1] > 0: return "W"
-    # If difference is (>0, <0), goal is NE
-    if difference[0] > 0 and difference[1] < 0: return "NE"
-    # If difference is (>0, 0), goal is N
-    if difference[0] > 0 and difference[1] == 0: return "N"
-    # If difference is (>0, >0), goal is NW 
-    if difference[0] > 0 and difference[1] > 0: return "NW"
+def rasterize_line(d_row: int, d_col: int) -> Tuple:
+    # Direction of the line along each axis
+    step_row = sign(d_row)
+    step_col = sign(d_col)
+    # Number of diagonal steps and number of straight steps that follow
+    diagonal_steps = min(abs(d_row), abs(d_col))
+    straight_steps = max(abs(d_row), abs(d_col)) - diagonal_steps
+    # Only the axis that is not yet aligned keeps stepping after the diagonal portion
+    straight_row = step_row if abs(d_row) > abs(d_col) else 0
+    straight_col = step_col if abs(d_col) > abs(d_row) else 0
+    offsets = [(step * step_row, step * step_col) for step in range(diagonal_steps + 1)]
+    corner_row, corner_col = offsets[diagonal_steps]
+    offsets += [(corner_row + step * straight_row, corner_col + step * straight_col) for step in range(1, straight_steps + 1)]
+    return tuple(offsets)
 
 """
-Given a string direction, determine the movement required to move in that direction. Meaning
-if we were to traverse North, we would need to go up one row. This translates to [-1, 0]. 
-This is done for all possible directions except None position.
-"""
-# Create incrementors based on direction
-def get_incrementors (direction: str) -> List:
-    # If direction == N, increment by [-1, 0]
-    if direction == "N": return -1, 0
-    # If direction == NE, increment by [-1, 1]
-    if direction == "NE": return -1, 1
-    # If direction == E, increment by [0, 1]
-    if direction == "E": return 0, 1
-    # If direction == SE, increment by [1, 1]
-    if direction == "SE": return 1, 1
-    # If direction == S, increment by [1, 0]
-    if direction == "S": return 1, 0
-    # If direction == SW, increment by [1, -1]
-    if direction == "SW": return 1, -1
-    # If direction == W, increment by [0, -1]
-    if direction == "W": return 0, -1
-    # If direction == NW, increment by [-1, -1]
-    if direction == "NW": return -1, -1
-
+A line only depends on the displacement between its two end points and a Racecar can only move by one of 
+121 displacements. Lines are rasterized once per displacement and cached within this dictionary. 
 """
-Return a list of indices corresponding to as straight line as possible from the origin to 
-the goal coordinates. 
-"""
-def draw_straight_line(corner_origin: List, corner_goal: List) -> List:
-    # Initialize straight_line list
-    straight_line_indices = [corner_origin]
-    # Set the current location as origin
-    current_location = corner_origin
-    # Iterate till we reach the goal
-    while current_location != corner_goal:
-        # Determine which direction we need to traverse via get_direction
-        direction = get_direction(current_location, corner_goal) 
-        # If origin and goal are the exact same, we return either
-        if direction == "None": return straight_line_indices
-        # Get incrementors for movement in particular direction
-        row_incrementor, col_incrementor = get_incrementors(direction)
-        # Alter current location
-        current_location = add(current_location, [row_incrementor, col_incrementor])
-        # Add location to indices
-        straight_line_indices.append(current_location)
-    return straight_line_indices
+LINE_OFFSETS = {}
 
 """
-Augmented coordinates are those that are 'encapsulated' in an imaginary rectangle and are 
-altered to represent their location within the rectangle while maintaining their relative 
-distance. This method reverts the alteration to turn both coordintates (within the l List) 
-back to their original values. This is done by adding both coordinates with the coordinates
-of the top left of the rectangle. 
-"""
-def revert_augment(l: List, top_left: List) -> List:
-    # Add coordinates of top_left to each coordinate in l. This will revert the values
-    new_l = []
-    for coordinate in l:
-        new_l.append(add(coordinate, top_left))
-    return new_l
+Return the cached cells of a straight line from [0, 0] to the parameterized displacement.
+"""
+def get_line_offsets(d_row: int, d_col: int) -> Tuple:
+    offsets = LINE_OFFSETS.get((d_row, d_col))
+    if offsets is None:
+        offsets = LINE_OFFSETS[(d_row, d_col)] = rasterize_line(d_row, d_col)
+    return offsets
 
 """
-A vector may contain values that are beyond the range of the track. We do not care about these
-values as assume them to be invalid/wall. Return only the portion of the list whose coordiantes are
-contained within the matrix parameter. 
+This method draws a line vector between two points as a tuple of (row, col) coordinates. The line is looked 
+up from the displacement cache and shifted to start at the previous position. Coordinates beyond the range 
+of the track are invalid/wall so the line is cut at the first coordinate outside of the track. 
 """
-def refine_line_vector(line_vector: List, matrix: List) -> List:
-    # Returns only the portion of the line_vector that is contained within matrix
+def get_line_vector(previous: List, current: List, track_list: List) -> Tuple:
     # Get matrix dimensions
-    row_size = len(matrix)
-    col_size = len(matrix[0])
-    # Iterate through line_vectors
-    valid_coordinates = []
-    for coordinate in line_vector:
-        row, col = coordinate
-        # If any coordinate is invalid, return the valid coordinates
+    row_size = len(track_list)
+    col_size = len(track_list[0])
+    origin_row, origin_col = previous[0], previous[1]
+    offsets = get_line_offsets(current[0] - origin_row, current[1] - origin_col)
+    # A straight line never leaves the rectangle spanned by its end points so the whole line is valid if both are
+    if (0 <= current[0] < row_size and 0 <= current[1] < col_size and
+        0 <= origin_row < row_size and 0 <= origin_col < col_size):
+        return tuple([(origin_row + d_row, origin_col + d_col) for d_row, d_col in offsets])
+    # Otherwise keep coordinates until the line leaves the track. It is impossible to step outside and re-enter
+    line_vector = []
+    for d_row, d_col in offsets:
+        row = origin_row + d_row
+        col = origin_col + d_col
         if row < 0 or row >= row_size or col < 0 or col >= col_size:
-             # It is impossible for a straight line to step outside matrix dimensions and then re-enter 
-            return valid_coordinates
-        # If valid, append
-        valid_coordinates.append(coordinate)
-    # All valid so just return
-    return valid_coordinates
+            break
+        line_vector.append((row, col))
+    return tuple(line_vector)
 
 """
-This method draws a line vector between two points. This is done by first drawing out the imaginary
-rectangle then drawing the straight lines between the two augmented positions. The coordinates'
-augmentation is then reverted and then finally the line vector is refined before returning. 
-"""
-def get_line_vector(previous: List, current: List, track_list: List) -> List:
-    # Determine the quickest path from position1 to position 2
-    # Augment the two positions and store top_left for reverting augmentation
-    previous_augmented, current_augmented, top_left = augment_positions(previous, current)
-    # Starting from either corner, get straight line through points
-    line_indices_augmented = draw_straight_line(previous_augmented, current_augmented)
-    # Revert indices augmentation and return
-    line_indices_reverted = revert_augment(line_indices_augmented, top_left)
-    # Refine to get valid line vector
-    line_vector = refine_line_vector(line_indices_reverted, track_list)
-    return line_vector
+Calculate and return mean of a list.
+"""
+def list_mean(l: List) -> float:
+    return sum(l) / len(l)
+
+"""
+Convert a velocity in the format List(v_row, v_col) into its index within [0, 121). The index is
+(v_row + 5) * 11 + (v_col + 5) which orders velocities the same way the training loops iterate them. 
+"""
+def velocity_to_index(velocity: List) -> int:
+    return (velocity[0] + VELOCITY_CAP) * VELOCITY_RANGE + (velocity[1] + VELOCITY_CAP)
 
 """
-This method returns the maximum value within a dictionary while ignoring certain keys. 
-This is critical when attempting to determine the maximum value of a subset of keys within
-a dictionary. 
-"""
-def get_max_from_subset(dict: Dict, keys_to_ignore: List) -> str:
-    # Initialize maximum values
-    max_value = -99999
-    max_key = None
-    for key, value in dict.items(): 
-        # If key is contained within keys_to_ignore, ignore it
-        if key in keys_to_ignore:
-            continue
-        # Compare value with max value
-        if value > max_value:
-            max_value = value
-            max_key = key
-    # Return the maximum key in the format it was passed in
-    return max_key
+Convert a velocity index within [0, 121) back to a velocity in the format List(v_row, v_col).
+"""
+def index_to_velocity(index: int) -> List:
+    return [index // VELOCITY_RANGE - VELOCITY_CAP, index % VELOCITY_RANGE - VELOCITY_CAP]
 
 """
-This method converts a coordinate in the format str("[x, y]") to list in the format
-List(x, y). 
-"""
-def convert_coordinate_to_list(coordinate: str) -> List:
-    # Get the x value
-    # Exclude [ character
-    x_portion = int(coordinate[1:].split(',')[0])
-    # Get y value
-    # Exclude ] character
-    y_portion = int(coordinate.split(',')[1][:-1])
-    return [x_portion, y_portion]
+Convert an acceleration in the format List(a_row, a_col) into its index within ACCELERATIONS.
+"""
+def acceleration_to_index(acceleration: List) -> int:
+    return (acceleration[0] + 1) * 3 + (acceleration[1] + 1)
 
 """
-This method converts a List in the format List(x, y) to a coordinate in the format 
-str("[x, y]").
+Pack a position in the format List(row, col) and a velocity into a single integer state id. The position is 
+flattened into the cell index row * cols + col and the state id is cell index * 121 + velocity index.
 """
-def convert_list_to_coordinate(l: List) -> str:
-    return f"[{l[0]}, {l[1]}]"
+def encode_state(position: List, velocity: List, cols: int) -> int:
+    return (position[0] * cols + position[1]) * VELOCITY_COUNT + velocity_to_index(velocity)
 
 """
-Calculate and return mean of a list.
+Unpack an integer state id into a position in the format List(row, col) and a velocity.
 """
-def list_mean(l: List) -> float:
-    return sum(l) / len(l)
\ No newline at end of file
+def decode_state(state: int, cols: int) -> List:
+    cell, velocity_index = divmod(state, VELOCITY_COUNT)
+    return [cell // cols, cell % cols], index_to_velocity(velocity_index)
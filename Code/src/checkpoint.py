@@ -0,0 +1,81 @@
+from typing import Dict
+import threading
+import warnings
+import pickle
+import queue
+import os
+
+"""
+This file writes and reads training checkpoints. A checkpoint is a dictionary snapshot of everything a training run
+needs to continue exactly where it stopped. Snapshots are handed to a background thread which writes each one to a
+temporary file and moves it into place, so the training loop never waits on the disk and a crash never leaves a
+partially written checkpoint behind.
+"""
+
+class Checkpoint_Writer:
+    def __init__(self, file_path: str) -> None:
+        self.file_path = file_path
+        # At most one snapshot waits while another is written
+        self.queue = queue.Queue(maxsize = 1)
+        # Error raised by the writer thread
+        self.error = None
+        self.thread = threading.Thread(target = self.run, daemon = True)
+        self.thread.start()
+
+    """
+    Queue a snapshot to be written. The snapshot must not be modified afterwards.
+    """
+    def save(self, snapshot: Dict) -> None:
+        if self.error is not None:
+            raise self.error
+        self.queue.put(snapshot)
+
+    """
+    Write every queued snapshot until the writer is closed
+    """
+    def run(self) -> None:
+        while True:
+            snapshot = self.queue.get()
+            if snapshot is None:
+                return
+            try:
+                save_checkpoint(self.file_path, snapshot)
+            except Exception as error:
+                self.error = error
+
+    """
+    Wait for every queued snapshot to be written and stop the writer thread. An error of the writer thread is raised,
+    or only reported as a warning if raise_error is False, e.g. while another exception is already propagating so
+    that it does not replace that exception.
+    """
+    def close(self, raise_error: bool = True) -> None:
+        self.queue.put(None)
+        self.thread.join()
+        if self.error is not None:
+            if raise_error:
+                raise self.error
+            warnings.warn(f"Writing the checkpoint {self.file_path} failed: {self.error!r}", RuntimeWarning)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception, traceback) -> None:
+        self.close(raise_error = exception_type is None)
+
+"""
+Write a snapshot to a temporary file, flush it to disk and move it into place
+"""
+def save_checkpoint(file_path: str, snapshot: Dict) -> None:
+    temporary_path = f"{file_path}.{os.getpid()}.tmp"
+    with open(temporary_path, "wb") as file:
+        pickle.dump(snapshot, file, protocol = pickle.HIGHEST_PROTOCOL)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary_path, file_path)
+
+"""
+Read a checkpoint written by save_checkpoint
+"""
+def load_checkpoint(file_path: str) -> Dict:
+    with open(file_path, "rb") as file:
+        return pickle.load(file)
@@ -0,0 +1,136 @@
+from track import Track
+from value_iteration import Value_Iteration
+from track_generator import write_track
+from instrumentation import Instrumentation
+from calculations import VELOCITY_CAP, VELOCITY_RANGE, VELOCITY_COUNT
+from typing import List
+import numpy as np
+import tempfile
+import time
+
+"""
+This file holds a coarse to fine planner for large tracks. The track is first coarsened by aggregating every k x k
+block of cells into one cell and solved with the numpy backend of value iteration. Every full resolution state is
+then warm started with the value of the coarse state that covers its position, with its velocity scaled down by k
+so that a coarse move covers about the same distance as the full resolution move. The full resolution model then
+trains as usual from those values. The gauss_seidel schedule also sweeps the states closest to the finish line
+first and the prioritized schedule starts from the Bellman errors of the warm values. Without a directory the coarse
+track and its transition table are written to a temporary directory that is removed once the coarse model is solved.
+"""
+
+"""
+Return the cells of a coarsened track. A block becomes a finish cell if it holds any finish cell, a start cell if
+it holds any start cell, a road cell if it holds any road cell and a wall otherwise. Keeping every block with road
+keeps narrow corridors connected. The coarse track is surrounded by walls like every track.
+"""
+def coarsen_track_list(track_list: List, factor: int) -> List:
+    rows, cols = len(track_list), len(track_list[0])
+    coarse_rows, coarse_cols = -(-rows // factor), -(-cols // factor)
+    coarse_list = []
+    for coarse_row in range(coarse_rows):
+        coarse_line = []
+        for coarse_col in range(coarse_cols):
+            block = {track_list[row][col]
+                     for row in range(coarse_row * factor, min((coarse_row + 1) * factor, rows))
+                     for col in range(coarse_col * factor, min((coarse_col + 1) * factor, cols))}
+            for cell in ('F', 'S', '.'):
+                if cell in block:
+                    coarse_line.append(cell)
+                    break
+            else:
+                coarse_line.append('#')
+        coarse_list.append(coarse_line)
+    # Border the coarse track with walls
+    width = coarse_cols + 2
+    return [['#'] * width] + [['#'] + line + ['#'] for line in coarse_list] + [['#'] * width]
+
+"""
+Write the coarsened track into the directory and load it
+"""
+def coarsen_track(track: Track, factor: int, directory: str) -> Track:
+    track_name = f"{track.track_name}-coarse-{factor}"
+    write_track(directory, track_name, coarsen_track_list(track.track_list, factor))
+    return Track(directory, track_name)
+
+class Coarse_To_Fine(Value_Iteration):
+    def __init__(self, track: Track, movement_cost: float, factor: int = 2, backend: str = 'python',
+                 schedule: str = 'gauss_seidel', prune: bool = False, restart: bool = False,
+                 stochastic: bool = False, store: str = 'dense', directory: str = None) -> None:
+        if factor < 2:
+            raise ValueError(f"Coarsening factor {factor} must be at least 2")
+        super().__init__(track, movement_cost, backend, schedule, prune, restart, stochastic, store)
+        self.factor = factor
+        # Directory of the coarse track files when none is given. Removed once the coarse model is solved
+        self.temporary_directory = None
+        if directory is None:
+            self.temporary_directory = tempfile.TemporaryDirectory(prefix = "coarse-tracks-")
+            directory = self.temporary_directory.name
+        # Model of the coarsened track
+        self.coarse_track = coarsen_track(track, factor, directory)
+        self.coarse_model = Value_Iteration(self.coarse_track, movement_cost, 'numpy', prune = prune,
+                                            restart = restart, stochastic = stochastic)
+
+    """
+    Getter
+    """
+    def get_coarse_model(self) -> Value_Iteration:
+        return self.coarse_model
+
+    """
+    Remove the temporary directory of the coarse track files if there is one. The coarse track and its transition
+    table stay in memory.
+    """
+    def remove_temporary_directory(self) -> None:
+        if self.temporary_directory is not None:
+            self.temporary_directory.cleanup()
+            self.temporary_directory = None
+
+    """
+    Scale velocity component indices down to the coarse track. Components are rounded away from zero so that a
+    moving racer never maps onto a stopped coarse racer.
+    """
+    def scale_velocity(self, velocity_indices: np.ndarray) -> np.ndarray:
+        # Velocities are stored offset by the cap
+        velocities = velocity_indices - VELOCITY_CAP
+        return np.sign(velocities) * (-(-np.abs(velocities) // self.factor)) + VELOCITY_CAP
+
+    """
+    Return the initial value of every full resolution state id from the trained coarse model. A state maps to the
+    coarse cell that covers its position, offset by the coarse track's wall border, and to its velocity divided by
+    the factor and rounded. States whose coarse state was never trained hold NaN.
+    """
+    def get_initial_values(self) -> np.ndarray:
+        coarse_values = self.coarse_model.get_values()
+        coarse_cols = len(self.coarse_track.track_list[0])
+        states = np.asarray(self.states, dtype = np.int64)
+        cells, velocity_indices = np.divmod(states, VELOCITY_COUNT)
+        rows, cols = np.divmod(cells, self.value_store.cols)
+        velocity_rows, velocity_cols = np.divmod(velocity_indices, VELOCITY_RANGE)
+        coarse_velocity_rows = self.scale_velocity(velocity_rows)
+        coarse_velocity_cols = self.scale_velocity(velocity_cols)
+        coarse_cells = (rows // self.factor + 1) * coarse_cols + cols // self.factor + 1
+        coarse_states = coarse_cells * VELOCITY_COUNT + coarse_velocity_rows * VELOCITY_RANGE + coarse_velocity_cols
+        initial_values = np.full(self.value_store.state_count, np.nan)
+        initial_values[states] = coarse_values[coarse_states]
+        return initial_values
+
+    """
+    Train the coarse model and then the full resolution model warm started from it. Both models train with the
+    same discount and threshold. The training report holds the full resolution episodes and backups and the time
+    and episodes of the coarse model.
+    """
+    def train(self, discount: float, threshold: float, debug = False, instrumentation: Instrumentation = None,
+              initial_values: np.ndarray = None) -> int:
+        start_time = time.time()
+        try:
+            coarse_episodes = self.coarse_model.train(discount, threshold, debug)
+        finally:
+            self.remove_temporary_directory()
+        coarse_time = time.time() - start_time
+        if initial_values is None:
+            initial_values = self.get_initial_values()
+        episode_count = super().train(discount, threshold, debug, instrumentation, initial_values)
+        self.training_report.update({'factor': self.factor, 'coarse episodes': coarse_episodes,
+                                     'coarse time': coarse_time, 'time': time.time() - start_time})
+        if debug: print(f"Coarse to fine value iteration: {self.training_report}")
+        return episode_count
@@ -0,0 +1,70 @@
+from replay_buffer import REPLAY_DTYPE
+from typing import Dict
+import numpy as np
+
+"""
+This file holds the model table of the Dyna-Q mode of the numpy Q learning backend. Every (state, action) pair the
+racer has taken is recorded once within a compact table together with its observed reward, next state and whether
+it crossed the finish line, and later observations of the same pair overwrite its record. Accelerations never fail
+during training, so the table is an exact model of every pair it holds. After every real step a batch of recorded
+pairs is drawn uniformly and planned as one vectorized Q learning update, so the finish reward spreads through the
+Q values without tracing further episodes. Records share the layout of replay records and the table grows by
+doubling, so it only holds the pairs that were observed.
+"""
+
+class Dyna_Model:
+    def __init__(self, planning_steps: int, capacity: int = 1024) -> None:
+        if planning_steps < 1 or capacity < 1:
+            raise ValueError(f"Invalid planning steps {planning_steps} or model capacity {capacity}")
+        self.planning_steps = planning_steps
+        self.records = np.zeros(capacity, dtype = REPLAY_DTYPE)
+        # Row of every observed (state id, action id) pair within the records
+        self.rows = {}
+        self.size = 0
+
+    """
+    Getters
+    """
+    def get_size(self) -> int:
+        return self.size
+
+    def get_planning_steps(self) -> int:
+        return self.planning_steps
+
+    """
+    Record the outcome of taking an action within a state
+    """
+    def add(self, state: int, action: int, reward: float, next_state: int, done: bool) -> None:
+        pair = (state, action)
+        row = self.rows.get(pair)
+        if row is None:
+            row = self.size
+            if row == len(self.records):
+                self.records = np.concatenate([self.records, np.zeros(row, dtype = REPLAY_DTYPE)])
+            self.rows[pair] = row
+            self.size += 1
+        self.records[row] = (state, action, reward, next_state, done)
+
+    """
+    Draw the records of a planning batch uniformly with replacement from the observed pairs. A pair drawn several
+    times is applied once with the mean of its updates, see Q_Tensor.update_batch.
+    """
+    def sample(self) -> np.ndarray:
+        return self.records[np.random.randint(0, self.size, size = self.planning_steps)]
+
+    """
+    Return a snapshot of the model for a checkpoint
+    """
+    def get_snapshot(self) -> Dict:
+        return {'records': self.records[:self.size].copy()}
+
+    """
+    Restore the model from a checkpoint snapshot
+    """
+    def restore_snapshot(self, snapshot: Dict) -> None:
+        records = snapshot['records']
+        self.size = len(records)
+        self.records = np.zeros(max(self.size, len(self.records)), dtype = REPLAY_DTYPE)
+        self.records[:self.size] = records
+        self.rows = {(int(state), int(action)): row
+                     for row, (state, action) in enumerate(zip(records['state'], records['action']))}
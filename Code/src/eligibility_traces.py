@@ -0,0 +1,59 @@
+from typing import Dict
+import numpy as np
+
+"""
+This file holds the sparse eligibility traces of the Q(lambda) and SARSA(lambda) modes of the numpy Q learning
+backend. Only the (state, action) pairs touched during the running episode hold a trace, kept within a dictionary
+from pair id (state id * action count + action id) to eligibility. Every TD error updates the Q value of every traced
+pair in proportion to its eligibility, so the finish reward flows back along the whole recent path of the racer in a
+single step. Traces are replacing: a revisited pair is set back to 1. After every update all traces decay by the
+discount times lambda and traces that fall below the cutoff are dropped, so at most log(cutoff) / log(discount *
+lambda) pairs are ever traced and the cost of a step stays bounded however long the episode runs.
+"""
+
+"""
+Smallest eligibility kept within the traces
+"""
+TRACE_CUTOFF = 0.01
+
+class Eligibility_Traces:
+    def __init__(self, discount: float, trace_decay: float, cutoff: float = TRACE_CUTOFF) -> None:
+        if not 0 < trace_decay <= 1 or not 0 < cutoff < 1:
+            raise ValueError(f"Invalid trace decay {trace_decay} or trace cutoff {cutoff}")
+        self.trace_decay = trace_decay
+        self.cutoff = cutoff
+        # Factor every eligibility is multiplied by after an update
+        self.decay = discount * trace_decay
+        # Eligibility of every traced pair id
+        self.traces = {}
+
+    """
+    Getter
+    """
+    def get_traces(self) -> Dict:
+        return self.traces
+
+    """
+    Drop every trace, e.g. at the end of an episode
+    """
+    def clear(self) -> None:
+        self.traces = {}
+
+    """
+    Set the trace of a pair id to 1
+    """
+    def visit(self, pair: int) -> None:
+        self.traces[pair] = 1.0
+
+    """
+    Move the flat Q value of every traced pair id by step times its eligibility, then decay every trace and drop the
+    traces below the cutoff
+    """
+    def update(self, action_values: np.ndarray, step: float) -> None:
+        traces = {}
+        for pair, trace in self.traces.items():
+            action_values[pair] += step * trace
+            trace *= self.decay
+            if trace >= self.cutoff:
+                traces[pair] = trace
+        self.traces = traces
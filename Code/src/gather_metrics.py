@@ -1,6 +1,7 @@
 import matplotlib.pyplot as plt
 from calculations import list_mean
 from typing import Dict, List
+import numpy as np
 
 """
 This file is responsible for the gathering and plotting of racing metrics. 
@@ -75,4 +76,24 @@ def plot_metrics(metrics: Dict, title: str) -> None:
     # Save plot
     file_name = f"{title}.png"
     plt.savefig(file_name)
+    plt.close(fig)
 
+"""
+This method plots the visit and wall hit heatmaps of a trajectory log side by side and saves them as
+{title}_heatmap.png
+"""
+def plot_heatmaps(visits: np.ndarray, walls: np.ndarray, title: str) -> None:
+    fig, axes = plt.subplots(1, 2, figsize = (15, 6))
+    # Plot visits
+    image = axes[0].imshow(visits, cmap = 'hot', interpolation = 'nearest')
+    axes[0].set_title("Visits per position")
+    fig.colorbar(image, ax = axes[0])
+    # Plot wall hits by reset position
+    image = axes[1].imshow(walls, cmap = 'hot', interpolation = 'nearest')
+    axes[1].set_title("Wall hits per reset position")
+    fig.colorbar(image, ax = axes[1])
+    # Adjust layout
+    plt.tight_layout()
+    # Save plot
+    plt.savefig(f"{title}_heatmap.png")
+    plt.close(fig)
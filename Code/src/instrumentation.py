@@ -0,0 +1,246 @@
+from typing import Callable, Dict, List
+import numpy as np
+import functools
+import importlib
+import inspect
+import marshal
+import cProfile
+import pstats
+import time
+import sys
+import io
+import os
+
+"""
+This file holds the opt in instrumentation of the simulator, planners and learners. Nothing is instrumented until
+enable is called, so a run without instrumentation pays nothing for it. Once enabled, every function and method
+defined within the instrumented modules is replaced by a wrapper that counts its calls and adds up its wall clock
+time, including functions that other modules imported by name. Times are inclusive of nested calls. With profiling,
+cProfile records the run instead of the wrappers. Independent of either mode, the training loops report every episode
+or sweep: its steps, wall hits and duration and a histogram of the absolute TD errors of its updates.
+"""
+
+"""
+Modules instrumented by default. The transition table, Q tensor, value tensor and sweep schedules hold the hot
+path of every backend.
+"""
+DEFAULT_MODULES = ['calculations', 'track', 'transition_table', 'racecar', 'learning_table', 'value_iteration',
+                   'value_tensor', 'sweep_schedules', 'learning_model', 'q_tensor']
+
+"""
+Edges of the absolute TD error histogram of an episode
+"""
+TD_ERROR_BINS = np.array([0, 1e-3, 1e-2, 1e-1, 1, 10, 100, 1000, np.inf])
+
+"""
+Directory of the instrumented source files. Only modules loaded from here have their imported names replaced.
+"""
+SOURCE_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+class Instrumentation:
+    def __init__(self, modules: List = None, profile: bool = False) -> None:
+        self.modules = DEFAULT_MODULES if modules is None else modules
+        self.profile = profile
+        # Calls and total seconds of every wrapped function by qualified name
+        self.counters = {}
+        # Record of every episode or sweep reported by a training loop
+        self.episodes = []
+        # TD errors of the running episode. Training loops append to this list
+        self.td_errors = []
+        # Start of the running episode
+        self.episode_start = None
+        # (owner, attribute, original) of every replaced attribute
+        self.patches = []
+        self.profiler = None
+        self.enabled = False
+
+    """
+    Getters
+    """
+    def get_counters(self) -> Dict:
+        return self.counters
+
+    def get_episodes(self) -> List:
+        return self.episodes
+
+    """
+    Return a wrapper of a function that counts its calls and times them under the given name
+    """
+    def wrap(self, name: str, function: Callable) -> Callable:
+        counter = self.counters.setdefault(name, [0, 0.0])
+        clock = time.perf_counter
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                counter[0] += 1
+                counter[1] += clock() - start
+        return wrapper
+
+    """
+    Replace an attribute and remember the original so that disable can restore it
+    """
+    def patch(self, owner, attribute: str, value) -> None:
+        self.patches.append((owner, attribute, getattr(owner, attribute)))
+        setattr(owner, attribute, value)
+
+    """
+    Start instrumenting. Either every function and method of the instrumented modules is wrapped or the profiler
+    is started.
+    """
+    def enable(self) -> None:
+        if self.enabled:
+            return
+        self.enabled = True
+        if self.profile:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+            return
+        wrappers = {}
+        for module_name in self.modules:
+            module = importlib.import_module(module_name)
+            for name, value in list(vars(module).items()):
+                if getattr(value, '__module__', None) != module_name:
+                    continue
+                if inspect.isfunction(value):
+                    wrappers[value] = self.wrap(f"{module_name}.{name}", value)
+                elif inspect.isclass(value):
+                    # Methods are replaced on the class itself so every instance sees the wrapper
+                    for attribute, method in list(vars(value).items()):
+                        if inspect.isfunction(method):
+                            self.patch(value, attribute, self.wrap(f"{module_name}.{name}.{attribute}", method))
+        # Replace every reference to a wrapped function, including names imported into other modules
+        for module in list(sys.modules.values()):
+            file_path = getattr(module, '__file__', None)
+            if file_path is None or os.path.dirname(os.path.abspath(file_path)) != SOURCE_DIRECTORY:
+                continue
+            for name, value in list(vars(module).items()):
+                if inspect.isfunction(value) and value in wrappers:
+                    self.patch(module, name, wrappers[value])
+
+    """
+    Stop instrumenting and restore every replaced attribute. Counters and episode records are kept.
+    """
+    def disable(self) -> None:
+        if not self.enabled:
+            return
+        self.enabled = False
+        if self.profiler is not None:
+            self.profiler.disable()
+        # Restore in reverse order in case an attribute was replaced twice
+        for owner, attribute, original in reversed(self.patches):
+            setattr(owner, attribute, original)
+        self.patches = []
+
+    def __enter__(self):
+        self.enable()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.disable()
+
+    """
+    Return a function that records the progress of a training loop after every episode or sweep. Episode times are
+    measured from the call to this method and then from the previous record.
+    """
+    def get_episode_hook(self, kind: str) -> Callable:
+        self.episode_start = time.perf_counter()
+        self.td_errors.clear()
+        def on_episode(progress: Dict) -> None:
+            self.record_episode(kind, progress)
+        return on_episode
+
+    """
+    Record one episode or sweep of a training loop. The steps and wall hits of the episode are recorded if the
+    progress holds them and the TD errors gathered since the last record are binned into a histogram.
+    """
+    def record_episode(self, kind: str, progress: Dict) -> None:
+        now = time.perf_counter()
+        record = {'kind': kind, 'episode': progress['episodes'], 'time': now - self.episode_start,
+                  'biggest delta': float(progress['biggest delta']),
+                  'steps': progress.get('episode steps'), 'wall hits': progress.get('episode wall hits'),
+                  'td histogram': None}
+        if self.td_errors:
+            record['td histogram'] = np.histogram(np.abs(self.td_errors), TD_ERROR_BINS)[0].tolist()
+            self.td_errors.clear()
+        self.episodes.append(record)
+        self.episode_start = now
+
+    """
+    Return the summed TD error histogram of every recorded episode of a kind
+    """
+    def get_td_histogram(self, kind: str) -> np.ndarray:
+        histogram = np.zeros(len(TD_ERROR_BINS) - 1, dtype = np.int64)
+        for record in self.episodes:
+            if record['kind'] == kind and record['td histogram'] is not None:
+                histogram += record['td histogram']
+        return histogram
+
+    """
+    Return the pstats dictionary of the profiled run or None without profiling
+    """
+    def get_stats(self) -> Dict:
+        if self.profiler is None:
+            return None
+        return pstats.Stats(self.profiler).stats
+
+    """
+    Return a summary table of the run: the limit most expensive functions by total time and the episode statistics
+    of every training loop
+    """
+    def get_summary(self, limit: int = 30) -> str:
+        lines = []
+        if self.profiler is not None:
+            stream = io.StringIO()
+            pstats.Stats(self.profiler, stream = stream).sort_stats('cumulative').print_stats(limit)
+            lines.append(stream.getvalue())
+        else:
+            lines.append(f"{'Function':<55} {'Calls':>12} {'Total s':>10} {'Per call us':>12}")
+            ranked = sorted(self.counters.items(), key = lambda item: item[1][1], reverse = True)
+            for name, (calls, seconds) in ranked[:limit]:
+                if calls > 0:
+                    lines.append(f"{name:<55} {calls:>12} {seconds:>10.3f} {seconds / calls * 1e6:>12.2f}")
+        for kind in sorted(set(record['kind'] for record in self.episodes)):
+            records = [record for record in self.episodes if record['kind'] == kind]
+            times = [record['time'] for record in records]
+            lines.append(f"\n{kind}: {len(records)} episodes | total {sum(times):.3f} s | "
+                         f"mean {np.mean(times) * 1e3:.3f} ms | max {max(times) * 1e3:.3f} ms")
+            steps = [record['steps'] for record in records if record['steps'] is not None]
+            if steps:
+                wall_hits = [record['wall hits'] for record in records]
+                lines.append(f"steps per episode: mean {np.mean(steps):.1f} | max {max(steps)} | "
+                             f"wall hits per episode: mean {np.mean(wall_hits):.2f} | max {max(wall_hits)}")
+            histogram = self.get_td_histogram(kind)
+            if histogram.sum() > 0:
+                lines.append("|TD error| histogram:")
+                for low, high, count in zip(TD_ERROR_BINS[:-1], TD_ERROR_BINS[1:], histogram):
+                    lines.append(f"  [{low:g}, {high:g}): {count}")
+        return "\n".join(lines)
+
+    """
+    Return everything a parent process needs to write the artifacts of the run. The report can be pickled.
+    """
+    def get_report(self) -> Dict:
+        return {'summary': self.get_summary(), 'episodes': self.episodes, 'stats': self.get_stats()}
+
+"""
+Write the artifacts of an instrumentation report: the summary table as {title}_instrumentation.txt, every episode
+record as {title}_episodes.csv and with profiling a pstats file as {title}.prof which pstats.Stats can load.
+"""
+def write_report(report: Dict, title: str) -> None:
+    with open(f"{title}_instrumentation.txt", "w") as file:
+        file.write(report['summary'] + "\n")
+    with open(f"{title}_episodes.csv", "w") as file:
+        file.write("kind,episode,time,biggest delta,steps,wall hits,td histogram\n")
+        for record in report['episodes']:
+            histogram = "" if record['td histogram'] is None else " ".join(map(str, record['td histogram']))
+            steps = "" if record['steps'] is None else record['steps']
+            wall_hits = "" if record['wall hits'] is None else record['wall hits']
+            file.write(f"{record['kind']},{record['episode']},{record['time']},{record['biggest delta']},"
+                       f"{steps},{wall_hits},{histogram}\n")
+    if report['stats'] is not None:
+        # Same format as pstats.Stats.dump_stats
+        with open(f"{title}.prof", "wb") as file:
+            marshal.dump(report['stats'], file)
@@ -1,34 +1,83 @@
 from track import Track
 from racecar import Racecar
-from learning_table import initialize_value_dict, get_reward_from_accelerating, reset_visits
-from calculations import convert_list_to_coordinate, weighted_random
-from print_track import print_racer_on_track
+from learning_table import STORES, Value_Store, create_value_store, get_reward_from_accelerating
+from calculations import VELOCITY_COUNT, ACCELERATIONS, weighted_random, encode_state, decode_state, \
+    acceleration_to_index
+from trajectory import Trajectory, record_step
+from trajectory_log import Trajectory_Log_Writer
+from policy_file import save_policy, load_policy
+from checkpoint import Checkpoint_Writer, load_checkpoint
+from transition_table import WALL, FINISH, STOPPED_ACTION, STOPPED_VELOCITY
+from q_tensor import Q_Tensor
+from parallel_learning import train_parallel
+from replay_buffer import Replay_Buffer
+from dyna_model import Dyna_Model
+from eligibility_traces import Eligibility_Traces
+from instrumentation import Instrumentation
 import random
-from typing import List, Dict
+from typing import Callable, Dict, List
+import numpy as np
+import time
 
 """
 This class is responsible for training a model via the Q learning algorithm. SARSA can be toggled
-via a member variable boolean. 
+via a member variable boolean. The 'python' backend keeps Q values within a value store while the 'numpy' backend
+keeps them within a dense float32 Q tensor and picks greedy actions with an argmax over each state's Q values.
+The value store of the python backend is either dense or sparse, in which case only visited states are allocated.
+With planning_steps above 0 the numpy backend runs Dyna-Q: every real step is recorded within a model table and
+followed by that many planning updates from it, see dyna_model.py.
 """
 class Learning_Model:
-    def __init__(self, track: Track, movement_cost: float, sarsa: bool) -> None:
+    def __init__(self, track: Track, movement_cost: float, sarsa: bool, backend: str = 'python',
+                 store: str = 'dense', planning_steps: int = 0) -> None:
         self.track = track
+        if backend not in ('python', 'numpy'):
+            raise ValueError(f"Unknown Q learning backend {backend}")
+        if store not in STORES:
+            raise ValueError(f"Unknown value store {store}")
+        if planning_steps > 0 and (backend != 'numpy' or sarsa):
+            raise ValueError(f"Dyna-Q planning needs Q learning without SARSA on the numpy backend, not the {backend} "
+                             f"backend with SARSA: {sarsa}")
+        self.backend = backend
+        self.store = store
+        # Episodes, steps and wall clock time of the last training run
+        self.training_report = {}
+        # Policy loaded from a policy file. Takes the place of the trained Q values when set
+        self.loaded_policy = None
+        # Replay buffer of the running training. Its records are part of every checkpoint
+        self.replay = None
         """
-        Initialize dictionary to hold all initial rewards at each state. At the start, each position 
+        Initialize value store to hold all initial rewards at each state. At the start, each position 
         shall be considered a state. However, unique accelerations at each each velocity will be considered
         states during the training process. Since each velocity can have up to 9 unique acceleration values 
         (-1, 0, 1 for both x and y coordinates) and each location can have 121 unique velocities (-5:5 for both
         x and y), each position on the track can have a maximum of 1089 states.
         """ 
-        self.value_dict = initialize_value_dict(track, self.get_wall_reward(), self.get_finish_reward(), movement_cost)
+        self.value_store = create_value_store(store, track, self.get_wall_reward(), self.get_finish_reward(),
+                                              movement_cost)
         # Initialize whether we plan on doing sarsa
         self.sarsa = sarsa
+        # The numpy backend holds its Q values within a dense tensor
+        self.q_tensor = None
+        if backend == 'numpy':
+            self.q_tensor = Q_Tensor(track, movement_cost, self.get_wall_reward(), self.get_finish_reward())
+        # Model table of Dyna-Q. Its records are part of every checkpoint
+        self.dyna_model = Dyna_Model(planning_steps) if planning_steps > 0 else None
 
     """
     Getter
     """
-    def get_value_dict(self) -> Dict:
-        return self.value_dict
+    def get_value_store(self) -> Value_Store:
+        return self.value_store
+
+    def get_q_tensor(self) -> Q_Tensor:
+        return self.q_tensor
+
+    def get_dyna_model(self) -> Dyna_Model:
+        return self.dyna_model
+
+    def get_training_report(self) -> Dict:
+        return self.training_report
     
     """
     Get Wall Reward. Hard coded to -1000.
@@ -44,111 +93,226 @@ class Learning_Model:
         return 100
 
     """
-    This method looks within the value dictionary at the particular location, velocity 
-    and acceleration and returns whether we have a stored 'q_value' key. If not, we 
-    return the base reward of that location. 
+    This method looks within the value store at the particular state and action and returns 
+    the stored Q value. If we have not explored the action at that state, we return the base 
+    reward of that location. 
     """
     # Get Q value of any state
-    def get_Q_value(self, position: List, velocity: List, acceleration: List) -> float:
-        # Convert position and velocity values
-        position_str = convert_list_to_coordinate(position)
-        velocity_str = convert_list_to_coordinate(velocity)
-        acceleration_str = convert_list_to_coordinate(acceleration)
-        # Determine if we have even explored the velocity at specified position
-        if velocity_str in self.value_dict[position_str]:
-            # Determine if we have explore the acceleration within the velocity state
-            if acceleration_str in self.value_dict[position_str][velocity_str]:
-                # Return the q_value
-                return self.value_dict[position_str][velocity_str][acceleration_str]['q_value']
-        # If any conditions fails, return base reward
-        return self.value_dict[position_str]['reward']
+    def get_Q_value(self, state: int, action: int) -> float:
+        q_value = self.value_store.action_values[state * len(ACCELERATIONS) + action]
+        # If we have not explored, return base reward
+        if q_value is None:
+            return self.value_store.reward[state // VELOCITY_COUNT]
+        return q_value
+
+    """
+    Return the racer's current state id
+    """
+    def get_state(self, racer: Racecar) -> int:
+        return encode_state(racer.get_position(), racer.get_velocity(), self.value_store.cols)
     
     """
-    Return the acceleration state with the best q score given a racer. This is done
-    by looping through all possible accelerations and retaining the highest base reward
-    of the next action as well as the acceleration to get the racer to the best base
-    reward.
+    Return the action with the best q score given a racer's state id. This is done by looping 
+    through all possible actions (accelerations) and retaining the highest base reward
+    of the next state as well as the action to get the racer to the best base reward.
     """
-    # Return the state (acceleration) with the best q score
-    def exploit(self, racer: Racecar) -> List:
-        current_position = racer.get_position()
-        current_velocity = racer.get_velocity()
+    # Return the action (acceleration) with the best q score
+    def exploit(self, current_state: int) -> List:
+        table = self.track.get_transition_table()
+        stopped = current_state % VELOCITY_COUNT == STOPPED_VELOCITY
         # Look at all possible actions (all acceleration possibilities) and find best reward
         best_reward = -99999
-        best_acceleration = None
-        a_row = -1
-        while a_row < 2:
-            a_col =-1
-            while a_col < 2:
-                acceleration = [a_row, a_col]
-                # Get the base reward of particular acceleration
-                reward = get_reward_from_accelerating(racer, current_position, current_velocity,
-                                                        acceleration, self.get_wall_reward(),
-                                                        self.get_finish_reward(), self.value_dict,
-                                                        True)
-                # Determine if this is the best reward that we have encountered at this state
-                if reward > best_reward:
-                    # Only save as best acceleration if we are actuall moving a!=0,0 while v==0,0
-                    if current_velocity == [0, 0] and acceleration == [0, 0]:
-                        # Skip this iteration
-                        pass
-                    else:
-                        best_reward = reward
-                        best_acceleration = acceleration
-                a_col += 1
-            a_row += 1
-        return best_acceleration, best_reward
+        best_action = None
+        for action in range(len(ACCELERATIONS)):
+            # Get the base reward of particular acceleration
+            reward = get_reward_from_accelerating(table, current_state, action, self.get_wall_reward(),
+                                                  self.get_finish_reward(), self.value_store, True)
+            # Determine if this is the best reward that we have encountered at this state
+            if reward > best_reward:
+                # Only save as best acceleration if we are actuall moving a!=0,0 while v==0,0
+                if stopped and action == STOPPED_ACTION:
+                    # Skip this iteration
+                    pass
+                else:
+                    best_reward = reward
+                    best_action = action
+        return best_action, best_reward
     
     """
-    Select a random acceleration (as long as the racer moves) and determine the reward
-    of the random acceleration. 
+    Select a random action (as long as the racer moves) from a racer's state id and determine the reward
+    of the random action. 
     """
-    def explore(self, racer: Racecar) -> List:
-        current_position = racer.get_position()
-        current_velocity = racer.get_velocity()
+    def explore(self, current_state: int) -> List:
         # If velocity is [0,0] make sure not to set acceleration to [0,0]
-        if current_velocity == [0, 0]:
+        if current_state % VELOCITY_COUNT == STOPPED_VELOCITY:
             best_acceleration = [0, 0]
             # Re-select acceleration if we end up with no acceleration and no velocity
             while best_acceleration == [0, 0]:
                 best_acceleration = [random.choice([-1, 0, 1]), random.choice([-1, 0, 1])]
         else:
             best_acceleration = [random.choice([-1, 0, 1]), random.choice([-1, 0, 1])]
-        # Determine reward after this acceleration
-        best_reward = get_reward_from_accelerating(racer, current_position, current_velocity,
-                                                best_acceleration, self.get_wall_reward(), 
-                                                self.get_finish_reward(), self.value_dict, 
-                                                True)
-        return best_acceleration, best_reward
+        best_action = acceleration_to_index(best_acceleration)
+        # Determine reward after this action
+        best_reward = get_reward_from_accelerating(self.track.get_transition_table(), current_state, best_action,
+                                                   self.get_wall_reward(), self.get_finish_reward(), self.value_store,
+                                                   True)
+        return best_action, best_reward
     
     """
-    Return the acceleration and reward of action based on either exploitation or exploration
+    Return the action and reward of action based on either exploitation or exploration
     policy dependent on the exploration_rate float value. 
     """
-    def explore_or_exploit(self, racer: Racecar, exploration_rate: float) -> List:
+    def explore_or_exploit(self, state: int, exploration_rate: float) -> List:
         # Determine if we exploit or explore
         explore = weighted_random([exploration_rate, 1 - exploration_rate])
         if explore:
-            return self.explore(racer)
+            return self.explore(state)
         else:
-            return self.exploit(racer)
+            return self.exploit(state)
 
     """
-    Train allows the value dict class member variable to be sufficiently trained untill our detla value cross aa threshold
+    Train allows the value store class member variable to be sufficiently trained untill our detla value cross aa threshold
     value such that a racer can sufficiently navigate the track in an efficient manner. This is 
     done by initiating a racecar at the starting line of the track. The racer navigates the track via Q learning
     with either SARSA enabled or disabled. The racer shall reset it's position if it hits a wall and the iteration
     completes once it passes the finish line. Once the racer passes the finish line, we decay our exploration
     rate by a certain proportion to slowly encorporate more exploitation tactics. The decay rate is hypertuned to 
-    minimize runtime while allowing convergence. Once the episodes are complete, our value dict contains the 
-    best acceleration at each state and our model is ready for testing. Debug mode possible.
+    minimize runtime while allowing convergence. Once the episodes are complete, our value store contains the 
+    best acceleration at each state and our model is ready for testing. The episode count, steps taken and wall clock
+    time of the run are stored within the training report. Every training step is written to the trajectory log if
+    one is passed. Every checkpoint_every episodes and at the end of training a checkpoint is written to
+    checkpoint_path on a background thread. Training continues exactly where a checkpoint stopped if resume_from is
+    passed. Every episode and the TD error of every update are recorded by the instrumentation if one is passed.
+    With more than one worker the numpy backend runs episodes within that many processes that share its Q values,
+    see parallel_learning.py. Parallel runs record no trajectory log and no TD errors. With a replay buffer the numpy
+    backend also replays minibatches of past steps, see replay_buffer.py. Replay needs the off policy targets of Q
+    learning and a single process. Dyna-Q plans within a single process as well. With a trace_decay (lambda) above 0
+    the numpy backend trains Q(lambda) or SARSA(lambda) with sparse eligibility traces, see eligibility_traces.py.
+    Debug mode possible.
     """      
     # Model rewards of the track and determine best acceleration at each velocity at each state via Q learning/SARSA
-    def train(self, eta: float, discount: float, exploration_rate: float, threshold: float, episodes: int, debug = False) -> int:
+    def train(self, eta: float, discount: float, exploration_rate: float, threshold: float, episodes: int, debug = False,
+              log: Trajectory_Log_Writer = None, checkpoint_path: str = None, checkpoint_every: int = 0,
+              resume_from: str = None, instrumentation: Instrumentation = None, workers: int = 1,
+              replay: Replay_Buffer = None, trace_decay: float = 0) -> int:
+        if (workers > 1 or replay is not None or trace_decay > 0) and self.backend != 'numpy':
+            raise ValueError(f"Parallel training, replay and eligibility traces need the numpy backend, not the "
+                             f"{self.backend} backend")
+        if workers > 1 and log is not None:
+            raise ValueError("Parallel training cannot write a trajectory log")
+        if replay is not None and (self.sarsa or workers > 1):
+            raise ValueError("Replay is only supported by single process Q learning without SARSA")
+        if self.dyna_model is not None and workers > 1:
+            raise ValueError("Dyna-Q planning is only supported by single process training")
+        self.replay = replay
+        # Traces only live within an episode so they are never part of a checkpoint
+        traces = Eligibility_Traces(discount, trace_decay) if trace_decay > 0 and workers <= 1 else None
+        start_time = time.time()
+        # Progress of the episode loop. Either fresh or restored from a checkpoint
+        progress = {'episodes': 0, 'steps': 0, 'exploration rate': exploration_rate, 'biggest delta': -99999}
+        if resume_from is not None:
+            progress = self.restore_checkpoint(load_checkpoint(resume_from))
+        writer = Checkpoint_Writer(checkpoint_path) if checkpoint_path is not None else None
+        record_episode, td_errors = None, None
+        if instrumentation is not None:
+            record_episode = instrumentation.get_episode_hook(f"Q learning SARSA {self.sarsa}")
+            td_errors = instrumentation.td_errors
+        # Record the episode and snapshot the model every checkpoint_every episodes
+        def on_episode(progress: Dict) -> None:
+            if record_episode is not None:
+                record_episode(progress)
+            if writer is not None and checkpoint_every > 0 and progress['episodes'] % checkpoint_every == 0:
+                writer.save(self.get_checkpoint(progress))
+        try:
+            if workers > 1:
+                progress = train_parallel(self.q_tensor, eta, discount, threshold, episodes, self.sarsa, progress,
+                                          workers, debug, on_episode, trace_decay)
+            elif self.backend == 'numpy':
+                progress = self.q_tensor.train(eta, discount, threshold, episodes, self.sarsa, progress, debug, log,
+                                               on_episode, td_errors, replay, self.dyna_model, traces)
+            else:
+                progress = self.train_value_store(eta, discount, threshold, episodes, progress, debug, log,
+                                                  on_episode, td_errors)
+            if writer is not None:
+                writer.save(self.get_checkpoint(progress))
+        except BaseException:
+            # The training error takes precedence over an error of the writer
+            if writer is not None:
+                writer.close(raise_error = False)
+            raise
+        if writer is not None:
+            writer.close()
+        episode_count, step_count = progress['episodes'], progress['steps']
+        training_time = time.time() - start_time
+        self.training_report = {'backend': self.backend, 'workers': workers,
+                                'replay': replay.sampling if replay is not None else None,
+                                'planning steps': self.dyna_model.planning_steps if self.dyna_model is not None else 0,
+                                'trace decay': trace_decay,
+                                'episodes': episode_count, 'steps': step_count, 'time': training_time,
+                                'steps per second': step_count / max(training_time, 1e-9)}
+        if debug: print(f"Q Learning {self.backend} backend: {self.training_report}")
+        return episode_count
+
+    """
+    Return a snapshot of the model, the progress of the episode loop and the state of every random generator
+    """
+    def get_checkpoint(self, progress: Dict) -> Dict:
+        snapshot = {'backend': self.backend, 'sarsa': self.sarsa, 'progress': dict(progress),
+                    'random state': random.getstate(), 'numpy random state': np.random.get_state()}
+        if self.backend == 'numpy':
+            snapshot['q values'] = self.q_tensor.q_values.copy()
+            snapshot['visited'] = self.q_tensor.visited.copy()
+            if self.replay is not None:
+                snapshot['replay'] = self.replay.get_snapshot()
+            if self.dyna_model is not None:
+                snapshot['dyna model'] = self.dyna_model.get_snapshot()
+        else:
+            snapshot.update(self.value_store.get_snapshot())
+        return snapshot
+
+    """
+    Restore the model and every random generator from a checkpoint and return the progress of the episode loop.
+    Raises a ValueError if the checkpoint belongs to a different backend, algorithm or value store.
+    """
+    def restore_checkpoint(self, snapshot: Dict) -> Dict:
+        if snapshot['backend'] != self.backend or snapshot['sarsa'] != self.sarsa:
+            raise ValueError(f"Checkpoint of the {snapshot['backend']} backend with SARSA: {snapshot['sarsa']} "
+                             f"cannot resume the {self.backend} backend with SARSA: {self.sarsa}")
+        if self.backend == 'numpy':
+            self.q_tensor.q_values[:] = snapshot['q values']
+            self.q_tensor.visited[:] = snapshot['visited']
+            if self.replay is not None and 'replay' in snapshot:
+                self.replay.restore_snapshot(snapshot['replay'])
+            if self.dyna_model is not None and 'dyna model' in snapshot:
+                self.dyna_model.restore_snapshot(snapshot['dyna model'])
+        else:
+            # Checkpoints written before sparse stores existed hold dense values
+            if snapshot.get('store', 'dense') != self.store:
+                raise ValueError(f"Checkpoint of a {snapshot.get('store', 'dense')} value store cannot resume a "
+                                 f"{self.store} value store")
+            self.value_store.restore_snapshot(snapshot)
+        random.setstate(snapshot['random state'])
+        np.random.set_state(snapshot['numpy random state'])
+        return dict(snapshot['progress'])
+
+    """
+    The episode loop of the python backend. Starts from and returns the progress of the loop: the episode count,
+    the number of steps taken, the exploration rate and the biggest delta, steps and wall hits of the last episode.
+    on_episode is called with the progress after every episode. The TD error of every update is appended to
+    td_errors if a list is passed.
+    """
+    def train_value_store(self, eta: float, discount: float, threshold: float, episodes: int, progress: Dict,
+                          debug = False, log: Trajectory_Log_Writer = None, on_episode: Callable = None,
+                          td_errors: List = None) -> Dict:
+        store = self.value_store
+        table = self.track.get_transition_table()
+        action_count = len(ACCELERATIONS)
         # Initialize biggest delta as maximum difference in Q value among all states within episode
-        biggest_delta = -99999
+        biggest_delta = progress['biggest delta']
+        exploration_rate = progress['exploration rate']
         # Keep counter for metrics
-        episode_count = 0
+        episode_count = progress['episodes']
+        step_count = progress['steps']
         # Keep learning for set number of episodess. 
         while(abs(biggest_delta) > threshold and episode_count < episodes):
             episode_count += 1
@@ -156,128 +320,98 @@ class Learning_Model:
             # Re initialize biggest delta
             biggest_delta = -99999
             # Reset visitation count 
-            reset_visits(self.value_dict)
-            # Create race car that starts at start of track
-            racer = Racecar(self.track)
-            if episode_count == 70:
-                print('here')
+            store.reset_visits()
+            # The racer starts at start of track with velocity and acceleration [0, 0]
+            racer_state = (encode_state(self.track.pick_start_position(), [0, 0], store.cols), STOPPED_ACTION)
+            outcome = None
+            episode_steps = 0
+            episode_wall_hits = 0
             # Traverse the map until we reach the finish line
-            while racer.finished() is False:
+            while outcome != FINISH:
+                step_count += 1
+                episode_steps += 1
 
                 """
                 Determine where the racer is and move it to the next position based on the explore or exploit policy.
                 """
 
-                # Get the current position of racer
-                current_position = racer.get_position()
-                current_position_str = convert_list_to_coordinate(current_position)
-                # Get current velocity of racer
-                current_velocity = racer.get_velocity()
-                current_velocity_str = convert_list_to_coordinate(current_velocity)
+                # Get the current state of racer
+                current_state = racer_state[0]
                 # Get next state and associated reward
-                best_acceleration, best_reward = self.explore_or_exploit(racer, exploration_rate)
-                best_acceleration_str = convert_list_to_coordinate(best_acceleration)
-                # Apply best acceleration to the racecar
-                racer.set_acceleration(best_acceleration)
-                # Update velocity and position. This shall be the transition to the 'next state'. 
-                racer.update_velocity()
-                racer.update_position()
+                best_action, best_reward = self.explore_or_exploit(current_state, exploration_rate)
+                # Step with the best acceleration. This shall be the transition to the 'next state'. Accelerations
+                # never fail during training. Hitting a wall already stops the racer on the closest position on track
+                racer_state, outcome, _ = table.step(racer_state, best_action)
                 # Increment visit count of position
-                self.value_dict[current_position_str]['visit_count'] += 1
+                store.visit_count[current_state // VELOCITY_COUNT] += 1
 
                 """
-                Update the current position's Q value within the value dict 
+                Update the current state's Q value within the value store 
                 """
 
                 # Determine if we have an current Q value at this state
-                current_q = self.get_Q_value(current_position, current_velocity, best_acceleration)
+                current_q = self.get_Q_value(current_state, best_action)
                 # Get the next state values
-                next_position = racer.get_position()
-                next_velocity = racer.get_velocity()
-                next_position_str = convert_list_to_coordinate(next_position)
-                next_velocity_str = convert_list_to_coordinate(next_velocity)
+                next_state = racer_state[0]
                 # For SARSA learning, determine next q value based on next state's selected action
                 if self.sarsa:
-                    # Convert the next move's acceleration segment into a string
-                    next_best_acceleration_str = convert_list_to_coordinate(self.explore_or_exploit(racer, exploration_rate)[0])
-                    # Apply acceleration 
-                    prev_path = racer.previous_path
-                    prev_pos = racer.previous_position
-                    racer.update_velocity()
-                    racer.update_position()
-                    # Get next next metrics
-                    next_next_position_str = convert_list_to_coordinate(racer.get_position())
-                    next_next_velocity_str = convert_list_to_coordinate(racer.get_velocity())
-                    # Determine if the best_acceleration state has an associated q value
+                    next_best_action = self.explore_or_exploit(next_state, exploration_rate)[0]
+                    # Apply acceleration again from the next state
+                    (next_next_state, _), next_outcome, _ = table.step(racer_state, best_action)
                     # If we finished, return finish reward
-                    if racer.finished():
+                    if next_outcome == FINISH:
                         next_q_value = self.get_finish_reward()
                     # If we hit wall, return wall reward
-                    elif racer.hit_wall() is not None:
+                    elif next_outcome == WALL:
                         next_q_value = self.get_wall_reward()
-                    # If neither, check associated q value at position
-                    elif next_next_velocity_str in self.value_dict[next_next_position_str]:
-                        if next_best_acceleration_str in self.value_dict[next_next_position_str][next_next_velocity_str]:
-                            next_q_value = self.value_dict[next_next_position_str][next_next_velocity_str][next_best_acceleration_str]['q_value']
-                    # If anything fails, return base reward
-                    else: next_q_value = self.value_dict[next_next_position_str]['reward']
-                    # Reset racer's metrics
-                    racer.reset_p_v(next_position, next_velocity, prev_path, prev_pos)
+                    # If neither, check associated q value at state. If unexplored, return base reward
+                    else:
+                        next_q_value = self.get_Q_value(next_next_state, next_best_action)
                 # For Q learning, determine next q value based on next state's best action
                 else:
-                    if next_velocity_str in self.value_dict[next_position_str]:
-                        # Check if we have determined best q value of state
-                        if 'best_q' in self.value_dict[next_position_str][next_velocity_str]:
-                            # Get this value if exists
-                            next_q_value = self.value_dict[next_position_str][next_velocity_str]['best_q']
+                    # Check if we have determined best q value of state
+                    if store.best_value[next_state] is not None:
+                        # Get this value if exists
+                        next_q_value = store.best_value[next_state]
                     # If anything fails, return base reward with visitation penalty
-                    else: next_q_value = self.value_dict[next_position_str]['reward'] - self.value_dict[next_position_str]['visit_count']
+                    else: 
+                        next_cell = next_state // VELOCITY_COUNT
+                        next_q_value = store.reward[next_cell] - store.visit_count[next_cell]
                 # If racer cross finish line, set next_q_value to 100
-                if racer.finished():
+                wall = outcome == WALL
+                if outcome == FINISH:
                     next_q_value = self.get_finish_reward()
                 # If the racecar hit a wall, next_q_value = -1000
-                elif racer.hit_wall() is not None:
+                elif wall:
+                    episode_wall_hits += 1
                     next_q_value = self.get_wall_reward()
-                    # Reset to closest position on track
-                    racer.reset_position(racer.hit_wall(), False)
+                # Log the move. Accelerations never fail during training
+                if log is not None:
+                    position, velocity = decode_state(next_state, store.cols)
+                    log.write(episode_count, episode_steps, position, velocity, ACCELERATIONS[best_action],
+                              ACCELERATIONS[best_action], wall)
 
                 """
-                Calculate the new q value for state and place within the value dict. Make sure to retrieve previous q value
+                Calculate the new q value for state and place within the value store. Make sure to retrieve previous q value
                 (if stored) for delta calculations. 
                 """
 
                 # Calculate Q value with below equations
                 # SARSA OFF Q = Current Q value + eta * (Reward of next state + discount * Max Next Q - Current Q Value)
                 # SARSA ON: Q = Current Q value + eta * (Reward of next state + discount * Next Q value - Curent Q value)
-                new_q = current_q + eta * (best_reward + discount * next_q_value - current_q)
-                # Build value dict to support new q value
-                if current_velocity_str in self.value_dict[current_position_str]:
-                    if best_acceleration_str not in self.value_dict[current_position_str][current_velocity_str]:
-                        self.value_dict[current_position_str][current_velocity_str][best_acceleration_str] = {}
-                else:
-                    # Velocity state does not exist so create it within dictionary
-                    self.value_dict[current_position_str][current_velocity_str] = {}
-                    self.value_dict[current_position_str][current_velocity_str][best_acceleration_str] = {}
-                # Check if we have previous q value
-                if 'q_value' in self.value_dict[current_position_str][current_velocity_str][best_acceleration_str]:
-                    # Store previous q value for delta calculations
-                    previous_q = self.value_dict[current_position_str][current_velocity_str][best_acceleration_str]['q_value']
-                # Else just set it to the base value
-                else:
-                    previous_q = self.value_dict[current_position_str]['reward']
+                td_error = best_reward + discount * next_q_value - current_q
+                if td_errors is not None:
+                    td_errors.append(td_error)
+                new_q = current_q + eta * td_error
+                # Store previous q value for delta calculations. Unexplored actions hold the base value
+                previous_q = current_q
                 # Assign new q value
-                self.value_dict[current_position_str][current_velocity_str][best_acceleration_str]['q_value'] = new_q
+                store.action_values[current_state * action_count + best_action] = new_q
                 # Update best q value of state if applicable
-                if 'best_q' in self.value_dict[current_position_str][current_velocity_str]:
-                    if new_q > self.value_dict[current_position_str][current_velocity_str]['best_q']:
-                        self.value_dict[current_position_str][current_velocity_str]['best_q'] = new_q
-                        # Add acceleration as well
-                        self.value_dict[current_position_str][current_velocity_str]['best_acceleration'] = best_acceleration
-                else:
-                    # If no best_q is selected, this is best_q
-                    self.value_dict[current_position_str][current_velocity_str]['best_q'] = new_q
-                    # Add acceleration as well
-                    self.value_dict[current_position_str][current_velocity_str]['best_acceleration'] = best_acceleration
+                if store.best_value[current_state] is None or new_q > store.best_value[current_state]:
+                    store.best_value[current_state] = new_q
+                    # Add action as well
+                    store.best_action[current_state] = best_action
                 
                 """
                 Calculate delta value
@@ -290,32 +424,89 @@ class Learning_Model:
             
             # For each episode, make sure to decay exploration rate
             exploration_rate *= 0.9999
-        # Return the episode count
-        return episode_count
+            progress = {'episodes': episode_count, 'steps': step_count, 'exploration rate': exploration_rate,
+                        'biggest delta': biggest_delta, 'episode steps': episode_steps,
+                        'episode wall hits': episode_wall_hits}
+            if on_episode is not None:
+                on_episode(progress)
+        # Return the progress
+        return progress
+
+    """
+    Return the best action id of a state or None if the state was never explored
+    """
+    def get_best_action(self, state: int) -> int:
+        if self.loaded_policy is not None:
+            action = int(self.loaded_policy[state])
+            return None if action < 0 else action
+        if self.backend == 'numpy':
+            return self.q_tensor.get_best_action(state)
+        return self.value_store.best_action[state]
+
+    """
+    Return the best action id of every state id as an int8 array. States that were never explored hold -1.
+    """
+    def get_policy(self) -> np.ndarray:
+        if self.loaded_policy is not None:
+            return self.loaded_policy
+        if self.backend == 'numpy':
+            return self.q_tensor.get_policy()
+        return self.value_store.get_best_actions()
+
+    """
+    Return the best Q value of every state id as a float array. States that were never explored hold NaN.
+    """
+    def get_values(self) -> np.ndarray:
+        if self.backend == 'numpy':
+            values = self.q_tensor.state_q_values.max(axis = 1).astype(np.float64)
+            values[~self.q_tensor.visited] = np.nan
+            return values
+        return self.value_store.get_best_values()
+
+    """
+    Save the trained policy and optionally the best Q value of every state to a policy file
+    """
+    def save_policy(self, file_path: str, include_values: bool = False) -> None:
+        algorithm = "SARSA" if self.sarsa else "Q learning"
+        save_policy(file_path, self.track, self.get_policy(), self.get_values() if include_values else None,
+                    f"{algorithm} {self.backend}")
+
+    """
+    Load a policy file of this track. The loaded policy is used for testing in place of the trained Q values.
+    """
+    def load_policy(self, file_path: str) -> None:
+        self.loaded_policy = load_policy(file_path, self.track)['policy']
 
     """
     Test the model with a passed in race car. Have the racer start at the starting line and iterate through each 
     position and find the respective best acceleration--with respect to the best q value at each velocity--and
     navigate the track until the finish line is hit. Reset the racer if any walls are hit and store metrics of
     walls hit and moves expended. Make sure to also have a small exploration value to avoid any stuck positions. 
+    The test runs headless unless a render function is passed, which is called every render_every steps (or only at
+    the end if 0). The starting state and every step are recorded within the trajectory if one is passed.
     """
     # Test the model with a passed in race car
-    def test(self, racer: Racecar, restart: bool, explore_rate: float) -> None:
+    def test(self, racer: Racecar, restart: bool, explore_rate: float, trajectory: Trajectory = None,
+             render: Callable = None, render_every: int = 0) -> None:
+        step = 0
+        record_step(self.track.track_list, racer.get_position(), racer.get_velocity(), step, racer.finished(),
+                    trajectory, render, render_every)
         # Keep iterating through the track until finish line
         while racer.finished() == False:
-            # Get current position and velocity
-            current_position_str = convert_list_to_coordinate(racer.get_position())
-            current_velocity_str = convert_list_to_coordinate(racer.get_velocity())
+            # Get current state
+            best_action = self.get_best_action(self.get_state(racer))
             # Determine what the best action to take at position and velocity
             # Or explore
             if weighted_random([explore_rate, 1-explore_rate]):
                 best_acceleration = [random.choice([-1, 0, 1]), random.choice([-1, 0, 1])]
             else: 
                 # Fail safe to random if anything goes wrong
-                if current_velocity_str not in self.value_dict[current_position_str]: 
+                if best_action is None: 
                     best_acceleration = [random.choice([-1, 0, 1]), random.choice([-1, 0, 1])]
                 else:
-                    best_acceleration = self.value_dict[current_position_str][current_velocity_str]['best_acceleration']
+                    best_acceleration = ACCELERATIONS[best_action]
             # Traverse racecar with respective restarting conditions
-            print_racer_on_track(self.track.track_list, racer.get_position())
-            racer.traverse(best_acceleration, restart)
\ No newline at end of file
+            racer.traverse(best_acceleration, restart)
+            step += 1
+            record_step(self.track.track_list, racer.get_position(), racer.get_velocity(), step, racer.finished(),
+                        trajectory, render, render_every)
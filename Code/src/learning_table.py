@@ -1,99 +1,292 @@
-from calculations import convert_list_to_coordinate
+from calculations import VELOCITY_COUNT, ACCELERATIONS
 from track import Track
-from racecar import Racecar
+from transition_table import Transition_Table, WALL, FINISH
 from typing import Dict, List
+from array import array
+import numpy as np
+import sys
 
 
 """
-This file acts as a helper for the initialization of value dictionaries for both value iteration and the Q 
-learner algorithms. 
-"""
-
-"""
-Initialize a dictionary to model the track. Each position on the track shall be set as a coordinate in 
-the string format "[x, y]". Each coordinate shall have a couple member keys. The 'reward' member key
-stores the base reward for each position. Walls and Finish positions shall have the parameterized rewards.
-The starting line and any empty position has a reward of movement cost--as it would cost that much to move
-to those locations. Each state is also given a 'changeable' member key which indicates whether the rewards
-(not base rewards) can be altered at said location. The dictionary is returned. 
-"""
-# Initialize a dictionary to model rewards of track
-def initialize_value_dict (track: Track, wall_reward: float, finish_reward: float, movement_cost: float) -> Dict:
-    # Create a starter value dictionary where all track positions have base rewards
-    # Get the track in array format
-    track_array = track.track_list
-    # Initialize value dict
-    value_dict = {}
-    # Iterate through all track positions
-    for row in range(len(track_array)): 
-        for col in range(len(track_array[row])):
-            # Store the state space
-            location = convert_list_to_coordinate([row, col])
-            current_position = track_array[row][col]
-            # Determine which type the state is
-            # If position is a wall, set reward to wall_reward and set as unchangeable
-            value_dict[location] = {}
-            if current_position == '#':
-                value_dict[location]['reward'] = wall_reward
-                value_dict[location]['changeable'] = False
-            # If position is finish line, set reward to finish_reward and set as unchangeable
-            elif current_position == 'F':
-                value_dict[location]['reward'] = finish_reward
-                value_dict[location]['changeable'] = False
-            # If position is road or start, set reward to movement cost and set as changeable
-            elif current_position == 'S' or current_position == '.':
-                value_dict[location]['reward'] = movement_cost
-                value_dict[location]['changeable'] = True
-            else:
-                print("Invalid character found within track")
-                return None
-            # Add visit counter
-            value_dict[location]['visit_count'] = 0
-    # Return the value dictionary
-    return value_dict
-
-"""
-Run the racer with the passed in parameters and determine where it ends up via the racer's pseudo_run method. 
-If we hit a wall, return the wall's reward and similarly if we finished, return the finish's reward. 
-If we ended up at another location, we return the reward at the ending state. If the ending state is 
-not the exact same as the starting state and has been explored and we do not wish to get the base reward, we
-return the 'previous reward' of that state. This is utilized in the value_iteration algorithm. If those 
-previous conditions are not met, we return the base reward of that position. 
-"""
-def get_reward_from_accelerating(racer: Racecar, position: List, velocity: List, acceleration: List,
-                                 wall_reward: int, finish_reward: int, value_dict: Dict, base_reward: bool) -> float:
-    prev_path = racer.previous_path
-    prev_pos = racer.previous_position
-    ending_location = racer.psuedo_run(position, velocity, acceleration)
-    # Reset Racer
-    racer.reset_p_v(position, velocity, prev_path, prev_pos)
+This file acts as a helper for the initialization of value stores for both value iteration and the Q
+learner algorithms.
+"""
+
+"""
+Kinds of value store. The dense store allocates every state up front while the sparse store allocates states on
+first write.
+"""
+STORES = ['dense', 'sparse']
+
+"""
+Size in bytes of a float object within a list
+"""
+FLOAT_SIZE = sys.getsizeof(0.0)
+
+"""
+The value store models the track with integer ids instead of "[x, y]" strings. Each position on the track is a
+cell with index row * cols + col, each state is a (cell, velocity) pair with id cell * 121 + velocity index and
+each acceleration is an action id within [0, 9). Every cell holds its base reward, whether its rewards (not base
+rewards) can be altered and its visit count. Walls and Finish positions have the parameterized rewards while the
+starting line and any empty position has a reward of movement cost--as it would cost that much to move to those
+locations. Every state holds its best value, the best value of the previous episode and its best action, and
+every (state, action) pair holds its value. States and actions that were never explored hold None. All values
+live within flat lists so that every lookup is a list index.
+"""
+class Value_Store:
+    def __init__(self, track: Track, wall_reward: float, finish_reward: float, movement_cost: float) -> None:
+        self.cols = len(track.track_list[0])
+        cell_count = len(track.track_list) * self.cols
+        self.state_count = cell_count * VELOCITY_COUNT
+        # Base reward, changeable flag and visit count of every cell
+        self.reward = [0] * cell_count
+        self.changeable = [False] * cell_count
+        self.visit_count = [0] * cell_count
+        for row in range(len(track.track_list)):
+            for col in range(self.cols):
+                cell = row * self.cols + col
+                # Determine which type the cell is
+                if track.check_wall([row, col]):
+                    self.reward[cell] = wall_reward
+                elif track.check_finish([row, col]):
+                    self.reward[cell] = finish_reward
+                else:
+                    self.reward[cell] = movement_cost
+                    self.changeable[cell] = True
+        # Indices of every changeable cell
+        self.changeable_cells = [cell for cell in range(cell_count) if self.changeable[cell]]
+        self.init_states()
+
+    """
+    Allocate the best value, previous best value and best action of every state and the value of every state and
+    action pair
+    """
+    def init_states(self) -> None:
+        self.best_value = [None] * self.state_count
+        self.previous_value = [0] * self.state_count
+        self.best_action = [None] * self.state_count
+        self.action_values = [None] * (self.state_count * len(ACCELERATIONS))
+
+    """
+    Determine if a state has been explored
+    """
+    def explored(self, state: int) -> bool:
+        return self.best_value[state] is not None
+
+    """
+    Resets the visit count of every position on track
+    """
+    def reset_visits(self) -> None:
+        self.visit_count = [0] * len(self.visit_count)
+
+    """
+    Return the best action id of every state id as an int8 array. States that were never explored hold -1.
+    """
+    def get_best_actions(self) -> np.ndarray:
+        return np.array([-1 if action is None else action for action in self.best_action], dtype = np.int8)
+
+    """
+    Return the best value of every state id as a float array. States that were never explored hold NaN.
+    """
+    def get_best_values(self) -> np.ndarray:
+        return np.array([np.nan if value is None else value for value in self.best_value])
+
+    """
+    Return a copy of every state value for a checkpoint
+    """
+    def get_snapshot(self) -> Dict:
+        return {'store': 'dense', 'action values': list(self.action_values), 'best value': list(self.best_value),
+                'best action': list(self.best_action)}
+
+    """
+    Restore every state value from a checkpoint
+    """
+    def restore_snapshot(self, snapshot: Dict) -> None:
+        self.action_values[:] = snapshot['action values']
+        self.best_value[:] = snapshot['best value']
+        self.best_action[:] = snapshot['best action']
+
+    """
+    Return the bytes held by the store: the lists of every cell and state and every float they reference. Small
+    integers and None are shared objects and not counted.
+    """
+    def memory_footprint(self) -> int:
+        size = sum(sys.getsizeof(values) for values in (self.reward, self.changeable, self.visit_count,
+                                                        self.changeable_cells))
+        for values in (self.best_value, self.previous_value, self.action_values):
+            size += sys.getsizeof(values) + (len(values) - values.count(None) - values.count(0)) * FLOAT_SIZE
+        return size + sys.getsizeof(self.best_action)
+
+"""
+A column of a sparse value store that is indexed like the lists of the dense store. Index i belongs to state
+i // width. Reading a state that was never allocated returns the default and writing a value other than None
+allocates the state within the store. None is kept as NaN within float columns and as -1 within the action column.
+"""
+class Sparse_Array:
+    __slots__ = ('store', 'slots', 'values', 'width', 'default', 'empty', 'length')
+
+    def __init__(self, store, typecode: str, width: int, default, empty) -> None:
+        self.store = store
+        # The store's slot dictionary. It is never replaced, only cleared
+        self.slots = store.slots
+        self.values = array(typecode)
+        self.width = width
+        self.default = default
+        self.empty = empty
+        self.length = store.state_count * width
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __getitem__(self, index):
+        if index.__class__ is slice:
+            return [self[i] for i in range(*index.indices(self.length))]
+        slot = self.slots.get(index // self.width)
+        if slot is None:
+            return self.default
+        value = self.values[slot * self.width + index % self.width]
+        # NaN never equals itself
+        if value == self.empty or value != value:
+            return None
+        return value
+
+    def __setitem__(self, index, value) -> None:
+        if index.__class__ is slice:
+            start, stop, step = index.indices(self.length)
+            # The values of a whole state are written at once
+            if step == 1 and start % self.width == 0 and stop - start == self.width and None not in value:
+                slot = self.slots.get(start // self.width)
+                if slot is None:
+                    slot = self.store.allocate(start // self.width)
+                self.values[slot * self.width:(slot + 1) * self.width] = array(self.values.typecode, value)
+                return
+            for i, item in zip(range(start, stop, step), value):
+                self[i] = item
+            return
+        state = index // self.width
+        slot = self.slots.get(state)
+        if slot is None:
+            if value is None:
+                return
+            slot = self.store.allocate(state)
+        self.values[slot * self.width + index % self.width] = self.empty if value is None else value
+
+"""
+The sparse value store holds the same values as the dense store but only for states that were written to. Every
+allocated state gets a slot within a dictionary and its values live at that slot within parallel typed arrays, so
+memory grows with the number of visited states instead of the size of the track. Its columns are indexed exactly
+like the dense store's lists, at the cost of a method call per lookup.
+"""
+class Sparse_Value_Store(Value_Store):
+    """
+    Allocate the empty columns. States are allocated on first write.
+    """
+    def init_states(self) -> None:
+        # Slot of every allocated state id
+        self.slots = {}
+        self.best_value = Sparse_Array(self, 'd', 1, None, float('nan'))
+        self.previous_value = Sparse_Array(self, 'd', 1, 0, None)
+        self.best_action = Sparse_Array(self, 'b', 1, None, -1)
+        self.action_values = Sparse_Array(self, 'd', len(ACCELERATIONS), None, float('nan'))
+
+    """
+    Allocate the values of a state and return its slot
+    """
+    def allocate(self, state: int) -> int:
+        slot = len(self.slots)
+        self.slots[state] = slot
+        self.best_value.values.append(float('nan'))
+        self.previous_value.values.append(0.0)
+        self.best_action.values.append(-1)
+        self.action_values.values.extend([float('nan')] * len(ACCELERATIONS))
+        return slot
+
+    """
+    Return the number of allocated states
+    """
+    def get_allocated_count(self) -> int:
+        return len(self.slots)
+
+    """
+    Return the state ids and slots of every allocated state as arrays
+    """
+    def get_allocated(self) -> List[np.ndarray]:
+        states = np.fromiter(self.slots.keys(), dtype = np.int64, count = len(self.slots))
+        slots = np.fromiter(self.slots.values(), dtype = np.int64, count = len(self.slots))
+        return states, slots
+
+    def get_best_actions(self) -> np.ndarray:
+        actions = np.full(self.state_count, -1, dtype = np.int8)
+        states, slots = self.get_allocated()
+        actions[states] = np.frombuffer(self.best_action.values, dtype = np.int8)[slots]
+        return actions
+
+    def get_best_values(self) -> np.ndarray:
+        values = np.full(self.state_count, np.nan)
+        states, slots = self.get_allocated()
+        values[states] = np.frombuffer(self.best_value.values, dtype = np.float64)[slots]
+        return values
+
+    def get_snapshot(self) -> Dict:
+        return {'store': 'sparse', 'slots': dict(self.slots), 'action values': array('d', self.action_values.values),
+                'best value': array('d', self.best_value.values), 'best action': array('b', self.best_action.values),
+                'previous value': array('d', self.previous_value.values)}
+
+    def restore_snapshot(self, snapshot: Dict) -> None:
+        self.slots.clear()
+        self.slots.update(snapshot['slots'])
+        self.action_values.values[:] = snapshot['action values']
+        self.best_value.values[:] = snapshot['best value']
+        self.best_action.values[:] = snapshot['best action']
+        self.previous_value.values[:] = snapshot['previous value']
+
+    """
+    Return the bytes held by the store: the lists of every cell, the slot dictionary with its keys and the value
+    arrays
+    """
+    def memory_footprint(self) -> int:
+        size = sum(sys.getsizeof(values) for values in (self.reward, self.changeable, self.visit_count,
+                                                        self.changeable_cells))
+        size += sys.getsizeof(self.slots) + sum(sys.getsizeof(state) for state in self.slots)
+        for column in (self.best_value, self.previous_value, self.best_action, self.action_values):
+            size += sys.getsizeof(column.values)
+        return size
+
+"""
+Create a value store of the given kind. Raises a ValueError for unknown kinds.
+"""
+def create_value_store(store: str, track: Track, wall_reward: float, finish_reward: float,
+                       movement_cost: float) -> Value_Store:
+    if store not in STORES:
+        raise ValueError(f"Unknown value store {store}")
+    if store == 'sparse':
+        return Sparse_Value_Store(track, wall_reward, finish_reward, movement_cost)
+    return Value_Store(track, wall_reward, finish_reward, movement_cost)
+
+"""
+Determine where a state ends up after taking an action via the step kernel of the track's transition table. The
+action always takes effect. If we hit a wall, return the wall's reward and similarly if we finished, return the
+finish's reward. If we ended up at another location, we return the reward at the ending state. If the ending state
+is not the exact same position as the starting state and has been explored and we do not wish to get the base
+reward, we return the previous value of that state. This is utilized in the value_iteration algorithm. If those
+previous conditions are not met, we return the base reward of that position.
+"""
+def get_reward_from_accelerating(table: Transition_Table, state: int, action: int, wall_reward: int,
+                                 finish_reward: int, value_store: Value_Store, base_reward: bool) -> float:
+    (end_state, _), outcome, _ = table.step((state, action), action)
     # Check what ending location is
-    if ending_location == 'wall': 
+    if outcome == WALL:
         return wall_reward
-    elif ending_location == 'finish':
+    elif outcome == FINISH:
         return finish_reward
-    else:
-        # If we didn't hit wall or finish, we retrieve the coordinates of the ending location
-        p, v = ending_location
-        end_position = convert_list_to_coordinate(p)
-        end_velocity = convert_list_to_coordinate(v)
-        # If we have already explored that area, we should retreive the reward of our final velocity
-        # Also verify that ending position is not the same as starting position v = 0,0 and a = 0,0
-        # Return the base reward if base_reward is set to True
-        if (end_velocity in value_dict[end_position] and
-            end_position != convert_list_to_coordinate(position) and
-            base_reward is False):
-            # If we have already explored, we are guaranteed to have previous reward
-            # Use the previous reward when within the same iteration
-            return value_dict[end_position][end_velocity]['previous reward']
-        # If we have not explored or we wish to get base reward, get base reward minus the amount of times we have visited
-        else:
-            return value_dict[end_position]['reward'] - value_dict[end_position]['visit_count']
-    
-"""
-Resets the visit count of every position on track within dictionary
-"""
-def reset_visits(value_dict: Dict) -> None:
-    for key in value_dict.keys():
-        # Set the 'visit_count' key to 0
-        value_dict[key]['visit_count'] = 0
\ No newline at end of file
+    # If we didn't hit wall or finish, we retrieve the cell of the ending location
+    end_cell = end_state // VELOCITY_COUNT
+    # If we have already explored that state, we should retreive the previous value of our final velocity
+    # Also verify that ending position is not the same as starting position v = 0,0 and a = 0,0
+    # Return the base reward if base_reward is set to True
+    if (base_reward is False and value_store.best_value[end_state] is not None and
+        end_cell != state // VELOCITY_COUNT):
+        # Use the previous reward when within the same iteration
+        return value_store.previous_value[end_state]
+    # If we have not explored or we wish to get base reward, get base reward minus the amount of times we have visited
+    return value_store.reward[end_cell] - value_store.visit_count[end_cell]
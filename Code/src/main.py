@@ -1,4 +1,5 @@
 from test import test_all
+import os
 
 """
 Main Method
@@ -14,7 +15,13 @@ def main ():
         'experiments': 10,
         'eta': 0.05,
         'initial_exploration_rate': 1,
-        'episodes': 15000
+        'episodes': 15000,
+        'prune': True,
+        'instrument': False,
+        'profile': False,
+        'workers': os.cpu_count() or 1,
+        'seed': 0,
+        'debug': False
     }
     # Run all tests and store all results
     test_all(parameters)
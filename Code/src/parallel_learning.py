@@ -0,0 +1,161 @@
+from track import Track
+from q_tensor import Q_Tensor
+from eligibility_traces import Eligibility_Traces
+from calculations import ACCELERATIONS
+from typing import Callable, Dict, List
+from multiprocessing import shared_memory
+import multiprocessing
+import numpy as np
+import random
+import queue
+
+"""
+This file holds the parallel training mode of the numpy Q learning backend. The Q values and visited flags of the Q
+tensor are moved into shared memory and K worker processes run episodes against them at the same time. Updates are
+written without any locking in the style of Hogwild: two workers may race on the same Q value and one of the updates
+is lost, which is rare since the racers are spread over a large table. Every worker seeds its own exploration
+generator and, with a trace decay above 0, its own eligibility traces. The parent process coordinates the run
+exactly like the serial loop. It hands out one episode at a time with the exploration rate that episode would have
+had serially, counts finished episodes, applies the threshold and episode budget stopping rule and calls on_episode
+with the progress after every finished episode.
+"""
+
+"""
+Episodes queued ahead per worker so that a worker never waits for the parent between episodes
+"""
+QUEUED_EPISODES = 2
+
+"""
+Seconds to wait for a result before checking again that every worker is still alive
+"""
+POLL_INTERVAL = 1.0
+
+"""
+Body of a worker process. Attaches to the shared Q values and visited flags and runs every episode taken from the
+task queue until it receives None. Each task is an (episode number, exploration rate) pair and each result is an
+(episode number, biggest delta, steps, wall hits) tuple put on the result queue.
+"""
+def run_worker(directory: str, track_name: str, rewards: List, q_name: str, visited_name: str, state_count: int,
+               eta: float, discount: float, sarsa: bool, seed: int, tasks: multiprocessing.Queue,
+               results: multiprocessing.Queue, trace_decay: float = 0) -> None:
+    random.seed(seed)
+    q_memory = shared_memory.SharedMemory(name = q_name)
+    visited_memory = shared_memory.SharedMemory(name = visited_name)
+    try:
+        track = Track(directory, track_name)
+        movement_cost, wall_reward, finish_reward = rewards
+        # Shared memory may be rounded up to whole pages so the arrays are sized by the state count
+        q_values = np.ndarray((state_count, len(ACCELERATIONS)), dtype = np.float32, buffer = q_memory.buf)
+        visited = np.ndarray(state_count, dtype = bool, buffer = visited_memory.buf)
+        q_tensor = Q_Tensor(track, movement_cost, wall_reward, finish_reward, q_values, visited)
+        traces = Eligibility_Traces(discount, trace_decay) if trace_decay > 0 else None
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            episode, exploration_rate = task
+            results.put((episode,) + tuple(q_tensor.run_episode(eta, discount, exploration_rate, sarsa, episode,
+                                                                traces = traces)))
+        # Drop every view of the shared buffers before closing them
+        del q_tensor, q_values, visited
+    finally:
+        q_memory.close()
+        visited_memory.close()
+
+"""
+Train a Q tensor with the given number of worker processes. Takes and returns the progress of the episode loop
+like Q_Tensor.train. Episodes finish out of order, so the progress reports the episodes finished so far and the
+biggest delta, steps and wall hits of the episode that finished last. Training stops handing out episodes once a
+finished episode's biggest delta is at most the threshold or the episode budget is handed out and returns once
+every handed out episode has finished. The Q values are copied back out of shared memory at the end. Workers keep
+eligibility traces with a trace decay above 0. Raises a RuntimeError if a worker dies.
+"""
+def train_parallel(q_tensor: Q_Tensor, eta: float, discount: float, threshold: float, episodes: int, sarsa: bool,
+                   progress: Dict, workers: int, debug = False, on_episode: Callable = None,
+                   trace_decay: float = 0) -> Dict:
+    context = multiprocessing.get_context()
+    # Build the transition table once before the workers load it
+    q_tensor.track.get_transition_table()
+    q_memory = shared_memory.SharedMemory(create = True, size = q_tensor.q_values.nbytes)
+    visited_memory = shared_memory.SharedMemory(create = True, size = q_tensor.visited.nbytes)
+    processes = []
+    try:
+        shared_q_values = np.ndarray(q_tensor.q_values.shape, dtype = np.float32, buffer = q_memory.buf)
+        shared_visited = np.ndarray(q_tensor.visited.shape, dtype = bool, buffer = visited_memory.buf)
+        shared_q_values[:] = q_tensor.q_values
+        shared_visited[:] = q_tensor.visited
+        # The parent reads the shared values as well, e.g. for checkpoints
+        q_tensor.attach(shared_q_values, shared_visited)
+        tasks, results = context.Queue(), context.Queue()
+        rewards = [q_tensor.movement_cost, q_tensor.wall_reward, q_tensor.finish_reward]
+        for worker in range(workers):
+            # Every worker explores with its own generator seeded from the parent's
+            seed = random.getrandbits(32)
+            process = context.Process(target = run_worker, daemon = True,
+                                      args = (q_tensor.track.directory, q_tensor.track.track_name, rewards,
+                                              q_memory.name, visited_memory.name, len(q_tensor.visited), eta,
+                                              discount, sarsa, seed, tasks, results, trace_decay))
+            process.start()
+            processes.append(process)
+        progress = coordinate(tasks, results, processes, threshold, episodes, progress, debug, on_episode)
+        for _ in processes:
+            tasks.put(None)
+        for process in processes:
+            process.join()
+        # Copy the trained values out of shared memory before it is released
+        q_tensor.attach(shared_q_values.copy(), shared_visited.copy())
+        del shared_q_values, shared_visited
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        q_memory.close()
+        q_memory.unlink()
+        visited_memory.close()
+        visited_memory.unlink()
+    return progress
+
+"""
+Hand out episodes to the workers and gather their results until the stopping rule is met and every handed out
+episode has finished. Episode n after the starting progress explores with the starting exploration rate decayed
+n - 1 times, which is the rate the serial loop would use. Returns the progress of the episode loop.
+"""
+def coordinate(tasks: multiprocessing.Queue, results: multiprocessing.Queue, processes: List, threshold: float,
+               episodes: int, progress: Dict, debug = False, on_episode: Callable = None) -> Dict:
+    first_episode = progress['episodes']
+    start_rate = progress['exploration rate']
+    step_count = progress['steps']
+    handed_out = first_episode
+    finished = first_episode
+    stopping = abs(progress['biggest delta']) <= threshold
+    # Hand out the next episode unless the run is stopping or the budget is spent
+    def hand_out() -> None:
+        nonlocal handed_out
+        if not stopping and handed_out < episodes:
+            handed_out += 1
+            tasks.put((handed_out, start_rate * 0.9999 ** (handed_out - first_episode - 1)))
+    for _ in range(QUEUED_EPISODES * len(processes)):
+        hand_out()
+    while finished < handed_out:
+        # A dead worker never finishes the episodes it took
+        dead = [process.exitcode for process in processes if not process.is_alive()]
+        if dead:
+            raise RuntimeError(f"A Q learning worker died with exit code {dead[0]}")
+        try:
+            episode, biggest_delta, episode_steps, episode_wall_hits = results.get(timeout = POLL_INTERVAL)
+        except queue.Empty:
+            continue
+        finished += 1
+        step_count += episode_steps
+        if debug: print(f"Episode {episode} | Biggest Delta: {biggest_delta} | Finished: {finished}")
+        progress = {'episodes': finished, 'steps': step_count,
+                    'exploration rate': start_rate * 0.9999 ** (finished - first_episode),
+                    'biggest delta': biggest_delta, 'episode steps': episode_steps,
+                    'episode wall hits': episode_wall_hits}
+        if abs(biggest_delta) <= threshold:
+            stopping = True
+        if on_episode is not None:
+            on_episode(progress)
+        hand_out()
+    return progress
@@ -0,0 +1,114 @@
+from track import Track
+from racecar import Racecar
+from trajectory import Trajectory, record_step
+from calculations import ACCELERATIONS, encode_state, weighted_random
+from typing import Callable, Dict
+import numpy as np
+import hashlib
+import random
+import os
+
+"""
+This file saves and loads trained policies so that a Racecar can race without retraining. A policy file is a
+versioned .npz archive holding the best action id of every state id as an int8 array (-1 for untrained states),
+optionally the value of every state, the track's name and dimensions and a checksum of the track text file the
+policy was trained on.
+"""
+
+POLICY_VERSION = 1
+
+"""
+Return the SHA-256 checksum of a track's text file
+"""
+def get_track_checksum(track: Track) -> str:
+    with open(f"{track.directory}/{track.track_name}.txt", "rb") as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+"""
+Save a policy of a track. The archive is written to a temporary file first and then moved into place so that a
+partially written file is never loaded.
+"""
+def save_policy(file_path: str, track: Track, policy: np.ndarray, values: np.ndarray = None,
+                algorithm: str = "") -> None:
+    arrays = {'version': np.array(POLICY_VERSION), 'track_name': np.array(track.track_name),
+              'checksum': np.array(get_track_checksum(track)), 'algorithm': np.array(algorithm),
+              'shape': np.array([len(track.track_list), len(track.track_list[0])]),
+              'policy': np.asarray(policy, dtype = np.int8)}
+    if values is not None:
+        arrays['values'] = np.asarray(values, dtype = np.float32)
+    temporary_path = f"{file_path}.{os.getpid()}.tmp"
+    with open(temporary_path, "wb") as file:
+        np.savez_compressed(file, **arrays)
+    os.replace(temporary_path, file_path)
+
+"""
+Raise a ValueError if a loaded policy was not trained on the exact same track file
+"""
+def check_track(policy: Dict, track: Track, file_path: str) -> None:
+    if policy['checksum'] != get_track_checksum(track):
+        raise ValueError(f"Policy {file_path} was trained on a different {policy['track_name']} track")
+
+"""
+Load a policy file into a dictionary. If a track is passed, the policy must have been trained on the exact same
+track file. Raises a ValueError for unknown versions and mismatching tracks.
+"""
+def load_policy(file_path: str, track: Track = None) -> Dict:
+    with np.load(file_path) as archive:
+        if int(archive['version']) != POLICY_VERSION:
+            raise ValueError(f"Unsupported policy version {int(archive['version'])} in {file_path}")
+        policy = {'track_name': str(archive['track_name']), 'checksum': str(archive['checksum']),
+                  'algorithm': str(archive['algorithm']), 'shape': archive['shape'].tolist(),
+                  'policy': archive['policy'], 'values': archive['values'] if 'values' in archive else None}
+    if track is not None:
+        check_track(policy, track, file_path)
+    return policy
+
+"""
+This class races a Racecar with a saved policy alone. The track is loaded from the directory by the name stored
+within the policy file and must match the file's checksum.
+"""
+class Policy_Runner:
+    def __init__(self, file_path: str, directory: str = "tracks") -> None:
+        loaded = load_policy(file_path)
+        self.track = Track(directory, loaded['track_name'])
+        check_track(loaded, self.track, file_path)
+        self.policy = loaded['policy']
+        self.values = loaded['values']
+        self.algorithm = loaded['algorithm']
+        self.cols = len(self.track.track_list[0])
+
+    """
+    Getters
+    """
+    def get_track(self) -> Track:
+        return self.track
+
+    def get_policy(self) -> np.ndarray:
+        return self.policy
+
+    """
+    Return the best action id of a state or None if the state was never trained
+    """
+    def get_best_action(self, state: int) -> int:
+        action = int(self.policy[state])
+        return None if action < 0 else action
+
+    """
+    Race the Racecar until it reaches the finish line. Untrained states and exploration take a random acceleration.
+    Rendering and trajectory recording work as within the models' tests.
+    """
+    def test(self, racer: Racecar, restart: bool, explore_rate: float = 0.0, trajectory: Trajectory = None,
+             render: Callable = None, render_every: int = 0) -> None:
+        step = 0
+        record_step(self.track.track_list, racer.get_position(), racer.get_velocity(), step, racer.finished(),
+                    trajectory, render, render_every)
+        while racer.finished() == False:
+            best_action = self.get_best_action(encode_state(racer.get_position(), racer.get_velocity(), self.cols))
+            if best_action is None or (explore_rate > 0 and weighted_random([explore_rate, 1 - explore_rate])):
+                best_acceleration = [random.choice([-1, 0, 1]), random.choice([-1, 0, 1])]
+            else:
+                best_acceleration = ACCELERATIONS[best_action]
+            racer.traverse(best_acceleration, restart)
+            step += 1
+            record_step(self.track.track_list, racer.get_position(), racer.get_velocity(), step, racer.finished(),
+                        trajectory, render, render_every)
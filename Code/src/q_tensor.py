@@ -0,0 +1,256 @@
+from track import Track
+from transition_table import WALL, FINISH, STOPPED_ACTION, STOPPED_VELOCITY
+from calculations import VELOCITY_RANGE, VELOCITY_COUNT, ACCELERATIONS, decode_state
+from trajectory_log import Trajectory_Log_Writer
+from replay_buffer import Replay_Buffer
+from dyna_model import Dyna_Model
+from eligibility_traces import Eligibility_Traces
+from typing import Callable, Dict, List
+import numpy as np
+import random
+
+"""
+This file holds the dense NumPy backend of the Q learning algorithm. The Q values are stored within a float32
+array indexed by (row, col, v_row + 5, v_col + 5, acceleration index) which is viewed as (state id, action id)
+so that greedy selection is a single argmax over a state's slice and every TD update is a single indexed write.
+Racers are moved through the track's transition table with the same deterministic moves as the dictionary backend.
+Every Q value starts at the base reward of its position. A move is rewarded with the movement cost, hitting a wall
+with the wall reward and restarts from the table's reset position and crossing the finish line with the finish
+reward and ends the episode. With a replay buffer every step is also stored and replayed within minibatches and
+with a Dyna model every step is also recorded and followed by a batch of planning updates from the model. With
+eligibility traces every TD error also updates the recently taken actions of the episode.
+"""
+
+class Q_Tensor:
+    def __init__(self, track: Track, movement_cost: float, wall_reward: float, finish_reward: float,
+                 q_values: np.ndarray = None, visited: np.ndarray = None) -> None:
+        self.track = track
+        self.movement_cost = movement_cost
+        self.wall_reward = wall_reward
+        self.finish_reward = finish_reward
+        # Dimensions of the Q tensor
+        self.rows = len(track.track_list)
+        self.cols = len(track.track_list[0])
+        self.shape = (self.rows, self.cols, VELOCITY_RANGE, VELOCITY_RANGE, len(ACCELERATIONS))
+        # Every episode starts on a start position with velocity [0, 0]
+        self.start_states = [(row * self.cols + col) * VELOCITY_COUNT + STOPPED_VELOCITY
+                             for row, col in track.start_positions]
+        if q_values is None:
+            # Q value of every (row, col, v_row, v_col, acceleration) starting at the base reward of the position
+            base_rewards = np.where(track.wall_mask, wall_reward,
+                                    np.where(track.finish_mask, finish_reward, movement_cost))
+            q_values = np.empty(self.shape, dtype = np.float32)
+            q_values[:] = base_rewards[:, :, None, None, None]
+            # Whether every state was visited during training
+            visited = np.zeros(self.rows * self.cols * VELOCITY_COUNT, dtype = bool)
+        self.attach(q_values, visited)
+
+    """
+    Train on and read from the given Q values and visited flags, e.g. ones held within shared memory. The arrays are
+    used in place and not copied.
+    """
+    def attach(self, q_values: np.ndarray, visited: np.ndarray) -> None:
+        self.q_values = q_values.reshape(self.shape)
+        # View of the Q values as (state id, action id)
+        self.state_q_values = self.q_values.reshape(-1, len(ACCELERATIONS))
+        self.visited = visited
+
+    """
+    Return the greedy action id of a state. A stopped racer never picks the [0, 0] acceleration.
+    """
+    def get_greedy_action(self, state: int) -> int:
+        q_values = self.state_q_values[state]
+        action = int(q_values.argmax())
+        if action == STOPPED_ACTION and state % VELOCITY_COUNT == STOPPED_VELOCITY:
+            # Mask the stopped action and take the best of the rest
+            q_values = q_values.copy()
+            q_values[STOPPED_ACTION] = -np.inf
+            action = int(q_values.argmax())
+        return action
+
+    """
+    Return a random action id. A stopped racer never picks the [0, 0] acceleration.
+    """
+    def get_random_action(self, state: int) -> int:
+        action = random.randrange(len(ACCELERATIONS))
+        while action == STOPPED_ACTION and state % VELOCITY_COUNT == STOPPED_VELOCITY:
+            action = random.randrange(len(ACCELERATIONS))
+        return action
+
+    """
+    Return either a random or the greedy action id dependent on the exploration rate
+    """
+    def explore_or_exploit(self, state: int, exploration_rate: float) -> int:
+        if random.random() < exploration_rate:
+            return self.get_random_action(state)
+        return self.get_greedy_action(state)
+
+    """
+    Return the greedy action id of a state or None if the state was never visited
+    """
+    def get_best_action(self, state: int) -> int:
+        if not self.visited[state]:
+            return None
+        return self.get_greedy_action(state)
+
+    """
+    Train the Q tensor with the same episode loop as the dictionary backend. Every episode starts at a random start
+    position and runs until the finish line is crossed. Q learning bootstraps from the best Q value of the next state
+    while SARSA bootstraps from the Q value of the action that is taken next. Training ends once the largest change
+    of any Q value within an episode is smaller than the threshold or the episode budget is spent. The exploration
+    rate decays after every episode. Every step is written to the trajectory log if one is passed. Starts from and
+    returns the progress of the loop: the episode count, the number of steps taken, the exploration rate and the
+    biggest delta, steps and wall hits of the last episode. on_episode is called with the progress after every
+    episode. The TD error of every update is appended to td_errors if a list is passed. Steps are stored within and
+    replayed from the replay buffer if one is passed and recorded within and planned from the Dyna model if one is
+    passed. TD errors are spread over the traced pairs of the eligibility traces if they are passed.
+    """
+    def train(self, eta: float, discount: float, threshold: float, episodes: int, sarsa: bool, progress: Dict,
+              debug = False, log: Trajectory_Log_Writer = None, on_episode: Callable = None,
+              td_errors: List = None, replay: Replay_Buffer = None, model: Dyna_Model = None,
+              traces: Eligibility_Traces = None) -> Dict:
+        biggest_delta = progress['biggest delta']
+        exploration_rate = progress['exploration rate']
+        episode_count = progress['episodes']
+        step_count = progress['steps']
+        while(abs(biggest_delta) > threshold and episode_count < episodes):
+            episode_count += 1
+            if debug: print(f"Episode {episode_count} | Biggest Delta: {biggest_delta} | Exploration Rate: {exploration_rate} | SARSA: {sarsa}")
+            biggest_delta, episode_steps, episode_wall_hits = self.run_episode(eta, discount, exploration_rate,
+                                                                               sarsa, episode_count, log, td_errors,
+                                                                               replay, model, traces)
+            step_count += episode_steps
+            # For each episode, make sure to decay exploration rate
+            exploration_rate *= 0.9999
+            progress = {'episodes': episode_count, 'steps': step_count, 'exploration rate': exploration_rate,
+                        'biggest delta': biggest_delta, 'episode steps': episode_steps,
+                        'episode wall hits': episode_wall_hits}
+            if on_episode is not None:
+                on_episode(progress)
+        return progress
+
+    """
+    Run a single episode from a random start position to the finish line with a fixed exploration rate. Every step
+    is written to the trajectory log under the episode number if one is passed. With a replay buffer every step is
+    added to it after its own update and a minibatch is replayed whenever one is due. With a Dyna model every step is
+    recorded within it after its own update and followed by a planning batch. With eligibility traces every TD error
+    updates every traced pair instead of the step's pair alone. Q learning follows Watkins's Q(lambda) and drops the
+    traces after an exploratory action, since the actions before it no longer lead along the greedy path. Returns the
+    largest change of any Q value by a step's own update, the number of steps and the number of wall hits of the
+    episode.
+    """
+    def run_episode(self, eta: float, discount: float, exploration_rate: float, sarsa: bool, episode: int,
+                    log: Trajectory_Log_Writer = None, td_errors: List = None, replay: Replay_Buffer = None,
+                    model: Dyna_Model = None, traces: Eligibility_Traces = None) -> List:
+        table = self.track.get_transition_table()
+        state_q_values = self.state_q_values
+        # Flat view of the Q values indexed by pair id
+        action_values = state_q_values.reshape(-1)
+        if traces is not None:
+            traces.clear()
+        biggest_delta = -99999
+        state = random.choice(self.start_states)
+        action = self.explore_or_exploit(state, exploration_rate)
+        finished = False
+        episode_steps = 0
+        episode_wall_hits = 0
+        while not finished:
+            episode_steps += 1
+            self.visited[state] = True
+            # Accelerations never fail during training so the held acceleration does not matter
+            (next_state, _), outcome, _ = table.step((state, action), action)
+            # Reward of the move and the value of the next state
+            if outcome == FINISH:
+                finished = True
+                reward = target = self.finish_reward
+            else:
+                if outcome == WALL:
+                    reward = self.wall_reward
+                    episode_wall_hits += 1
+                else:
+                    reward = self.movement_cost
+                next_action = self.explore_or_exploit(next_state, exploration_rate)
+                # Whether the next action is greedy, judged before this step's updates change the Q values
+                if traces is not None and not sarsa:
+                    exploratory = state_q_values[next_state, next_action] < \
+                        state_q_values[next_state, self.get_greedy_action(next_state)]
+                if sarsa:
+                    target = reward + discount * state_q_values[next_state, next_action]
+                else:
+                    target = reward + discount * state_q_values[next_state].max()
+            # TD update as a single indexed write
+            current_q = state_q_values[state, action]
+            td_error = target - current_q
+            if td_errors is not None:
+                td_errors.append(float(td_error))
+            if traces is None:
+                new_q = current_q + eta * td_error
+                state_q_values[state, action] = new_q
+            else:
+                traces.visit(state * len(ACCELERATIONS) + action)
+                traces.update(action_values, float(eta * td_error))
+                new_q = state_q_values[state, action]
+                # The traces end with the episode and Q learning cuts them after an exploratory action
+                if finished or (not sarsa and exploratory):
+                    traces.clear()
+            delta = abs(float(new_q - current_q))
+            if delta > biggest_delta:
+                biggest_delta = delta
+            # Log the move. Accelerations never fail during training
+            if log is not None:
+                position, velocity = decode_state(next_state, self.cols)
+                log.write(episode, episode_steps, position, velocity, ACCELERATIONS[action],
+                          ACCELERATIONS[action], outcome == WALL)
+            if replay is not None and replay.add(state, action, reward, next_state, finished):
+                batch_td_errors = self.replay_batch(replay, eta, discount)
+                if td_errors is not None:
+                    td_errors.extend(batch_td_errors.tolist())
+            if model is not None:
+                model.add(state, action, reward, next_state, finished)
+                batch_td_errors = self.update_batch(model.sample(), None, eta, discount)
+                if td_errors is not None:
+                    td_errors.extend(batch_td_errors.tolist())
+            if not finished:
+                state, action = next_state, next_action
+        return biggest_delta, episode_steps, episode_wall_hits
+
+    """
+    Replay a minibatch of the replay buffer as one vectorized Q learning update and return its TD errors
+    """
+    def replay_batch(self, replay: Replay_Buffer, eta: float, discount: float) -> np.ndarray:
+        slots, records, weights = replay.sample()
+        td_errors = self.update_batch(records, weights, eta, discount)
+        replay.update_priorities(slots, td_errors)
+        return td_errors
+
+    """
+    Apply a batch of replay records as one vectorized Q learning update. Every record moves its Q value towards its
+    reward plus the discounted best Q value of its next state, or its reward alone if it finished the race, scaled by
+    its weight if weights are passed. Every TD error is taken before the batch changes any Q value, so a state and
+    action drawn several times within a batch moves by the mean of its updates rather than their sum and never
+    overshoots its target. Returns the TD errors of the batch.
+    """
+    def update_batch(self, records: np.ndarray, weights: np.ndarray, eta: float, discount: float) -> np.ndarray:
+        states = records['state']
+        actions = records['action'].astype(np.int64)
+        next_values = self.state_q_values[records['next_state']].max(axis = 1)
+        targets = records['reward'] + discount * np.where(records['done'], 0.0, next_values)
+        td_errors = targets - self.state_q_values[states, actions]
+        steps = eta * td_errors if weights is None else eta * weights * td_errors
+        # Divide the step of every record by the number of records of its state and action within the batch
+        _, inverse, counts = np.unique(states * len(ACCELERATIONS) + actions, return_inverse = True,
+                                       return_counts = True)
+        steps = steps / counts[inverse]
+        np.add.at(self.state_q_values, (states, actions), steps.astype(np.float32))
+        return td_errors
+
+    """
+    Return the greedy action id of every state id as an int8 array. States that were never visited hold -1.
+    """
+    def get_policy(self) -> np.ndarray:
+        masked = self.state_q_values.copy()
+        # A stopped racer never picks the [0, 0] acceleration
+        masked[STOPPED_VELOCITY::VELOCITY_COUNT, STOPPED_ACTION] = -np.inf
+        policy = masked.argmax(axis = 1).astype(np.int8)
+        policy[~self.visited] = -1
+        return policy
@@ -0,0 +1,115 @@
+from track import Track
+from transition_table import WALL, FINISH, STOPPED_ACTION
+from calculations import ACCELERATION_SUCCESS_RATE, VELOCITY_CAP, VELOCITY_RANGE, VELOCITY_COUNT, ACCELERATIONS
+from typing import List
+import numpy as np
+
+"""
+This class races many Racecars on the same track at once. Positions, velocities and accelerations of every car are
+held within arrays and every car is moved by one vectorized step. The dynamics are those of the Racecar's traverse
+method: an acceleration fails 20% of the time and the previous acceleration is kept, velocities are capped at
+[-5, 5], crossing a finish position finishes the race and hitting a wall resets the car to either the last position
+before the wall or a random start position with its velocity and acceleration reset to [0, 0].
+"""
+
+class Racecar_Batch:
+    def __init__(self, track: Track, count: int, restart: bool, rng: np.random.Generator = None) -> None:
+        self.track = track
+        self.count = count
+        self.restart = restart
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.cols = len(track.track_list[0])
+        # Flat views of the track's transition table
+        table = track.get_transition_table()
+        self.outcomes = np.asarray(table.outcomes).reshape(-1)
+        self.cells = np.asarray(table.cells).reshape(-1)
+        # Flat cell index of every start position
+        self.start_cells = track.start_indices[:, 0] * self.cols + track.start_indices[:, 1]
+        self.accelerations_table = np.array(ACCELERATIONS, dtype = np.int64)
+        # Place every car on the start line
+        self.positions = np.zeros((count, 2), dtype = np.int64)
+        self.velocities = np.zeros((count, 2), dtype = np.int64)
+        self.accelerations = np.zeros((count, 2), dtype = np.int64)
+        self.finished = np.zeros(count, dtype = bool)
+        # Metrics of every car
+        self.wall_hit = np.zeros(count, dtype = np.int64)
+        self.moves = np.zeros(count, dtype = np.int64)
+        self.reset()
+
+    """
+    Place every car on a random start position with zero velocity and acceleration and clear all metrics
+    """
+    def reset(self) -> None:
+        self.positions[:] = self.pick_start_positions(self.count)
+        self.velocities[:] = 0
+        self.accelerations[:] = 0
+        self.finished[:] = False
+        self.wall_hit[:] = 0
+        self.moves[:] = 0
+
+    """
+    Pick a random start position for each of count cars. Returns an array of [row, col] rows.
+    """
+    def pick_start_positions(self, count: int) -> np.ndarray:
+        cells = self.rng.choice(self.start_cells, size = count)
+        return np.stack(np.divmod(cells, self.cols), axis = 1)
+
+    """
+    Getters
+    """
+    def get_states(self) -> np.ndarray:
+        # State id of every car
+        velocity_index = (self.velocities[:, 0] + VELOCITY_CAP) * VELOCITY_RANGE + (self.velocities[:, 1] + VELOCITY_CAP)
+        return (self.positions[:, 0] * self.cols + self.positions[:, 1]) * VELOCITY_COUNT + velocity_index
+
+    def get_wall_hit_counts(self) -> np.ndarray:
+        return self.wall_hit
+
+    def get_moves(self) -> np.ndarray:
+        return self.moves
+
+    """
+    Move every car that has not finished by one step with the parameterized action ids. Returns the outcome code of
+    every car's move. Cars that already finished are left untouched and report FINISH.
+    """
+    def step(self, actions: np.ndarray) -> np.ndarray:
+        active = ~self.finished
+        # Acceleration only succeeds 80% of the time. Failed accelerations keep the previous acceleration
+        success = active & (self.rng.random(self.count) < ACCELERATION_SUCCESS_RATE)
+        self.accelerations[success] = self.accelerations_table[actions[success]]
+        # Update and cap velocities
+        self.velocities[active] = np.clip(self.velocities[active] + self.accelerations[active], -VELOCITY_CAP, VELOCITY_CAP)
+        self.moves[active] += 1
+        # Look up every move with the capped velocity and no further acceleration
+        index = self.get_states() * len(ACCELERATIONS) + STOPPED_ACTION
+        outcomes = np.where(active, self.outcomes[index], FINISH)
+        next_cells = self.cells[index]
+        # Finished and road moves end on the table's cell
+        self.positions[active] = np.stack(np.divmod(next_cells[active], self.cols), axis = 1)
+        self.finished |= active & (outcomes == FINISH)
+        # Reset every car that hit a wall
+        crashed = active & (outcomes == WALL)
+        self.wall_hit[crashed] += 1
+        if self.restart:
+            self.positions[crashed] = self.pick_start_positions(int(crashed.sum()))
+        self.velocities[crashed] = 0
+        self.accelerations[crashed] = 0
+        return outcomes
+
+    """
+    Race every car with a policy until every car finished or max_steps steps were taken. The policy holds an action
+    id for every state id, where a negative id means the state was never learned and a random action is taken. With
+    probability explore_rate a car takes a random action instead of the policy's. Returns the moves and walls hit of
+    every car.
+    """
+    def race(self, policy: np.ndarray, explore_rate: float = 0.0, max_steps: int = 100000) -> List[np.ndarray]:
+        step_count = 0
+        while not self.finished.all() and step_count < max_steps:
+            actions = policy[self.get_states()].astype(np.int64)
+            # Random actions for exploration and unlearned states
+            random_actions = self.rng.integers(0, len(ACCELERATIONS), size = self.count)
+            explore = (actions < 0) | (self.rng.random(self.count) < explore_rate)
+            actions = np.where(explore, random_actions, actions)
+            self.step(actions)
+            step_count += 1
+        return self.moves, self.wall_hit
@@ -0,0 +1,162 @@
+from typing import Dict, List
+import numpy as np
+
+"""
+This file holds the experience replay buffer of the numpy Q learning backend. Every simulated step is stored as a
+(state, action, reward, next state, done) record within a preallocated ring buffer that overwrites its oldest record
+once it is full. Every few steps a minibatch of records is sampled and replayed as a single vectorized TD update,
+so a simulated step keeps teaching the Q values long after it was taken. Sampling is either uniform or prioritized,
+in which case a record is drawn with a probability proportional to its last absolute TD error raised to alpha and
+its update is scaled by an importance weight that corrects for the bias of drawing it more often. New records get
+the highest priority seen so far so that every record is replayed at least once with high probability. Priorities
+are grouped into blocks that keep their sums, a two level sum tree, so that a whole minibatch is drawn by picking
+blocks from the block sums and records within the picked blocks, each with a handful of vectorized operations.
+"""
+
+"""
+Each record holds the state id, the action id, the reward of the move, the next state id and whether the move
+crossed the finish line
+"""
+REPLAY_DTYPE = np.dtype([('state', '<i8'), ('action', 'i1'), ('reward', '<f4'), ('next_state', '<i8'),
+                         ('done', '?')])
+
+SAMPLINGS = ['uniform', 'prioritized']
+
+"""
+Smallest priority of a record so that a record with a TD error of zero can still be drawn
+"""
+PRIORITY_EPSILON = 1e-3
+
+"""
+Records per block of priorities
+"""
+PRIORITY_BLOCK = 128
+
+class Replay_Buffer:
+    def __init__(self, capacity: int = 50000, batch_size: int = 32, replay_every: int = 4,
+                 sampling: str = 'uniform', alpha: float = 0.6, beta: float = 0.4) -> None:
+        if sampling not in SAMPLINGS:
+            raise ValueError(f"Unknown replay sampling {sampling}")
+        if capacity < 1 or batch_size < 1 or replay_every < 1:
+            raise ValueError(f"Invalid replay capacity {capacity}, batch size {batch_size} or period {replay_every}")
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.replay_every = replay_every
+        self.sampling = sampling
+        self.alpha = alpha
+        self.beta = beta
+        self.records = np.zeros(capacity, dtype = REPLAY_DTYPE)
+        # Priority raised to alpha of every slot, viewed as (block, slot within block), and the sum of every block.
+        # Only used with prioritized sampling
+        self.priorities, self.blocks, self.block_sums = None, None, None
+        if sampling == 'prioritized':
+            block_count = -(-capacity // PRIORITY_BLOCK)
+            self.priorities = np.zeros(block_count * PRIORITY_BLOCK, dtype = np.float64)
+            self.blocks = self.priorities.reshape(block_count, PRIORITY_BLOCK)
+            self.block_sums = np.zeros(block_count, dtype = np.float64)
+        # Slots whose priorities changed since their block sums were last updated
+        self.dirty = []
+        self.max_priority = 1.0
+        # Slot of the next record and the number of records held
+        self.position = 0
+        self.size = 0
+        # Records added since the last replay
+        self.pending = 0
+
+    """
+    Getters
+    """
+    def get_size(self) -> int:
+        return self.size
+
+    """
+    Add a record, overwriting the oldest one once the buffer is full. Returns whether a minibatch is due.
+    """
+    def add(self, state: int, action: int, reward: float, next_state: int, done: bool) -> bool:
+        self.records[self.position] = (state, action, reward, next_state, done)
+        if self.priorities is not None:
+            self.priorities[self.position] = self.max_priority ** self.alpha
+            self.dirty.append(self.position)
+        self.position = (self.position + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+        self.pending += 1
+        if self.pending >= self.replay_every and self.size >= self.batch_size:
+            self.pending = 0
+            return True
+        return False
+
+    """
+    Draw a minibatch of record slots with replacement. Returns the slots, their records and the importance weight of
+    every record, which is 1 for uniform sampling.
+    """
+    def sample(self) -> List:
+        if self.sampling == 'uniform':
+            slots = np.random.randint(0, self.size, size = self.batch_size)
+            return slots, self.records[slots], np.ones(self.batch_size)
+        if self.dirty:
+            self.update_blocks(np.array(self.dirty, dtype = np.int64))
+            self.dirty = []
+        # Pick the block that covers each draw's share of the total and then the slot within that block
+        block_ends = np.cumsum(self.block_sums)
+        total = block_ends[-1]
+        draws = np.random.random(self.batch_size) * total
+        blocks = np.minimum(np.searchsorted(block_ends, draws, side = 'right'), len(self.block_sums) - 1)
+        offsets = draws - (block_ends[blocks] - self.block_sums[blocks])
+        slot_ends = np.cumsum(self.blocks[blocks], axis = 1)
+        within = np.minimum((slot_ends <= offsets[:, None]).sum(axis = 1), PRIORITY_BLOCK - 1)
+        # Rounding may step past the last record onto an empty slot
+        slots = np.minimum(blocks * PRIORITY_BLOCK + within, self.size - 1)
+        probabilities = self.priorities[slots] / total
+        # Importance weights are normalized by the largest weight within the batch so that updates only shrink
+        weights = (self.size * probabilities) ** -self.beta
+        return slots, self.records[slots], weights / weights.max()
+
+    """
+    Recompute the sums of the blocks that hold the given slots
+    """
+    def update_blocks(self, slots: np.ndarray) -> None:
+        blocks = np.unique(slots // PRIORITY_BLOCK)
+        self.block_sums[blocks] = self.blocks[blocks].sum(axis = 1)
+
+    """
+    Set the priorities of the sampled slots from the absolute TD errors of their last replay
+    """
+    def update_priorities(self, slots: np.ndarray, td_errors: np.ndarray) -> None:
+        if self.sampling != 'prioritized':
+            return
+        priorities = np.abs(td_errors) + PRIORITY_EPSILON
+        self.priorities[slots] = priorities ** self.alpha
+        self.update_blocks(slots)
+        self.max_priority = max(self.max_priority, float(priorities.max()))
+
+    """
+    Return a snapshot of the buffer for a checkpoint
+    """
+    def get_snapshot(self) -> Dict:
+        priorities = None
+        if self.priorities is not None:
+            priorities = self.priorities[:self.size].copy()
+        return {'records': self.records[:self.size].copy(), 'priorities': priorities,
+                'max priority': self.max_priority, 'position': self.position, 'pending': self.pending}
+
+    """
+    Restore the buffer from a checkpoint snapshot. Raises a ValueError if the snapshot holds more records than fit.
+    """
+    def restore_snapshot(self, snapshot: Dict) -> None:
+        size = len(snapshot['records'])
+        if size > self.capacity:
+            raise ValueError(f"Replay snapshot of {size} records does not fit a capacity of {self.capacity}")
+        self.records[:size] = snapshot['records']
+        if self.priorities is not None:
+            # Records of a uniform buffer start with the highest priority
+            priorities = snapshot['priorities']
+            if priorities is None:
+                priorities = np.full(size, snapshot['max priority'] ** self.alpha)
+            self.priorities[:] = 0
+            self.priorities[:size] = priorities
+            self.block_sums[:] = self.blocks.sum(axis = 1)
+            self.dirty = []
+        self.max_priority = snapshot['max priority']
+        self.position = snapshot['position'] % self.capacity
+        self.size = size
+        self.pending = snapshot['pending']
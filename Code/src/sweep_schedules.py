@@ -0,0 +1,237 @@
+from track import Track
+from learning_table import Value_Store
+from transition_table import Transition_Table, WALL, FINISH, STOPPED_ACTION
+from calculations import ACCELERATION_SUCCESS_RATE, VELOCITY_COUNT, ACCELERATIONS
+from collections import deque
+from typing import Callable, List
+import numpy as np
+import heapq
+
+"""
+This file holds the update schedules of value iteration that back up states in place. Each state's value is
+overwritten as soon as it is backed up, so later backups within the same episode already see it. The value of
+taking an action is reward(current) + discount * value(next state) where hitting a wall is worth the wall reward,
+crossing the finish line is worth the finish reward and every state starts with a value of 0 unless it is warm
+started with an initial value. With stochastic backups the value of the next state blends the successor of the action
+(80%) with the zero acceleration successor (20%).
+
+    gauss_seidel  sweeps every state in row major order
+    backward      sweeps every state ordered by the breadth first distance of its cell from the finish line
+    prioritized   backs up the state with the largest Bellman error first and then re-prioritizes its predecessors
+"""
+
+SCHEDULES = ['gauss_seidel', 'backward', 'prioritized']
+
+"""
+This class holds the successors of every swept state so that a backup only reads lists. For every state and action
+the successor is either the next state id or -1 with the constant reward of hitting a wall or finishing. The swept
+states must hold the successors of each of their moves.
+"""
+class Successors:
+    def __init__(self, table: Transition_Table, states: List, wall_reward: float, finish_reward: float,
+                 stochastic: bool = False) -> None:
+        # Every swept state in row major order
+        self.states = states
+        # Whether backups take failed accelerations into account
+        self.stochastic = stochastic
+        action_count = len(ACCELERATIONS)
+        # Next state id or -1 and constant reward of every (state * 9 + action)
+        self.next_states = {}
+        self.constants = {}
+        for state in self.states:
+            next_states = []
+            constants = []
+            for action in range(action_count):
+                outcome, next_state = table.lookup_state(state, action)
+                if outcome == WALL:
+                    next_states.append(-1)
+                    constants.append(wall_reward)
+                elif outcome == FINISH:
+                    next_states.append(-1)
+                    constants.append(finish_reward)
+                else:
+                    next_states.append(next_state)
+                    constants.append(0)
+            self.next_states[state] = next_states
+            self.constants[state] = constants
+
+    """
+    Return the states that can move into each state with a single action
+    """
+    def get_predecessors(self) -> dict:
+        predecessors = {state: set() for state in self.states}
+        for state in self.states:
+            for next_state in self.next_states[state]:
+                if next_state >= 0:
+                    predecessors[next_state].add(state)
+        return predecessors
+
+"""
+Back up a single state and return the value and index of each action, its best value and its best action. The
+first action with the maximum value is the best action. The value of every successor is read once and shared by
+the stochastic blend of every action.
+"""
+def backup(state: int, successors: Successors, values: dict, reward: float, discount: float) -> List:
+    constants = successors.constants[state]
+    next_values = [constants[action] if next_state < 0 else values[next_state]
+                   for action, next_state in enumerate(successors.next_states[state])]
+    # A failed acceleration moves the racer as if it did not accelerate
+    failed_value = (1 - ACCELERATION_SUCCESS_RATE) * next_values[STOPPED_ACTION]
+    action_values = []
+    best_value = -99999
+    best_action = None
+    for action, next_value in enumerate(next_values):
+        if successors.stochastic:
+            next_value = ACCELERATION_SUCCESS_RATE * next_value + failed_value
+        value = reward + discount * next_value
+        action_values.append(value)
+        if value > best_value:
+            best_value = value
+            best_action = action
+    return action_values, best_value, best_action
+
+"""
+Return the starting value of every state: its initial value if one is given and finite and 0 otherwise. Initial
+values are indexed by state id.
+"""
+def get_start_values(states: List, initial_values: np.ndarray = None) -> dict:
+    if initial_values is None:
+        return {state: 0 for state in states}
+    start_values = np.nan_to_num(initial_values[np.asarray(states, dtype = np.int64)], nan = 0.0)
+    return dict(zip(states, start_values.tolist()))
+
+"""
+Return the breadth first distance of every cell of the track from the closest finish position. Cells are connected
+to their eight neighbours and walls are never entered. Cells that cannot reach the finish line are left out.
+"""
+def get_finish_distances(track: Track) -> dict:
+    cols = len(track.track_list[0])
+    rows = len(track.track_list)
+    distances = {}
+    queue = deque()
+    for row, col in track.finish_indices:
+        distances[int(row) * cols + int(col)] = 0
+        queue.append((int(row), int(col)))
+    while queue:
+        row, col = queue.popleft()
+        for d_row in [-1, 0, 1]:
+            for d_col in [-1, 0, 1]:
+                next_row, next_col = row + d_row, col + d_col
+                if not (0 <= next_row < rows and 0 <= next_col < cols):
+                    continue
+                cell = next_row * cols + next_col
+                if cell in distances or track.check_wall([next_row, next_col]):
+                    continue
+                distances[cell] = distances[row * cols + col] + 1
+                queue.append((next_row, next_col))
+    return distances
+
+"""
+Sweep over the states in the given order with in place backups until the largest change in best value of any state
+within a sweep is smaller than the threshold. on_episode is called with the episode count and biggest delta after
+every sweep. States start from their initial values if given. Returns the episode count and the number of backups.
+"""
+def train_in_place(order: List, successors: Successors, store: Value_Store, discount: float, threshold: float,
+                   debug = False, on_episode: Callable = None, initial_values: np.ndarray = None) -> List:
+    values = get_start_values(successors.states, initial_values)
+    action_count = len(ACCELERATIONS)
+    biggest_delta = -99999
+    episode_count = 0
+    backups = 0
+    while (abs(biggest_delta) > threshold):
+        episode_count += 1
+        biggest_delta = -99999
+        for state in order:
+            action_values, best_value, best_action = backup(state, successors, values,
+                                                            store.reward[state // VELOCITY_COUNT], discount)
+            delta = abs(best_value - values[state])
+            if delta > biggest_delta:
+                biggest_delta = delta
+            # Overwrite in place so later backups see the new value
+            values[state] = best_value
+            store.previous_value[state] = store.best_value[state] if store.best_value[state] is not None else 0
+            store.best_value[state] = best_value
+            store.best_action[state] = best_action
+            store.action_values[state * action_count:(state + 1) * action_count] = action_values
+            backups += 1
+        if debug: print(f"Value Iteration Training Episode: {episode_count} | Max Delta: {biggest_delta}")
+        if on_episode is not None:
+            on_episode({'episodes': episode_count, 'biggest delta': biggest_delta})
+    return episode_count, backups
+
+"""
+Back up the state with the largest Bellman error first. Every state starts with the priority of its Bellman error
+from its starting value, which is 0 or its initial value if given. After a backup, each predecessor of the state is
+re-prioritized with its own Bellman error and pushed onto the heap. Training ends once no state has a Bellman error
+larger than the threshold. Stale heap entries are skipped. A best action chosen during training may be outdated by
+later backups of its successors, so the greedy action of every state is extracted from the final values at the end.
+Returns the episode count, counted as backups per state, and the number of backups.
+"""
+def train_prioritized(successors: Successors, store: Value_Store, discount: float, threshold: float,
+                      debug = False, initial_values: np.ndarray = None) -> List:
+    values = get_start_values(successors.states, initial_values)
+    predecessors = successors.get_predecessors()
+    action_count = len(ACCELERATIONS)
+    # Current priority of every state. The heap may hold older priorities which are skipped
+    priorities = {}
+    heap = []
+    for state in successors.states:
+        _, best_value, _ = backup(state, successors, values, store.reward[state // VELOCITY_COUNT], discount)
+        priorities[state] = abs(best_value - values[state])
+        if priorities[state] > threshold:
+            heapq.heappush(heap, (-priorities[state], state))
+    backups = 0
+    while heap:
+        priority, state = heapq.heappop(heap)
+        # Skip entries whose priority has changed since they were pushed
+        if -priority != priorities[state]:
+            continue
+        action_values, best_value, best_action = backup(state, successors, values,
+                                                        store.reward[state // VELOCITY_COUNT], discount)
+        values[state] = best_value
+        priorities[state] = 0
+        store.best_value[state] = best_value
+        store.best_action[state] = best_action
+        store.action_values[state * action_count:(state + 1) * action_count] = action_values
+        backups += 1
+        # The predecessors of the state may now have a larger Bellman error
+        for predecessor in predecessors[state]:
+            _, predecessor_value, _ = backup(predecessor, successors, values,
+                                             store.reward[predecessor // VELOCITY_COUNT], discount)
+            error = abs(predecessor_value - values[predecessor])
+            if error > threshold and error != priorities[predecessor]:
+                priorities[predecessor] = error
+                heapq.heappush(heap, (-error, predecessor))
+        if debug and backups % len(successors.states) == 0:
+            print(f"Value Iteration Backups: {backups} | Queued States: {len(heap)}")
+    # Extract the greedy action of every state from the final values. This also covers states that were never
+    # backed up because they already satisfied the threshold with their starting value
+    for state in successors.states:
+        action_values, best_value, best_action = backup(state, successors, values,
+                                                        store.reward[state // VELOCITY_COUNT], discount)
+        store.best_value[state] = best_value
+        store.best_action[state] = best_action
+        store.action_values[state * action_count:(state + 1) * action_count] = action_values
+    return -(-backups // len(successors.states)), backups
+
+"""
+Train the given states of a value store with one of the in place schedules. on_episode is passed to the sweeping
+schedules, the prioritized schedule has no sweeps to report. With initial values every state is warm started and
+the gauss_seidel schedule sweeps the states with the highest initial value, those closest to finishing, first.
+Returns the episode count and the number of backups.
+"""
+def train_schedule(schedule: str, track: Track, store: Value_Store, states: List, wall_reward: float,
+                   finish_reward: float, discount: float, threshold: float, debug = False,
+                   stochastic = False, on_episode: Callable = None, initial_values: np.ndarray = None) -> List:
+    successors = Successors(track.get_transition_table(), states, wall_reward, finish_reward, stochastic)
+    if schedule == 'prioritized':
+        return train_prioritized(successors, store, discount, threshold, debug, initial_values)
+    order = successors.states
+    if schedule == 'backward':
+        # Closest cells to the finish line first. Cells that cannot reach it go last
+        distances = get_finish_distances(track)
+        order = sorted(order, key = lambda state: distances.get(state // VELOCITY_COUNT, len(distances)))
+    elif initial_values is not None:
+        start_values = get_start_values(order, initial_values)
+        order = sorted(order, key = lambda state: -start_values[state])
+    return train_in_place(order, successors, store, discount, threshold, debug, on_episode, initial_values)
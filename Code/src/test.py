@@ -1,128 +1,155 @@
-from racecar import Racecar
 from track import Track
+from racecar_batch import Racecar_Batch
 from value_iteration import Value_Iteration
 from learning_model import Learning_Model
-from calculations import convert_list_to_coordinate
 from gather_metrics import get_racer_averages, plot_metrics
+from instrumentation import Instrumentation, write_report
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import random
 import time
-from typing import Dict
+from typing import Dict, List
 
 """
-Gather all metrics from the Racecar and alter the dictionary in memory
+Race every experiment at once with a batch of Racecars that follow the policy, taking a random action with
+probability explore_rate and in untrained states. Returns the walls hit, moves and time of every experiment by
+experiment name. The time of an experiment is the wall clock time of the whole batch divided by the number of
+experiments. The batch draws from its own generator seeded from the random module.
 """
-def gather_metrics(metrics: Dict, experiment_name: str, racer: Racecar, time: time) -> None:
-    # Alter the dictionary in memory
-    metrics[experiment_name]['walls hit'] = racer.get_wall_hit_count()
-    metrics[experiment_name]['moves'] = racer.get_moves()
-    metrics[experiment_name]['time'] = time
+def race_experiments(track: Track, policy: np.ndarray, max_experiments: int, restart: bool,
+                     explore_rate: float = 0.0, debug = False) -> Dict:
+    batch = Racecar_Batch(track, max_experiments, restart, np.random.default_rng(random.getrandbits(32)))
+    start_time = time.time()
+    moves, walls_hit = batch.race(policy, explore_rate)
+    experiment_time = (time.time() - start_time) / max(max_experiments, 1)
+    metrics = {}
+    for experiment in range(max_experiments):
+        metrics[f"Experiment {experiment + 1}"] = {'walls hit': int(walls_hit[experiment]),
+                                                   'moves': int(moves[experiment]), 'time': experiment_time}
+    if debug: print(f"Completed {max_experiments} Experiments")
+    return metrics
 
 """
-Test the value iteration model via the passed in parameters. First train the model and then test the model. 
-Testing is done by creating a Racecar object and navigating it through the track via the model's stored
-value dict. This is done for a specified number of experiments and the metrics are stored and presented in 
-nominal and visual format. Debug mode possible. 
+Write the training metrics of a configuration into {title}.txt and then append the racer averages and save the
+plot of all experiments as {title}.png. The instrumentation report is written as well if the configuration was
+instrumented.
 """
-def test_value_iteration(directory: str, track_name: str, movement_cost: float, 
-                         discount: float, threshold: float, max_experiments: int, restart: bool,
-                         debug = False) -> None:
+def write_results(results: Dict) -> None:
+    title = results['title']
+    # Print training metrics
+    with open (f"{title}.txt", "w") as file:
+        file.write(f"Training Episodes: {results['training episodes']} \n")
+        file.write(f"Training time: {results['training time']} \n")
+    get_racer_averages(results['metrics'], title)
+    plot_metrics(results['metrics'], title)
+    if results.get('instrumentation') is not None:
+        write_report(results['instrumentation'], title)
+
+"""
+Return an enabled instrumentation for an instrumentation mode or None if the mode is None. The 'profile' mode runs
+cProfile, any other mode counts and times calls.
+"""
+def start_instrumentation(instrument: str) -> Instrumentation:
+    if instrument is None:
+        return None
+    instrumentation = Instrumentation(profile = instrument == 'profile')
+    instrumentation.enable()
+    return instrumentation
+
+"""
+Stop an instrumentation and return its report or None without instrumentation
+"""
+def stop_instrumentation(instrumentation: Instrumentation) -> Dict:
+    if instrumentation is None:
+        return None
+    instrumentation.disable()
+    return instrumentation.get_report()
+
+"""
+Train the value iteration model via the passed in parameters and then test the model. Testing races a batch of
+Racecars, one per experiment, through the track with the model's policy, see race_experiments. Returns the title,
+training metrics and metrics of every experiment. Debug mode possible. With pruning only the states reachable from
+the start line are trained. Training and testing are instrumented in the given instrumentation mode and the report
+is returned with the results.
+"""
+def run_value_iteration(directory: str, track_name: str, movement_cost: float,
+                        discount: float, threshold: float, max_experiments: int, restart: bool,
+                        debug = False, prune = False, instrument: str = None) -> Dict:
     print(f"Training Value Iteration on track {track_name} with Restart: {restart}")
     # Define a track Object
     track = Track(directory, track_name)
     # Define a Value Iteration Object
-    v = Value_Iteration(track, movement_cost)
+    v = Value_Iteration(track, movement_cost, prune = prune, restart = restart)
+    instrumentation = start_instrumentation(instrument)
     # Train the Value Iteration object
     start_time = time.time()
-    training_episodes = v.train(discount, threshold, debug)
+    training_episodes = v.train(discount, threshold, debug, instrumentation)
     end_time = time.time()
     training_time = end_time - start_time
-    # Define metrics dictionary
-    metrics = {}
-    # Iterate through n experiments
-    experiment_count = 1
-    while experiment_count <= max_experiments:
-        if debug: experiment_name = f"Experiment {experiment_count}"
-        # Define dictionary for experiment
-        metrics[experiment_name] = {}
-        # Define a race car
-        racer = Racecar(track)
-        # Start timer
-        start_time = time.time()
-        # Test the model
-        v.test(racer, restart)
-        # Store metrics
-        end_time = time.time()
-        gather_metrics(metrics, experiment_name, racer, end_time - start_time)
-        if debug: print(f"Completed Experiment {experiment_count}")
-        experiment_count += 1
-    # Print all metrics and display them
-    title = f"{track_name}_VIteration_Restart_{restart}"
-    
-    # Print training metrics
-    with open (f"{title}.txt", "w") as file:
-        file.write(f"Training Episodes: {training_episodes} \n")
-        file.write(f"Training time: {training_time} \n")
-        
-    get_racer_averages(metrics, title)
-    plot_metrics(metrics, title)
+    # Race every experiment with the trained policy
+    metrics = race_experiments(track, v.get_policy(), max_experiments, restart, debug = debug)
+    return {'title': f"{track_name}_VIteration_Restart_{restart}", 'training episodes': training_episodes,
+            'training time': training_time, 'metrics': metrics,
+            'instrumentation': stop_instrumentation(instrumentation)}
+
+"""
+Test the value iteration model via the passed in parameters. The metrics are stored and presented in nominal and
+visual format. Debug mode possible.
+"""
+def test_value_iteration(directory: str, track_name: str, movement_cost: float,
+                         discount: float, threshold: float, max_experiments: int, restart: bool,
+                         debug = False, prune = False, instrument: str = None) -> None:
+    write_results(run_value_iteration(directory, track_name, movement_cost, discount, threshold, max_experiments,
+                                      restart, debug, prune, instrument))
 
 """
-Test the Q learner model via the passed in parameters. First train the model and then test the model similarly 
-to testing the value iteration model. One of the parameter controls whether our model utilizes SARSA algorithm. 
-Debug mode possible. 
+Train the Q learner model via the passed in parameters and then test the model similarly to the value iteration
+model. One of the parameter controls whether our model utilizes SARSA algorithm. Returns the title, training
+metrics and metrics of every experiment. Debug mode possible. Training and testing are instrumented in the given
+instrumentation mode and the report is returned with the results.
 """
-def test_Q_learner(directory: str, track_name: str, movement_cost: float, eta: float, discount: float, 
-                   exploration_rate: float, threshold: float, episodes: int, max_experiments: int, restart: bool, 
-                   sarsa: bool, debug = False):
+def run_Q_learner(directory: str, track_name: str, movement_cost: float, eta: float, discount: float,
+                  exploration_rate: float, threshold: float, episodes: int, max_experiments: int, restart: bool,
+                  sarsa: bool, debug = False, instrument: str = None) -> Dict:
     print(f"Traing Q Learner on track {track_name} with Restart: {restart} and SARSA: {sarsa}")
     # Define track object
     track = Track(directory, track_name)
     # Define Q Learning Model Object
     Q_model = Learning_Model(track, movement_cost, sarsa)
+    instrumentation = start_instrumentation(instrument)
     # Train Q model
     start_time = time.time()
-    training_episodes = Q_model.train(eta, discount, exploration_rate, threshold, episodes, debug)
+    training_episodes = Q_model.train(eta, discount, exploration_rate, threshold, episodes, debug,
+                                      instrumentation = instrumentation)
     end_time = time.time()
     training_time = end_time - start_time
-    # Define metrics dictionary
-    metrics = {}
-    # Iterate through n experiments
-    experiment_count = 1
-    while(experiment_count <= max_experiments):
-        if debug: experiment_name = f"Experiment {experiment_count}"
-        # Create racer for experiment
-        racer = Racecar(track)
-        # Start timer
-        start_time = time.time()
-        # Test model
-        # Tiny exploration rate to avoid stuck
-        explore_rate = 0.01
-        Q_model.test(racer, restart, explore_rate)
-        # End Timer
-        end_time = time.time()
-        # Gather metrics
-        metrics[experiment_name] = {}
-        gather_metrics(metrics, experiment_name, racer, end_time - start_time)
-        if debug: print(f"Completed Experiment {experiment_count}")
-        experiment_count += 1
-    # Print all metrics and display
-    title = f"{track_name}_QLearn_Restart_{restart}_SARSA_{sarsa}"
-    
-    # Print training time
-    with open (f"{title}.txt", "w") as file:
-        file.write(f"Training Episodes: {training_episodes} \n")
-        file.write(f"Training time: {training_time} \n")
+    # Race every experiment with the trained policy. Tiny exploration rate to avoid stuck
+    metrics = race_experiments(track, Q_model.get_policy(), max_experiments, restart, 0.01, debug)
+    return {'title': f"{track_name}_QLearn_Restart_{restart}_SARSA_{sarsa}", 'training episodes': training_episodes,
+            'training time': training_time, 'metrics': metrics,
+            'instrumentation': stop_instrumentation(instrumentation)}
 
-    get_racer_averages(metrics, title)
-    plot_metrics(metrics, title)
+"""
+Test the Q learner model via the passed in parameters. The metrics are stored and presented in nominal and visual
+format. Debug mode possible.
+"""
+def test_Q_learner(directory: str, track_name: str, movement_cost: float, eta: float, discount: float,
+                   exploration_rate: float, threshold: float, episodes: int, max_experiments: int, restart: bool,
+                   sarsa: bool, debug = False, instrument: str = None):
+    write_results(run_Q_learner(directory, track_name, movement_cost, eta, discount, exploration_rate, threshold,
+                                episodes, max_experiments, restart, sarsa, debug, instrument))
 
 """
-Test all models on all tracks under all conditions and store all data. This method is to allow a passive running
-of metric gathering across all trackss
+Build the list of every configuration that test_all runs. Each configuration is the name of the run function and
+its arguments. Each track is tested with value iteration with and without restarting and with Q learning with and
+without restarting and with and without SARSA. Value iteration prunes unreachable states if the parameters ask to.
+The 'instrument' parameter turns instrumentation on for every configuration if True or for the configurations whose
+track name or algorithm ('value iteration', 'Q learner') it lists. The 'profile' parameter picks cProfile over the
+call counters.
 """
-def test_all(parameters: Dict) -> None:
+def get_configurations(parameters: Dict, debug = False) -> List:
     # Unpack parameters
     directory = parameters['directory']
-    track_names = parameters['track_names']
     movement_cost = parameters['movement_cost']
     discount = parameters['discount']
     threshold = parameters['threshold']
@@ -130,21 +157,67 @@ def test_all(parameters: Dict) -> None:
     eta = parameters['eta']
     initial_exploration_rate = parameters['initial_exploration_rate']
     episodes = parameters['episodes']
-
-    debug = True
-    test_Q_learner(directory, "L-track", movement_cost, eta, discount, initial_exploration_rate, threshold, episodes, experiments, False, False, debug)
+    prune = parameters.get('prune', False)
+    instrument = parameters.get('instrument', False)
+    mode = 'profile' if parameters.get('profile', False) else 'counters'
+    # Instrumentation mode of a configuration or None
+    def get_mode(algorithm: str, track_name: str) -> str:
+        if instrument is True or (instrument and (algorithm in instrument or track_name in instrument)):
+            return mode
+        return None
+    configurations = []
     # Loop through each track
-    for t_name in track_names:        
-        # Test Value iteration without restarting
-        test_value_iteration(directory, t_name, movement_cost, discount, threshold, experiments, False, debug)
-        # Test Value Iteraation with restarting
-        test_value_iteration(directory, t_name, movement_cost, discount, threshold, experiments, True, debug)
-        # Test Q Learning without restarting without SARSA
-        test_Q_learner(directory, t_name, movement_cost, eta, discount, initial_exploration_rate, threshold, episodes, experiments, False, False, debug)
-        # Test Q Learning with restating without SARSA
-        test_Q_learner(directory, t_name, movement_cost, eta, discount, initial_exploration_rate, threshold, episodes, experiments, True, False, debug)
-        # Test Q Learning without restarting with SARSA
-        test_Q_learner(directory, t_name, movement_cost, eta, discount, initial_exploration_rate, threshold, episodes, experiments, False, True, debug)
-        # Test Q Learning with restarting with SARSA
-        test_Q_learner(directory, t_name, movement_cost, eta, discount, initial_exploration_rate, threshold, episodes, experiments, True, True, debug)
+    for t_name in parameters['track_names']:
+        # Test Value iteration without and with restarting
+        for restart in [False, True]:
+            configurations.append(('value iteration', (directory, t_name, movement_cost, discount, threshold,
+                                                       experiments, restart, debug, prune,
+                                                       get_mode('value iteration', t_name))))
+        # Test Q Learning without and with SARSA, each without and with restarting
+        for sarsa in [False, True]:
+            for restart in [False, True]:
+                configurations.append(('Q learner', (directory, t_name, movement_cost, eta, discount,
+                                                     initial_exploration_rate, threshold, episodes, experiments,
+                                                     restart, sarsa, debug, get_mode('Q learner', t_name))))
+    return configurations
 
+"""
+Run a single configuration with its own seed and return its results. This is the unit of work handed to each
+worker process.
+"""
+def run_configuration(configuration: List, seed: int) -> Dict:
+    # Seed every source of randomness within the worker
+    random.seed(seed)
+    np.random.seed(seed)
+    name, arguments = configuration
+    if name == 'value iteration':
+        return run_value_iteration(*arguments)
+    return run_Q_learner(*arguments)
+
+"""
+Run every configuration and write the results of each. Configurations do not depend on each other so with more than
+one worker they are spread across a process pool and the results are gathered back in the parent which writes the
+artifacts. Configuration i is seeded with seed + i in either case.
+"""
+def run_configurations(configurations: List, workers: int, seed: int) -> None:
+    seeds = [seed + i for i in range(len(configurations))]
+    if workers <= 1:
+        for configuration, configuration_seed in zip(configurations, seeds):
+            write_results(run_configuration(configuration, configuration_seed))
+        return
+    # Build every transition table once before the workers load them
+    for directory, track_name in sorted(set((arguments[0], arguments[1]) for _, arguments in configurations)):
+        Track(directory, track_name).get_transition_table()
+    with ProcessPoolExecutor(max_workers = workers) as executor:
+        for results in executor.map(run_configuration, configurations, seeds):
+            write_results(results)
+
+"""
+Test all models on all tracks under all conditions and store all data. This method is to allow a passive running
+of metric gathering across all trackss. The number of worker processes and the base seed may be passed within the
+parameters as well as whether to print debug output.
+"""
+def test_all(parameters: Dict) -> None:
+    debug = parameters.get('debug', False)
+    configurations = get_configurations(parameters, debug)
+    run_configurations(configurations, parameters.get('workers', 1), parameters.get('seed', 0))
@@ -1,16 +1,65 @@
+from transition_table import Transition_Table
 from typing import List
+import numpy as np
 import random
 
+"""
+Codes of each cell type within the track grid
+"""
+EMPTY_CELL = 0
+WALL_CELL = 1
+START_CELL = 2
+FINISH_CELL = 3
+CELL_CODES = {'.': EMPTY_CELL, '#': WALL_CELL, 'S': START_CELL, 'F': FINISH_CELL}
+
 """
 This object contains all of the member variables for any track. It converts a text file into 
-a List while excluding the coordinates and retaining the row, col integrity. There are also member
-methods that determine if certain locations are walls, finish lines or empty. 
+a List while excluding the coordinates and retaining the row, col integrity. The List is also parsed
+into a uint8 grid of cell codes with boolean masks and index arrays of the start, finish and wall cells. 
+There are also member methods that determine if certain locations are walls, finish lines or empty. 
 """
 
 class Track:
     def __init__ (self, directory: str, track_name: str) -> None:
+        self.directory = directory
+        self.track_name = track_name
         # Pull the track into a 2D array
         self.track_list = self.convert_txt_to_array(f"{directory}/{track_name}.txt")
+        # Grid of cell codes
+        self.grid = self.convert_array_to_grid(self.track_list)
+        # Masks of each cell type
+        self.wall_mask = self.grid == WALL_CELL
+        self.finish_mask = self.grid == FINISH_CELL
+        self.start_mask = self.grid == START_CELL
+        # [row, col] indices of each cell type
+        self.wall_indices = np.argwhere(self.wall_mask)
+        self.finish_indices = np.argwhere(self.finish_mask)
+        self.start_indices = np.argwhere(self.start_mask)
+        # Start positions as tuples so a Racecar does not rescan the track
+        self.start_positions = [(int(row), int(col)) for row, col in self.start_indices]
+        # Table of every move on the track. Built or loaded on first use
+        self.transition_table = None
+        # Reachable state ids of each restart mode. Searched on first use
+        self.reachable_states = {}
+
+    """
+    Return the track's transition table. The table is loaded from the cache next to the track file or built
+    the first time it is requested.
+    """
+    def get_transition_table(self) -> Transition_Table:
+        if self.transition_table is None:
+            self.transition_table = Transition_Table(self)
+        return self.transition_table
+
+    """
+    Return the sorted state ids that can be reached from the start line with the given restart mode. The search
+    runs once per restart mode.
+    """
+    def get_reachable_states(self, restart: bool) -> np.ndarray:
+        if restart not in self.reachable_states:
+            start_cells = self.start_indices[:, 0] * len(self.track_list[0]) + self.start_indices[:, 1]
+            self.reachable_states[restart] = self.get_transition_table().get_reachable_states(start_cells, restart)
+        return self.reachable_states[restart]
 
     """
     Convert the test file into a 2D list while exluding the dimensions line. Make sure to skip
@@ -33,45 +82,46 @@ class Track:
             track_list.append(line_list)
         return track_list
 
+    """
+    Convert the 2D List into a uint8 grid of cell codes. Every row must have the same length.
+    """
+    def convert_array_to_grid(self, track_list: List) -> np.ndarray:
+        grid = np.zeros((len(track_list), len(track_list[0])), dtype = np.uint8)
+        for row in range(len(track_list)):
+            for col in range(len(track_list[row])):
+                if track_list[row][col] not in CELL_CODES:
+                    raise ValueError(f"Invalid character {track_list[row][col]} found within track at {[row, col]}")
+                grid[row, col] = CELL_CODES[track_list[row][col]]
+        return grid
+
     """
     Determine if a particular coordinate is a wall
     """
     def check_wall (self, position: List) -> bool:
         # Check if a particular index is a wall (#)
-        return self.track_list[position[0]][position[1]] == "#"
+        return bool(self.wall_mask[position[0], position[1]])
 
     """
     Determine if a particular coordiante is a Finish point
     """
     def check_finish (self, position: List) -> bool:
         # Check if a particular index is a finish (F)
-        return self.track_list[position[0]][position[1]] == "F"
+        return bool(self.finish_mask[position[0], position[1]])
     
 
     """
-    Look through the entier track 2D list and find all start positions. There are usually multiple
-    start positions per track so we need a list of all the start positions. 
+    Return a list of all the start positions on the track. There are usually multiple start positions 
+    per track so we need a list of all the start positions. These are found once when the track is loaded.
     """
     def get_start_positions(self) -> List:
-        # Return a list of all the start positions on the track
-        start_positions = []
-        # Go through all elements and return indices that are labeled as 'S'
-        for row in range(len(self.track_list)):
-            for col in range(len(self.track_list[row])):
-                if self.track_list[row][col] == "S":
-                    # Insert indices as tuples
-                    start_positions.append((row, col))
-        return start_positions
+        return self.start_positions
     
     """
-    Select a random start position on the track. This is done by calling the get_start_positions 
-    helper method. 
+    Select a random start position on the track from the cached start positions. 
     """
     def pick_start_position(self) -> List:
-        # Get all start positions on the track
-        start_positions = self.get_start_positions()
-        # Pick a random one from these
-        return random.choice (start_positions)
+        # Pick a random one from the start positions
+        return random.choice (self.start_positions)
 
     """
     Given a line vector with the assumption that earlier coordinates correlate to chronologically 
@@ -80,21 +130,24 @@ class Track:
     if it collides with a wall.  
     """
     def closest_wall_on_collision(self, line: List) -> List:
-        # Iterate through each element and check if it is a wall
-        for i in range(len(line)):
-            if self.check_wall(line[i]): 
-                # If we hit a wall, return the last valid position 
-                return line[i - 1]
+        if len(line) == 0:
+            return None
+        # Check every element of the line against the wall mask at once
+        coordinates = np.asarray(line)
+        walls = self.wall_mask[coordinates[:, 0], coordinates[:, 1]]
         # If we didn't hit a wall, return None
-        return None
+        if not walls.any():
+            return None
+        # If we hit a wall, return the last valid position 
+        return line[int(walls.argmax()) - 1]
 
     """
     Given a line vector, check if this line vector intersects any finish points.
     """
     # Determine if we hit a finish line
     def finished(self, line: List) -> bool:
-        # Iterate through each element and check if it is finish line
-        for i in range(len(line)):
-            if self.check_finish(line[i]):
-                return True
-        return False
+        if len(line) == 0:
+            return False
+        # Check every element of the line against the finish mask at once
+        coordinates = np.asarray(line)
+        return bool(self.finish_mask[coordinates[:, 0], coordinates[:, 1]].any())
@@ -0,0 +1,141 @@
+from typing import List
+import random
+import os
+
+"""
+This file generates tracks procedurally in the format of the bundled track files: a "rows,cols" dimensions line
+followed by one line of '#', '.', 'S' and 'F' characters per row. A track is a single corridor of constant width
+surrounded by walls that snakes down the grid. The corridor runs along straight segments that alternate between
+horizontal and vertical, so every turn is a right angle like the corners of the L-track. The start and finish lines
+cut across the corridor either at its two ends or at random points along it.
+"""
+
+MAX_SIZE = 500
+
+"""
+Narrowest corridor. Within a corridor one cell wide every failed acceleration at a corner hits a wall, so the best
+policy of many such tracks is to never leave the start line.
+"""
+MIN_WIDTH = 2
+PLACEMENTS = ['ends', 'random']
+
+"""
+Return the corner waypoints of a corridor with the given number of turns. Waypoints are the top left cell of the
+corridor's cross section. Horizontal segments run between the left and right border and vertical segments step
+down by an equal amount, so the lanes of the corridor are spread evenly over the grid. Raises a ValueError if the
+lanes would not be separated by a wall.
+"""
+def get_waypoints(rows: int, cols: int, width: int, turns: int) -> List:
+    left, right = 1, cols - 1 - width
+    top, bottom = 1, rows - 1 - width
+    vertical_segments = (turns + 1) // 2
+    # Lanes must be separated by at least one row of wall
+    if vertical_segments > 0 and (bottom - top) // vertical_segments < width + 1:
+        raise ValueError(f"{turns} turns of width {width} do not fit within {rows} rows")
+    if right - left < width + 1:
+        raise ValueError(f"A corridor of width {width} does not fit within {cols} columns")
+    waypoints = [(top, left)]
+    row, col = top, left
+    lane = 0
+    for segment in range(turns + 1):
+        if segment % 2 == 0:
+            # Horizontal segments alternate between running right and running left
+            col = right if col == left else left
+        else:
+            lane += 1
+            row = top + (bottom - top) * lane // vertical_segments
+        waypoints.append((row, col))
+    return waypoints
+
+"""
+Return every cross section of the corridor in order along the path. A cross section is the list of width cells
+that a start or finish line covers at that point of the path. A corner that ends one segment and starts the next
+with the same cells is only kept once.
+"""
+def get_cross_sections(waypoints: List, width: int) -> List:
+    sections = []
+    for (start_row, start_col), (end_row, end_col) in zip(waypoints, waypoints[1:]):
+        if start_row == end_row:
+            # Horizontal segments are cut by columns
+            step = 1 if end_col >= start_col else -1
+            for col in range(start_col, end_col + step, step):
+                sections.append([(start_row + offset, col + (width - 1 if step > 0 and col == end_col else 0))
+                                 for offset in range(width)])
+        else:
+            # Vertical segments are cut by rows
+            for row in range(start_row, end_row + 1):
+                sections.append([(row + (width - 1 if row == end_row else 0), start_col + offset)
+                                 for offset in range(width)])
+    # Drop consecutive duplicates so no part of the path has zero length
+    return [section for index, section in enumerate(sections) if index == 0 or section != sections[index - 1]]
+
+"""
+Generate a track as a 2D list of characters. The corridor is width cells wide and turns the given number of times.
+With 'ends' placement the start line is at the beginning of the corridor and the finish line at its end. With
+'random' placement both lines cut across the corridor at random points along it, the start line first. Raises a
+ValueError for invalid options, for corridors narrower than MIN_WIDTH, for tracks larger than MAX_SIZE in either
+dimension and if the finish line cannot be reached from the start line.
+"""
+def generate_track(rows: int, cols: int, width: int = 4, turns: int = 1, placement: str = 'ends',
+                   seed: int = 0) -> List:
+    if rows > MAX_SIZE or cols > MAX_SIZE:
+        raise ValueError(f"Tracks are limited to {MAX_SIZE}x{MAX_SIZE}")
+    if width < MIN_WIDTH or turns < 0:
+        raise ValueError(f"Invalid corridor width {width} or turn count {turns}. Corridors are at least {MIN_WIDTH} "
+                         f"cells wide")
+    if placement not in PLACEMENTS:
+        raise ValueError(f"Unknown start and finish placement {placement}")
+    rng = random.Random(seed)
+    waypoints = get_waypoints(rows, cols, width, turns)
+    # Carve every segment out of a grid of walls
+    track_list = [['#'] * cols for _ in range(rows)]
+    for (start_row, start_col), (end_row, end_col) in zip(waypoints, waypoints[1:]):
+        for row in range(min(start_row, end_row), max(start_row, end_row) + width):
+            for col in range(min(start_col, end_col), max(start_col, end_col) + width):
+                track_list[row][col] = '.'
+    # Place the start and finish lines
+    sections = get_cross_sections(waypoints, width)
+    if placement == 'ends':
+        start, finish = 0, len(sections) - 1
+    else:
+        # Keep the lines apart so a race is never a single move
+        gap = min(len(sections) // 2, 2 * width + 5)
+        start = rng.randrange(len(sections) - gap)
+        finish = rng.randrange(start + gap, len(sections))
+    for row, col in sections[start]:
+        track_list[row][col] = 'S'
+    for row, col in sections[finish]:
+        track_list[row][col] = 'F'
+    if not is_finish_reachable(track_list):
+        raise ValueError("The finish line of the generated track cannot be reached from its start line")
+    return track_list
+
+"""
+Return whether any finish cell can be reached from a start cell through cells that are not walls. Cells are
+connected to their eight neighbours like the single cell moves of a Racecar.
+"""
+def is_finish_reachable(track_list: List) -> bool:
+    rows, cols = len(track_list), len(track_list[0])
+    frontier = [(row, col) for row in range(rows) for col in range(cols) if track_list[row][col] == 'S']
+    seen = set(frontier)
+    while frontier:
+        row, col = frontier.pop()
+        if track_list[row][col] == 'F':
+            return True
+        for next_row in range(max(row - 1, 0), min(row + 2, rows)):
+            for next_col in range(max(col - 1, 0), min(col + 2, cols)):
+                if (next_row, next_col) not in seen and track_list[next_row][next_col] != '#':
+                    seen.add((next_row, next_col))
+                    frontier.append((next_row, next_col))
+    return False
+
+"""
+Write a track to {directory}/{track_name}.txt in the format read by Track
+"""
+def write_track(directory: str, track_name: str, track_list: List) -> None:
+    os.makedirs(directory, exist_ok = True)
+    with open(f"{directory}/{track_name}.txt", "w") as file:
+        file.write(f"{len(track_list)},{len(track_list[0])}\n")
+        for row in track_list:
+            # Track reads every line up to its new line character, including the last one
+            file.write("".join(row) + "\n")
@@ -0,0 +1,67 @@
+from print_track import print_racer_on_track
+from typing import Callable, List
+import numpy as np
+
+"""
+This file holds an in memory buffer of the positions and velocities a Racecar passes through during a race. Tests
+record into the buffer instead of drawing the track on every step so that evaluation time measures the policy and
+not terminal output. A recorded race can be replayed with any render function afterwards.
+"""
+
+"""
+Each record holds the [row, col] position and the [v_row, v_col] velocity of a single step
+"""
+TRAJECTORY_DTYPE = np.dtype([('position', np.int32, (2,)), ('velocity', np.int8, (2,))])
+
+class Trajectory:
+    def __init__(self, capacity: int = 1024) -> None:
+        # Preallocated records. The buffer doubles whenever it is full
+        self.records = np.zeros(capacity, dtype = TRAJECTORY_DTYPE)
+        # Number of records written
+        self.length = 0
+
+    """
+    Append the position and velocity of a step. The buffer doubles in size if it is full.
+    """
+    def append(self, position: List, velocity: List) -> None:
+        if self.length == len(self.records):
+            self.records = np.concatenate([self.records, np.zeros(len(self.records), dtype = TRAJECTORY_DTYPE)])
+        self.records[self.length] = (position, velocity)
+        self.length += 1
+
+    """
+    Remove every record while keeping the allocated buffer
+    """
+    def clear(self) -> None:
+        self.length = 0
+
+    """
+    Getters
+    """
+    def get_positions(self) -> np.ndarray:
+        return self.records['position'][:self.length]
+
+    def get_velocities(self) -> np.ndarray:
+        return self.records['velocity'][:self.length]
+
+    def __len__(self) -> int:
+        return self.length
+
+    """
+    Render every k-th recorded step if every is positive and always the final step of the race on a track
+    """
+    def replay(self, track_list: List, render: Callable = print_racer_on_track, every: int = 1) -> None:
+        for step in range(self.length):
+            if (every > 0 and step % every == 0) or step == self.length - 1:
+                render(track_list, self.records['position'][step].tolist())
+
+"""
+Record and render a step of a race. The step is appended to the trajectory if one is given. The render function is
+called on every render_every-th step if render_every is positive and always once the race is over.
+"""
+def record_step(track_list: List, position: List, velocity: List, step: int, finished: bool,
+                trajectory: Trajectory = None, render: Callable = None, render_every: int = 0) -> None:
+    if trajectory is not None:
+        trajectory.append(position, velocity)
+    if render is not None and (finished or (render_every > 0 and step % render_every == 0)):
+        render(track_list, position)
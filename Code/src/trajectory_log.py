@@ -0,0 +1,135 @@
+from print_track import print_racer_on_track
+from typing import Callable, List
+import numpy as np
+import os
+
+"""
+This file defines a compact binary log of every step a Racecar takes across many episodes. The file starts with a
+fixed header followed by fixed width records so a log of millions of steps can be memory mapped and analysed,
+replayed or turned into heatmaps without reading it into memory. Records are buffered in memory by the writer and
+appended to the file in large blocks.
+"""
+
+"""
+Each record holds the episode, the step within the episode, the [row, col] position and [v_row, v_col] velocity
+after the step, the commanded and the applied acceleration of the step and whether the step hit a wall.
+"""
+LOG_DTYPE = np.dtype([('episode', '<i4'), ('step', '<i4'), ('position', '<i2', (2,)), ('velocity', 'i1', (2,)),
+                      ('commanded', 'i1', (2,)), ('applied', 'i1', (2,)), ('wall', '?')])
+
+"""
+The header holds a magic string, the format version and the size of a single record
+"""
+LOG_MAGIC = b"RTRJ"
+LOG_VERSION = 1
+HEADER_DTYPE = np.dtype([('magic', 'S4'), ('version', '<u4'), ('record_size', '<u4'), ('reserved', '<u4')])
+
+"""
+This class appends records to a trajectory log. Records are collected within a preallocated buffer that is written
+to the file whenever it is full, when flushed and when the writer is closed. Can be used as a context manager.
+"""
+class Trajectory_Log_Writer:
+    def __init__(self, file_path: str, buffer_size: int = 65536, append: bool = False) -> None:
+        self.file_path = file_path
+        # Continue an existing log or start a new one with a header
+        if append and os.path.exists(file_path):
+            read_header(file_path)
+            self.file = open(file_path, "ab")
+        else:
+            self.file = open(file_path, "wb")
+            self.file.write(np.array([(LOG_MAGIC, LOG_VERSION, LOG_DTYPE.itemsize, 0)], dtype = HEADER_DTYPE).tobytes())
+        # Records waiting to be written
+        self.buffer = np.zeros(buffer_size, dtype = LOG_DTYPE)
+        self.length = 0
+
+    """
+    Append a single step to the buffer and write the buffer to the file if it is full
+    """
+    def write(self, episode: int, step: int, position: List, velocity: List, commanded: List, applied: List,
+              wall: bool) -> None:
+        self.buffer[self.length] = (episode, step, position, velocity, commanded, applied, wall)
+        self.length += 1
+        if self.length == len(self.buffer):
+            self.flush()
+
+    """
+    Write every buffered record to the file
+    """
+    def flush(self) -> None:
+        self.file.write(self.buffer[:self.length].tobytes())
+        self.file.flush()
+        self.length = 0
+
+    """
+    Write the remaining records and close the file
+    """
+    def close(self) -> None:
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+"""
+Read and validate the header of a trajectory log
+"""
+def read_header(file_path: str) -> np.ndarray:
+    header = np.fromfile(file_path, dtype = HEADER_DTYPE, count = 1)
+    if len(header) == 0 or header['magic'][0] != LOG_MAGIC:
+        raise ValueError(f"{file_path} is not a trajectory log")
+    if header['version'][0] != LOG_VERSION or header['record_size'][0] != LOG_DTYPE.itemsize:
+        raise ValueError(f"Unsupported trajectory log version {header['version'][0]} in {file_path}")
+    return header[0]
+
+"""
+Open a trajectory log as a read only memory map of records
+"""
+def open_trajectory_log(file_path: str) -> np.ndarray:
+    read_header(file_path)
+    record_count = (os.path.getsize(file_path) - HEADER_DTYPE.itemsize) // LOG_DTYPE.itemsize
+    if record_count == 0:
+        return np.zeros(0, dtype = LOG_DTYPE)
+    return np.memmap(file_path, dtype = LOG_DTYPE, mode = 'r', offset = HEADER_DTYPE.itemsize, shape = (record_count,))
+
+"""
+Return the records of a single episode. Records of an episode are contiguous within the log.
+"""
+def get_episode(records: np.ndarray, episode: int, chunk_size: int = 1 << 20) -> np.ndarray:
+    # Search the log in chunks so only the episode column of one chunk is loaded at a time
+    for start in range(0, len(records), chunk_size):
+        matches = np.flatnonzero(records['episode'][start:start + chunk_size] == episode)
+        if len(matches) > 0:
+            first = start + matches[0]
+            last = first
+            while last < len(records) and records['episode'][last] == episode:
+                last += 1
+            return records[first:last]
+    return records[0:0]
+
+"""
+Render every k-th step and the final step of an episode of the log on a track
+"""
+def replay_episode(records: np.ndarray, episode: int, track_list: List, render: Callable = print_racer_on_track,
+                   every: int = 1) -> None:
+    steps = get_episode(records, episode)
+    for step in range(len(steps)):
+        if step % every == 0 or step == len(steps) - 1:
+            render(track_list, steps['position'][step].tolist())
+
+"""
+Count how often every position of a track was visited and how often every position was the reset location of a
+wall hit. The log is read in chunks so memory stays bounded for logs of any size. Returns both (rows, cols) arrays.
+"""
+def get_heatmaps(records: np.ndarray, rows: int, cols: int, chunk_size: int = 1 << 20) -> List[np.ndarray]:
+    visits = np.zeros(rows * cols, dtype = np.int64)
+    walls = np.zeros(rows * cols, dtype = np.int64)
+    for start in range(0, len(records), chunk_size):
+        chunk = records[start:start + chunk_size]
+        cells = chunk['position'][:, 0].astype(np.int64) * cols + chunk['position'][:, 1]
+        visits += np.bincount(cells, minlength = rows * cols)
+        walls += np.bincount(cells[chunk['wall']], minlength = rows * cols)
+    return visits.reshape(rows, cols), walls.reshape(rows, cols)
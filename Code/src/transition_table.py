@@ -0,0 +1,220 @@
+from calculations import ACCELERATION_SUCCESS_RATE, VELOCITY_CAP, VELOCITY_RANGE, VELOCITY_COUNT, ACCELERATIONS, \
+    get_line_offsets, index_to_velocity, velocity_to_index, acceleration_to_index
+from typing import List, Tuple
+from array import array
+import numpy as np
+import hashlib
+import os
+
+"""
+This file precomputes where a Racecar ends up for every (position, velocity, acceleration) triple on a track.
+Moving a Racecar is deterministic once the acceleration is applied, so the line vector between the start and end
+position only has to be traced once per track. The results are cached to disk next to the track text file and
+memory mapped when loaded, so training and testing never trace a line at run time. The step method is the one
+kernel of the race dynamics that the Racecar, the planners and the learners move through.
+"""
+
+"""
+Outcome codes of a single move
+"""
+ROAD = 0
+WALL = 1
+FINISH = 2
+
+"""
+Action id of the [0, 0] acceleration and velocity index of the [0, 0] velocity
+"""
+STOPPED_ACTION = acceleration_to_index([0, 0])
+STOPPED_VELOCITY = velocity_to_index([0, 0])
+
+"""
+Each entry holds the outcome code, the flat cell index (row * cols + col) the Racecar ends up on and the index
+of the velocity it ends up with. For ROAD outcomes the cell is the next position. For WALL outcomes the cell is
+the last road position before the wall (the reset location) and the velocity is [0, 0]. For FINISH outcomes the
+cell is the first finish position that was crossed.
+"""
+TRANSITION_DTYPE = np.dtype([('outcome', np.int8), ('cell', np.int32), ('velocity', np.int8)])
+
+"""
+Version of the table's contents. Bump it whenever the encoding of outcomes, cells or velocities or the rules of a
+move change so that cached tables of older builds are never loaded.
+"""
+TABLE_VERSION = 2
+
+"""
+Return the action id that takes effect when a racer holding held_action commands action. With a random generator
+the command succeeds with probability ACCELERATION_SUCCESS_RATE and otherwise the racer keeps the acceleration it
+holds. Without a generator the command always succeeds. Exactly one random number is drawn per call.
+"""
+def apply_action(held_action: int, action: int, rng = None) -> int:
+    if rng is not None and rng.random() >= ACCELERATION_SUCCESS_RATE:
+        return held_action
+    return action
+
+class Transition_Table:
+    def __init__(self, track, cache: bool = True) -> None:
+        self.track_list = track.track_list
+        self.wall_mask = track.wall_mask
+        self.finish_mask = track.finish_mask
+        # Dimensions of the track
+        self.rows = len(self.track_list)
+        self.cols = len(self.track_list[0])
+        # Load the table from disk if it was already built for this exact track
+        self.cache_path = self.get_cache_path(track.directory, track.track_name) if cache else None
+        self.table = self.load(self.cache_path) if self.cache_path is not None else None
+        if self.table is None:
+            self.table = self.build()
+            if self.cache_path is not None:
+                self.save(self.cache_path)
+        # Views of each column of the table with shape (cells, 121, 9)
+        self.outcomes = self.table['outcome']
+        self.cells = self.table['cell']
+        self.velocities = self.table['velocity']
+        # Outcome and next state id of every (state id * 9 + action id) as compact arrays for fast scalar lookups
+        self.state_outcomes = array('b', np.ascontiguousarray(self.outcomes).tobytes())
+        self.next_states = array('q', (self.cells.astype(np.int64) * VELOCITY_COUNT + self.velocities).tobytes())
+
+    """
+    The cache file is named after the track and a digest of the track's layout, the table version and the entry
+    dtype so that neither editing a track file nor changing the table format ever loads a stale table.
+    """
+    def get_cache_path(self, directory: str, track_name: str) -> str:
+        layout = "\n".join("".join(row) for row in self.track_list)
+        key = f"{layout}\n{TABLE_VERSION}\n{TRANSITION_DTYPE.descr}"
+        digest = hashlib.sha1(key.encode()).hexdigest()[:12]
+        return f"{directory}/{track_name}.{digest}.transitions.npy"
+
+    """
+    Memory map the cached table at the file path. Returns None if there is no cached table or if its dtype or shape
+    do not match this track, in which case the table is rebuilt.
+    """
+    def load(self, file_path: str) -> np.ndarray:
+        if not os.path.exists(file_path):
+            return None
+        try:
+            table = np.load(file_path, mmap_mode = 'r')
+        except ValueError:
+            return None
+        shape = (self.rows * self.cols, VELOCITY_COUNT, len(ACCELERATIONS))
+        if table.dtype != TRANSITION_DTYPE or table.shape != shape:
+            return None
+        return table
+
+    """
+    Write the table to disk. The table is written to a temporary file first and then moved into place so that a
+    partially written file is never loaded.
+    """
+    def save(self, file_path: str) -> None:
+        temporary_path = f"{file_path}.{os.getpid()}.tmp"
+        with open(temporary_path, "wb") as file:
+            np.save(file, self.table)
+        os.replace(temporary_path, file_path)
+
+    """
+    Build the table. Every capped velocity is traced from all cells at once by shifting the velocity's cached
+    line offsets to every cell. The same rules as the Racecar apply: crossing any finish position finishes the 
+    race even if a wall is hit on the way, otherwise the first wall on the line resets the Racecar to the 
+    position before it. The result is shared by every velocity and acceleration pair that produces the capped
+    velocity.
+    """
+    def build(self) -> np.ndarray:
+        # [row, col] of every cell
+        cell_rows, cell_cols = np.divmod(np.arange(self.rows * self.cols), self.cols)
+        # Outcome of moving with each capped velocity from each cell
+        moves = np.zeros((self.rows * self.cols, VELOCITY_COUNT), dtype = TRANSITION_DTYPE)
+        cells = np.arange(self.rows * self.cols)
+        for velocity_index in range(VELOCITY_COUNT):
+            offsets = np.array(get_line_offsets(*index_to_velocity(velocity_index)))
+            # Coordinates of the line from every cell with shape (cells, line length)
+            line_rows = cell_rows[:, None] + offsets[None, :, 0]
+            line_cols = cell_cols[:, None] + offsets[None, :, 1]
+            # Lines are cut at the first coordinate outside of the track
+            valid = np.logical_and.accumulate((line_rows >= 0) & (line_rows < self.rows) &
+                                              (line_cols >= 0) & (line_cols < self.cols), axis = 1)
+            line_rows = np.where(valid, line_rows, 0)
+            line_cols = np.where(valid, line_cols, 0)
+            finishes = valid & self.finish_mask[line_rows, line_cols]
+            walls = valid & self.wall_mask[line_rows, line_cols]
+            # Index of the last valid coordinate, the first finish and the first wall of each line
+            last = valid.sum(axis = 1) - 1
+            first_finish = finishes.argmax(axis = 1)
+            first_wall = walls.argmax(axis = 1)
+            # A wall at the start of the line wraps around to the last valid coordinate
+            reset = np.where(first_wall == 0, last, first_wall - 1)
+            finished = finishes.any(axis = 1)
+            crashed = ~finished & walls.any(axis = 1)
+            ending = np.where(finished, first_finish, np.where(crashed, reset, last))
+            moves['outcome'][:, velocity_index] = np.where(finished, FINISH, np.where(crashed, WALL, ROAD))
+            moves['cell'][:, velocity_index] = line_rows[cells, ending] * self.cols + line_cols[cells, ending]
+            # Walls reset the velocity
+            moves['velocity'][:, velocity_index] = np.where(crashed, STOPPED_VELOCITY, velocity_index)
+        # Capped velocity index reached by each velocity index and acceleration
+        velocity_grid = np.array([index_to_velocity(index) for index in range(VELOCITY_COUNT)])
+        capped = np.clip(velocity_grid[:, None, :] + np.array(ACCELERATIONS)[None, :, :], -VELOCITY_CAP, VELOCITY_CAP)
+        capped_index = (capped[:, :, 0] + VELOCITY_CAP) * VELOCITY_RANGE + (capped[:, :, 1] + VELOCITY_CAP)
+        # Gather into (cells, velocities, accelerations)
+        return moves[:, capped_index]
+
+    """
+    Return the sorted state ids that a Racecar can reach from the start line. Every race starts on a start cell
+    with velocity [0, 0]. From there every action is followed because a failed acceleration keeps the previous
+    acceleration, which is itself one of the nine actions. Crossing the finish line ends the race. Hitting a wall
+    resets the Racecar with velocity [0, 0] to either the table's reset cell or, when restarting, a start cell
+    which is reached already. The search expands a whole frontier of states at once.
+    """
+    def get_reachable_states(self, start_cells: np.ndarray, restart: bool) -> np.ndarray:
+        action_count = len(ACCELERATIONS)
+        # Flat outcome and next state id of every (state id * 9 + action id)
+        outcomes = np.asarray(self.outcomes).reshape(-1)
+        next_states = np.frombuffer(self.next_states, dtype = np.int64)
+        reached = np.zeros(self.rows * self.cols * VELOCITY_COUNT, dtype = bool)
+        frontier = np.asarray(start_cells, dtype = np.int64) * VELOCITY_COUNT + STOPPED_VELOCITY
+        reached[frontier] = True
+        while frontier.size > 0:
+            index = (frontier[:, None] * action_count + np.arange(action_count)).ravel()
+            # Finished races end and restarted races are back on the start line
+            followed = outcomes[index] != FINISH if not restart else outcomes[index] == ROAD
+            candidates = next_states[index[followed]]
+            frontier = np.unique(candidates[~reached[candidates]])
+            reached[frontier] = True
+        return np.flatnonzero(reached)
+
+    """
+    Convert a flat cell index back into a position in the format List(row, col)
+    """
+    def get_position(self, cell: int) -> List:
+        return [int(cell) // self.cols, int(cell) % self.cols]
+
+    """
+    Look up where a Racecar at a position with a velocity ends up after accelerating. Returns the outcome code,
+    the ending position and the ending velocity.
+    """
+    def lookup(self, position: List, velocity: List, acceleration: List) -> List:
+        entry = self.table[position[0] * self.cols + position[1], velocity_to_index(velocity),
+                           acceleration_to_index(acceleration)]
+        return int(entry['outcome']), self.get_position(entry['cell']), index_to_velocity(int(entry['velocity']))
+
+    """
+    Look up where a state id ends up after taking an action id. Returns the outcome code and the next state id.
+    """
+    def lookup_state(self, state: int, action: int) -> List:
+        index = state * len(ACCELERATIONS) + action
+        return self.state_outcomes[index], self.next_states[index]
+
+    """
+    Take one step of a race without touching any Racecar. The state of a racer is the immutable tuple (state id,
+    action id of the acceleration it holds). The commanded action takes effect as decided by apply_action with the
+    random generator, so without one the step is deterministic. Returns the next state, the outcome code of the move
+    and the cell the racer is reset to after hitting a wall or -1 for any other outcome. Hitting a wall stops the
+    racer on the reset cell with velocity and acceleration [0, 0]. Nothing is mutated, so steps can be taken from
+    any thread or process that shares the table.
+    """
+    def step(self, state: Tuple, action: int, rng = None) -> Tuple:
+        state_id, held_action = state
+        action = apply_action(held_action, action, rng)
+        index = state_id * len(ACCELERATIONS) + action
+        outcome = self.state_outcomes[index]
+        next_state_id = self.next_states[index]
+        if outcome == WALL:
+            return (next_state_id, STOPPED_ACTION), outcome, next_state_id // VELOCITY_COUNT
+        return (next_state_id, action), outcome, -1
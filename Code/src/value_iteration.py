@@ -1,32 +1,86 @@
 from racecar import Racecar
 from track import Track
-from calculations import get_max_from_subset, convert_coordinate_to_list, convert_list_to_coordinate
-from learning_table import initialize_value_dict, get_reward_from_accelerating
-from print_track import print_racer_on_track
-from typing import List, Dict
+from calculations import ACCELERATION_SUCCESS_RATE, VELOCITY_COUNT, ACCELERATIONS, encode_state, \
+    acceleration_to_index
+from learning_table import STORES, Value_Store, create_value_store, get_reward_from_accelerating
+from trajectory import Trajectory, record_step
+from policy_file import save_policy, load_policy
+from value_tensor import Value_Tensor
+from sweep_schedules import SCHEDULES, train_schedule
+from instrumentation import Instrumentation
+from typing import Callable, Dict, List
+import numpy as np
+import random
+import time
 
 """
-This class creates the Value Iteration model that trains a dictionary with a best action per state to allow a Racecar
-to navigate any track. 
+This class creates the Value Iteration model that trains a value store with a best action per state to allow a Racecar
+to navigate any track. The 'python' backend visits the states of a value store one at a time while the 'numpy' backend
+stores values within dense arrays and sweeps over all states at once. Both backends learn the same best accelerations.
+The 'sweep' schedule backs up every state from the values of the previous episode. The python backend can instead back
+up states in place with one of the schedules of sweep_schedules.py. With pruning, only the states a Racecar can reach
+from the start line with the given restart mode are trained, so the model must be tested with the same restart mode.
+Stochastic backups take the 20% chance of a failed acceleration into account by blending the successor of each
+acceleration with the successor of not accelerating. The python backend keeps its values within either a dense
+value store or a sparse one that only allocates the states it trains.
 """
   
 class Value_Iteration:
-    def __init__ (self, track: Track, movement_cost: float):
+    def __init__ (self, track: Track, movement_cost: float, backend: str = 'python', schedule: str = 'sweep',
+                  prune: bool = False, restart: bool = False, stochastic: bool = False, store: str = 'dense'):
         self.track = track
+        if backend not in ('python', 'numpy'):
+            raise ValueError(f"Unknown value iteration backend {backend}")
+        if store not in STORES:
+            raise ValueError(f"Unknown value store {store}")
+        if schedule != 'sweep' and schedule not in SCHEDULES:
+            raise ValueError(f"Unknown value iteration schedule {schedule}")
+        if schedule != 'sweep' and backend != 'python':
+            raise ValueError(f"The {schedule} schedule requires the python backend")
+        self.backend = backend
+        self.schedule = schedule
+        self.store = store
+        self.stochastic = stochastic
+        # Episodes, backups and wall clock time of the last training run
+        self.training_report = {}
+        # Policy loaded from a policy file. Takes the place of the trained values when set
+        self.loaded_policy = None
         """
-        Initialize dictionary to hold all initial rewards at each state. At the start, each position 
+        Initialize value store to hold all initial rewards at each state. At the start, each position 
         shall be considered a state. However, unique accelerations at each each velocity will be considered
         states during the training process. Since each velocity can have up to 9 unique acceleration values 
         (-1, 0, 1 for both x and y coordinates) and each location can have 121 unique velocities (-5:5 for both
         x and y), each position on the track can have a maximum of 1089 states.
         """ 
-        self.value_dict = initialize_value_dict(track, self.get_wall_reward(), self.get_finish_reward(), movement_cost)
+        self.value_store = create_value_store(store, track, self.get_wall_reward(), self.get_finish_reward(),
+                                              movement_cost)
+        # State ids that are trained in row major order. Either the reachable states or every changeable state
+        self.prune = prune
+        if prune:
+            self.states = track.get_reachable_states(restart).tolist()
+        else:
+            self.states = [state for cell in self.value_store.changeable_cells
+                           for state in range(cell * VELOCITY_COUNT, (cell + 1) * VELOCITY_COUNT)]
+        # The numpy backend holds the same values within dense tensors
+        self.value_tensor = None
+        if backend == 'numpy':
+            self.value_tensor = Value_Tensor(track, movement_cost, self.get_wall_reward(), self.get_finish_reward(),
+                                             track.get_reachable_states(restart) if prune else None)
 
     """
     Getter
     """
-    def get_value_dict(self) -> Dict:
-        return self.value_dict
+    def get_value_store(self) -> Value_Store:
+        return self.value_store
+
+    def get_value_tensor(self) -> Value_Tensor:
+        return self.value_tensor
+
+    def get_training_report(self) -> Dict:
+        return self.training_report
+
+    def get_states(self) -> List:
+        return self.states
     
     """
     Get Wall Reward. Hard coded to -1000
@@ -41,15 +95,56 @@ class Value_Iteration:
         return 100
     
     """
-    Train will alter the value_dict member variable to have a best action per each state. This is done by going through
+    Train will alter the value_store member variable to have a best action per each state. This is done by going through
     each location on the track and determining the rewards for selecting each acceleration at each velocity. Once the best
-    acceleration for each state is selected, it is stored within the dictionary. Once we store the best acceleration for 
+    acceleration for each state is selected, it is stored within the value store. Once we store the best acceleration for 
     all locations on the track, we consider this to be one episode. We keep running episodes and store the largest change in 
     best value for any state. Once the largest change becomes smaller than our threshold value, we consider the model to be
     trained and end the training process. We also only alter the values of changeable states. Meaning, we do not change
-    the values of walls nor finish points. 
+    the values of walls nor finish points. The episode count, number of state backups and wall clock time of the run
+    are stored within the training report. Every sweep is recorded by the instrumentation if one is passed. Training
+    is warm started from initial values indexed by state id if given. NaN marks a state without an initial value.
+    """
+    def train (self, discount: float, threshold: float, debug = False, instrumentation: Instrumentation = None,
+               initial_values: np.ndarray = None) -> int:
+        start_time = time.time()
+        backups = None
+        on_episode = instrumentation.get_episode_hook('value iteration') if instrumentation is not None else None
+        # Dense backend trains all states at once
+        if self.backend == 'numpy':
+            episode_count = self.value_tensor.train(discount, threshold, debug, self.stochastic, on_episode,
+                                                    initial_values)
+        elif self.schedule == 'sweep':
+            episode_count = self.sweep(discount, threshold, debug, on_episode, initial_values)
+        else:
+            episode_count, backups = train_schedule(self.schedule, self.track, self.value_store, self.states,
+                                                    self.get_wall_reward(), self.get_finish_reward(),
+                                                    discount, threshold, debug, self.stochastic, on_episode,
+                                                    initial_values)
+        if backups is None:
+            # Every sweep backs up every trained state
+            backups = episode_count * len(self.states)
+        self.training_report = {'schedule': self.schedule, 'episodes': episode_count, 'backups': backups,
+                                'time': time.time() - start_time}
+        if debug: print(f"Value Iteration {self.schedule} schedule: {self.training_report}")
+        return episode_count
+
+    """
+    A single sweep schedule of the python backend where each state reads the values of the previous episode.
+    on_episode is called with the episode count and biggest delta after every sweep. States with a finite initial
+    value start as if it was their best value of the previous episode.
     """
-    def train (self, discount: float, threshold: float, debug = False) -> int:
+    def sweep (self, discount: float, threshold: float, debug = False, on_episode: Callable = None,
+               initial_values: np.ndarray = None) -> int:
+        store = self.value_store
+        if initial_values is not None:
+            for state in self.states:
+                if np.isfinite(initial_values[state]):
+                    store.best_value[state] = float(initial_values[state])
+                    store.previous_value[state] = float(initial_values[state])
+        table = self.track.get_transition_table()
+        action_count = len(ACCELERATIONS)
+        stopped = acceleration_to_index([0, 0])
         # Develop rewards for each state for each speed. 
         # Initialize biggest delta as low number. It represents maximum difference in state rewards
         biggest_delta = -99999
@@ -60,86 +155,126 @@ class Value_Iteration:
             episode_count += 1
             # Re initialize delta
             biggest_delta = -99999
-            # Iterate through each element in the track
-            track = self.track.track_list
-            for row in range(len(track)):
-                for col in range(len(track[row])):
-                    # Check if the current state's value is changeable
-                    location = convert_list_to_coordinate([row, col])
-                    if self.value_dict[location]['changeable'] == False:
-                        # If not changeable, we move on to next position
-                        continue
-                    # Iterate through all possible velocities at position and all accelerations and calcualte 
-                    # Reward of each possible outcome and store best reward and best acceleration
-                    v_row = -5
-                    while (v_row < 6):
-                        v_col = -5
-                        while(v_col < 6):
-                            # Create velocity dictionary
-                            velocity_pair = convert_list_to_coordinate([v_row, v_col])
-                            # Create empty dictionary if velocity_pair doesn't exists
-                            if velocity_pair not in self.value_dict[location]:
-                                self.value_dict[location][velocity_pair] = {}
-                            # Check all 9 acceleration possibilities
-                            a_row = -1
-                            while(a_row < 2):
-                                a_col = -1
-                                while(a_col < 2):
-                                    # Create acceleration value holder
-                                    acceleration_pair = convert_list_to_coordinate([a_row, a_col])
-                                    # Create a racecar object for the sake of method utilization
-                                    racer = Racecar(self.track)
-                                    # Set the position and v
-                                    position = [row, col]
-                                    velocity = [v_row, v_col]
-                                    acceleration = [a_row, a_col]
-                                    # Get next_value for accelerating at specific acceleration
-                                    next_value = get_reward_from_accelerating(racer, position, velocity, acceleration, 
-                                                                          self.get_wall_reward(), self.get_finish_reward(),
-                                                                          self.value_dict, False)
-                                    # Calculate value as reward(current) + discount * reward(next state)
-                                    value = self.value_dict[location]['reward'] + discount * next_value
-                                    # Store value within value dict
-                                    self.value_dict[location][velocity_pair][acceleration_pair] = value
-                                    # Increment acceleration metrics
-                                    a_col += 1
-                                a_row += 1
-                            # Reassign the velocity dictionary as the maximum value and acceleration pair in dictionary
-                            best_acceleration = get_max_from_subset(self.value_dict[location][velocity_pair], ['best acceleration', 'best reward', 'previous reward'])
-                            best_reward = self.value_dict[location][velocity_pair][best_acceleration]
-                            # Store previous reward for delta calculations
-                            previous_reward = 0
-                            if 'best reward' in self.value_dict[location][velocity_pair]:
-                                previous_reward = self.value_dict[location][velocity_pair]['best reward']
-                            self.value_dict[location][velocity_pair]['best acceleration'] = convert_coordinate_to_list(best_acceleration)
-                            self.value_dict[location][velocity_pair]['best reward'] = best_reward
-                            # Update previous reward
-                            self.value_dict[location][velocity_pair]['previous reward'] = previous_reward
-                            # Update biggest delta if necessary
-                            delta = abs(best_reward - previous_reward)
-                            if delta > biggest_delta:
-                                biggest_delta = delta
-                            v_col += 1
-                        v_row += 1
-                    # Now each velocity pair has a best acceleration and best reward associaated with 
-            # All cells have been iterated through
+            # Iterate through each trained state of the track. We do not change walls nor finish points
+            for state in self.states:
+                cell = state // VELOCITY_COUNT
+                # Calcualte the reward of each possible outcome of every acceleration and store best reward and
+                # best acceleration
+                best_reward = -99999
+                best_action = None
+                # Get next_value for accelerating at each of the 9 accelerations once
+                next_values = [get_reward_from_accelerating(table, state, action, self.get_wall_reward(),
+                                                            self.get_finish_reward(), store, False)
+                               for action in range(action_count)]
+                # A failed acceleration moves the racer as if it did not accelerate
+                failed_value = (1 - ACCELERATION_SUCCESS_RATE) * next_values[stopped]
+                # Check all 9 acceleration possibilities
+                action_values = []
+                for action, next_value in enumerate(next_values):
+                    if self.stochastic:
+                        next_value = ACCELERATION_SUCCESS_RATE * next_value + failed_value
+                    # Calculate value as reward(current) + discount * reward(next state)
+                    value = store.reward[cell] + discount * next_value
+                    action_values.append(value)
+                    # The first acceleration with the maximum value is the best acceleration
+                    if value > best_reward:
+                        best_reward = value
+                        best_action = action
+                # Store values within value store
+                store.action_values[state * action_count:(state + 1) * action_count] = action_values
+                # Store previous reward for delta calculations
+                previous_reward = 0
+                if store.best_value[state] is not None:
+                    previous_reward = store.best_value[state]
+                store.best_action[state] = best_action
+                store.best_value[state] = best_reward
+                # Update previous reward
+                store.previous_value[state] = previous_reward
+                # Update biggest delta if necessary
+                delta = abs(best_reward - previous_reward)
+                if delta > biggest_delta:
+                    biggest_delta = delta
+            # All states have been iterated through
             if debug: print(f"Value Iteration Training Episode: {episode_count} | Max Delta: {biggest_delta}")
+            if on_episode is not None:
+                on_episode({'episodes': episode_count, 'biggest delta': biggest_delta})
         # Threshold has been hit
         # Return episode count for metrics
         return episode_count
 
     """
-    Test runs the supplied Racecar through the value dict until it reaches the finish line. All velocity and position 
-    updating is handled within the Racercar's traverse method. Metrics are stored within the Racecar. 
+    Return the best action id of a state from whichever backend was trained or None if the state was never trained
+    """
+    def get_best_action(self, state: int) -> int:
+        if self.loaded_policy is not None:
+            action = int(self.loaded_policy[state])
+            return None if action < 0 else action
+        if self.backend == 'numpy':
+            return self.value_tensor.get_best_action(state)
+        return self.value_store.best_action[state]
+
+    """
+    Return the best acceleration at a position and velocity. Untrained states, e.g. ones pruned away or only reached
+    with the other restart mode, take a random acceleration.
+    """
+    def get_best_acceleration(self, position: List, velocity: List) -> List:
+        # Convert position and velocity to a state id
+        best_action = self.get_best_action(encode_state(position, velocity, self.value_store.cols))
+        if best_action is None:
+            return [random.choice([-1, 0, 1]), random.choice([-1, 0, 1])]
+        return ACCELERATIONS[best_action]
+
+    """
+    Return the best action id of every state id as an int8 array. States that were never trained hold -1.
+    """
+    def get_policy(self) -> np.ndarray:
+        if self.loaded_policy is not None:
+            return self.loaded_policy
+        if self.backend == 'numpy':
+            policy = np.full(self.value_tensor.policy.size, -1, dtype = np.int8)
+            policy[self.value_tensor.states] = self.value_tensor.policy.reshape(-1)[self.value_tensor.states]
+            return policy
+        return self.value_store.get_best_actions()
+
+    """
+    Return the best value of every state id as a float array. States that were never trained hold NaN.
+    """
+    def get_values(self) -> np.ndarray:
+        if self.backend == 'numpy':
+            values = np.full(self.value_tensor.values.size, np.nan)
+            values[self.value_tensor.states] = self.value_tensor.values.reshape(-1)[self.value_tensor.states]
+            return values
+        return self.value_store.get_best_values()
+
+    """
+    Save the trained policy and optionally the best value of every state to a policy file
+    """
+    def save_policy(self, file_path: str, include_values: bool = False) -> None:
+        save_policy(file_path, self.track, self.get_policy(), self.get_values() if include_values else None,
+                    f"value iteration {self.backend} {self.schedule}")
+
+    """
+    Load a policy file of this track. The loaded policy is used for testing in place of the trained values.
+    """
+    def load_policy(self, file_path: str) -> None:
+        self.loaded_policy = load_policy(file_path, self.track)['policy']
+
+    """
+    Test runs the supplied Racecar through the trained values until it reaches the finish line. All velocity and position 
+    updating is handled within the Racercar's traverse method. Metrics are stored within the Racecar. The test runs
+    headless unless a render function is passed, which is called every render_every steps (or only at the end if 0).
+    The starting state and every step are recorded within the trajectory if one is passed.
     """
-    def test(self, racer: Racecar, restart: bool) -> None:
+    def test(self, racer: Racecar, restart: bool, trajectory: Trajectory = None, render: Callable = None,
+             render_every: int = 0) -> None:
+        step = 0
+        record_step(self.track.track_list, racer.get_position(), racer.get_velocity(), step, racer.finished(),
+                    trajectory, render, render_every)
         while racer.finished() == False:
-            # Get current position and velocity
-            # Convert position and velocity to string format
-            current_position_str = convert_list_to_coordinate(racer.get_position())
-            current_velocity_str = convert_list_to_coordinate(racer.get_velocity())
-            # Determine what is the best action to take at position and velocity
-            best_acceleration = self.value_dict[current_position_str][current_velocity_str]['best acceleration']
+            # Determine what is the best action to take at current position and velocity
+            best_acceleration = self.get_best_acceleration(racer.get_position(), racer.get_velocity())
             # Traverse the racecar with respective restarting condition
-            print_racer_on_track(self.track.track_list, racer.get_position())
             racer.traverse(best_acceleration, restart)
+            step += 1
+            record_step(self.track.track_list, racer.get_position(), racer.get_velocity(), step, racer.finished(),
+                        trajectory, render, render_every)
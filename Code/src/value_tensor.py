@@ -0,0 +1,136 @@
+from track import Track
+from transition_table import ROAD, WALL
+from calculations import ACCELERATION_SUCCESS_RATE, VELOCITY_RANGE, VELOCITY_COUNT, ACCELERATIONS, \
+    acceleration_to_index
+from typing import Callable, List
+import numpy as np
+import random
+
+"""
+This file holds the dense NumPy backend of the value iteration algorithm. Instead of nested dictionaries
+keyed by "[x, y]" strings, the values are stored within float64 arrays indexed by (row, col, v_row + 5,
+v_col + 5) and the Q values additionally by acceleration index. Every Bellman sweep is computed as whole
+array operations over the transition table of the track. The sweep may be restricted to a given set of states,
+in which case only the transitions of those states are held.
+"""
+
+class Value_Tensor:
+    def __init__(self, track: Track, movement_cost: float, wall_reward: float, finish_reward: float,
+                 states: np.ndarray = None) -> None:
+        self.track = track
+        self.movement_cost = movement_cost
+        self.wall_reward = wall_reward
+        self.finish_reward = finish_reward
+        # Dimensions of the value tensors
+        self.rows = len(track.track_list)
+        self.cols = len(track.track_list[0])
+        self.shape = (self.rows, self.cols, VELOCITY_RANGE, VELOCITY_RANGE)
+        # State value of every (row, col, v_row, v_col) and Q value of every acceleration at that state
+        self.values = np.zeros(self.shape, dtype = np.float64)
+        self.q_values = np.zeros(self.shape + (len(ACCELERATIONS),), dtype = np.float64)
+        # Best acceleration index of every state. States that were never swept hold -1
+        self.policy = np.full(self.shape, -1, dtype = np.int8)
+        # Flat state ids of every swept state. Every changeable state (road and start positions) by default
+        self.states = self.get_changeable_states() if states is None else np.asarray(states, dtype = np.int64)
+        # Outcome and next state of every swept state and acceleration
+        self.outcomes, self.next_states = self.build_transitions()
+
+    """
+    Return the flat state ids of every changeable state in the order the dictionary backend visits them. A flat
+    state id is (row * cols + col) * 121 + velocity index, so sorting by id is a row major sweep over positions
+    followed by velocities.
+    """
+    def get_changeable_states(self) -> np.ndarray:
+        cells = [row * self.cols + col for row in range(self.rows) for col in range(self.cols)
+                 if self.track.track_list[row][col] in ('S', '.')]
+        # Expand each cell into its 121 velocity states
+        return (np.array(cells, dtype = np.int64)[:, None] * VELOCITY_COUNT + np.arange(VELOCITY_COUNT)).ravel()
+
+    """
+    Gather the outcome and flat next state id of every swept state and acceleration from the track's transition
+    table. Next state ids are only meaningful for ROAD outcomes.
+    """
+    def build_transitions(self) -> List[np.ndarray]:
+        table = self.track.get_transition_table()
+        cells, velocities = np.divmod(self.states, VELOCITY_COUNT)
+        outcomes = np.asarray(table.outcomes[cells, velocities])
+        next_states = table.cells[cells, velocities].astype(np.int64) * VELOCITY_COUNT + table.velocities[cells, velocities]
+        return outcomes, next_states
+
+    """
+    Train the value tensors until the largest change in best value of any state is smaller than the threshold.
+    The sweep reproduces the dictionary backend exactly: states visited earlier within the same sweep are valued
+    with their previous episode's best value, states visited later are valued with the best value from two
+    episodes ago, unexplored states use their base reward and a move that keeps the racer on the same position
+    uses the base reward of that position. With stochastic backups, the value of an acceleration blends the value
+    of its successor (80%) with the value of the zero acceleration successor (20%). on_episode is called with the
+    episode count and biggest delta after every sweep. States with a finite initial value, indexed by state id,
+    start from it as if it was the value of both previous episodes. Returns the episode count for metrics.
+    """
+    def train(self, discount: float, threshold: float, debug = False, stochastic = False,
+              on_episode: Callable = None, initial_values: np.ndarray = None) -> int:
+        states = self.states
+        road = self.outcomes == ROAD
+        # Successor values that never change between sweeps
+        fixed_values = np.where(self.outcomes == WALL, self.wall_reward, self.finish_reward).astype(np.float64)
+        same_position = road & (self.next_states // VELOCITY_COUNT == (states // VELOCITY_COUNT)[:, None])
+        fixed_values[same_position] = self.movement_cost
+        # Successors whose value is read from the previous sweeps
+        lookup = road & ~same_position
+        lookup_states = self.next_states[lookup]
+        visited_earlier = lookup_states < np.broadcast_to(states[:, None], lookup.shape)[lookup]
+        # Best values of the last episode and the episode before. Unexplored states hold their base reward
+        flat_values = self.values.reshape(-1)
+        last_values = np.zeros(flat_values.shape, dtype = np.float64)
+        older_values = np.full(flat_values.shape, self.movement_cost, dtype = np.float64)
+        if initial_values is not None:
+            warm = states[np.isfinite(initial_values[states])]
+            last_values[warm] = initial_values[warm]
+            older_values[warm] = initial_values[warm]
+        stopped = acceleration_to_index([0, 0])
+        # Initialize biggest delta as low number
+        biggest_delta = -99999
+        episode_count = 0
+        while (abs(biggest_delta) > threshold):
+            episode_count += 1
+            # Value of every successor for this sweep
+            next_values = fixed_values.copy()
+            next_values[lookup] = np.where(visited_earlier, last_values[lookup_states], older_values[lookup_states])
+            # A failed acceleration moves the racer as if it did not accelerate
+            if stochastic:
+                next_values = (ACCELERATION_SUCCESS_RATE * next_values +
+                               (1 - ACCELERATION_SUCCESS_RATE) * next_values[:, stopped, None])
+            # Calculate value as reward(current) + discount * reward(next state)
+            q_values = self.movement_cost + discount * next_values
+            # The first maximum wins which matches the acceleration order of the dictionary backend
+            best_accelerations = np.argmax(q_values, axis = 1)
+            best_values = q_values[np.arange(len(states)), best_accelerations]
+            # Largest change in best value
+            biggest_delta = np.max(np.abs(best_values - last_values[states]))
+            # Shift episodes back by one
+            older_values[states] = last_values[states]
+            last_values[states] = best_values
+            # Store results within tensors
+            self.q_values.reshape(-1, len(ACCELERATIONS))[states] = q_values
+            self.policy.reshape(-1)[states] = best_accelerations
+            if debug: print(f"Value Iteration Training Episode: {episode_count} | Max Delta: {biggest_delta}")
+            if on_episode is not None:
+                on_episode({'episodes': episode_count, 'biggest delta': biggest_delta})
+        flat_values[:] = last_values
+        return episode_count
+
+    """
+    Return the best action id of a state id or None if the state was never swept
+    """
+    def get_best_action(self, state: int) -> int:
+        action = int(self.policy.reshape(-1)[state])
+        return None if action < 0 else action
+
+    """
+    Return the best acceleration at a position and velocity. States that were never swept take a random acceleration.
+    """
+    def get_best_acceleration(self, position: List, velocity: List) -> List:
+        action = int(self.policy[position[0], position[1], velocity[0] + 5, velocity[1] + 5])
+        if action < 0:
+            return [random.choice([-1, 0, 1]), random.choice([-1, 0, 1])]
+        return ACCELERATIONS[action]